@@ -21,6 +21,11 @@ try:
     # Assuming scrapers are in src.scrapers and __init__.py exports them
     from scrapers import AutoTraderScraper, CarGurusScraper
     from src.processors.approved_vehicles_processor import ApprovedVehiclesProcessor
+    from src.scrapers.tracing import TRACE_MODES, TRACE_MODE_OFF
+    from src.scrapers.artifact_store import DebugArtifactStore
+    from src.scrapers.replay import ReplayArchive, REPLAY_MODE_RECORD, REPLAY_MODE_REPLAY
+    from src.facebook_ingest import FacebookIngest, DEFAULT_MANIFEST_PATH
+    from src.process_facebook_data import ENGINES, ENGINE_ROWS
 except ImportError as e:
     print(f"Error importing modules: {e}")
     print("Please ensure all required modules (parsers, processors, scrapers) are in the 'src' directory or subdirectories,")
@@ -91,16 +96,30 @@ async def main(args):
     # Initialize approved vehicles processor
     processor = ApprovedVehiclesProcessor()
     processor.load_approved_vehicles()
-    print(f"Successfully loaded {len(processor.approved_vehicles)} records from {processor.csv_path} and created {len(processor.approved_vehicles_by_make_model)} unique make/model pairs for approval.")
     
-    # Get approved vehicles list for scrapers
+    # One ApprovalSource for all scrapers (an edited list is picked up at the next scrape)
     approved_vehicles_list = processor.get_approved_vehicles_list()
-    print(f"Extracted {len(approved_vehicles_list)} approved vehicle criteria for scrapers from processor.")
+    print(f"Extracted {len(processor.approval_index.criteria())} approved vehicle criteria for scrapers from processor.")
     
+    # Captcha/retry page dumps from all scrapers share one bounded store
+    artifact_store = DebugArtifactStore(root_dir=args.artifact_dir, max_total_bytes=args.artifact_max_mb * 1024 * 1024)
+
+    # Offline record/replay of the browser traffic (for reproducible benchmarks)
+    replay = None
+    if args.record:
+        replay = ReplayArchive(args.record, mode=REPLAY_MODE_RECORD)
+    elif args.replay:
+        replay = ReplayArchive(args.replay, mode=REPLAY_MODE_REPLAY, latency_ms=args.replay_latency_ms,
+                               bandwidth_kbps=args.replay_bandwidth_kbps)
+
     # Initialize scrapers with approved vehicles list
     scrapers = [
-        AutoTraderScraper(postal_code=args.postal_code, approved_vehicles_list=approved_vehicles_list),
-        CarGurusScraper(postal_code=args.postal_code, approved_vehicles_list=approved_vehicles_list)
+        AutoTraderScraper(postal_code=args.postal_code, approved_vehicles_list=approved_vehicles_list,
+                          trace_mode=args.autotrader_trace, trace_dir=args.trace_dir, artifact_store=artifact_store,
+                          replay=replay),
+        CarGurusScraper(postal_code=args.postal_code, approved_vehicles_list=approved_vehicles_list,
+                        trace_mode=args.cargurus_trace, trace_dir=args.trace_dir, artifact_store=artifact_store,
+                        replay=replay)
     ]
     
     # Load existing URLs from output.csv
@@ -113,17 +132,33 @@ async def main(args):
                     existing_urls.add(row['url'])
         print(f"Loaded {len(existing_urls)} URLs from {args.output}. {len(existing_urls)} seem fully processed.")
     
-    # Scrape from each source
-    all_listings = []
-    for scraper in scrapers:
+    # Scrape all sources concurrently
+    async def scrape_source(scraper):
         try:
             print(f"\nScraping from {scraper.name}...")
+            started = time.perf_counter()
             listings = await scraper.scrape(limit=args.limit)
-            print(f"Found {len(listings)} listings from {scraper.name}")
-            all_listings.extend(listings)
+            print(f"Found {len(listings)} listings from {scraper.name} in {time.perf_counter() - started:.2f}s")
+            return listings
         except Exception as e:
             print(f"Error scraping {scraper.name}: {str(e)}")
+            return []
+
+    # Facebook exports: only files (or appended rows) not ingested by an earlier run
+    facebook_ingest = None
+    facebook_listings = []
+    if not args.skip_facebook:
+        facebook_ingest = FacebookIngest(data_dir=args.facebook_dir, pattern=FACEBOOK_CSV_PATTERN,
+                                         manifest_path=args.facebook_manifest, engine=args.facebook_engine)
+        facebook_listings = await asyncio.to_thread(facebook_ingest.collect)
+
+    all_listings = list(facebook_listings)
+    for listings in await asyncio.gather(*(scrape_source(scraper) for scraper in scrapers)):
+        all_listings.extend(listings)
     
+    if replay:
+        replay.close()
+
     print(f"\nTotal of {len(all_listings)} raw listings gathered from all sources before de-duplication against {args.output}.")
     
     # Filter out duplicates
@@ -131,6 +166,8 @@ async def main(args):
     
     if not new_listings:
         print("All gathered listings were already processed or duplicates. No new data to add to output.csv.")
+        if facebook_ingest:
+            facebook_ingest.commit()
         return
     
     # Append new listings to output.csv
@@ -138,18 +175,40 @@ async def main(args):
     file_exists = os.path.exists(args.output)
     
     with open(args.output, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore') # Facebook rows carry extra fields
         if not file_exists:
             writer.writeheader()
         writer.writerows(new_listings)
     
     print(f"Added {len(new_listings)} new listings to {args.output}")
+    if facebook_ingest:
+        facebook_ingest.commit() # Checkpoint only once the listings are stored
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Scrape car listings from multiple sources')
     parser.add_argument('--postal-code', type=str, default="L6M3S7", help='Postal code for location-based search')
     parser.add_argument('--limit', type=int, default=100, help='Maximum number of listings to scrape per source')
     parser.add_argument('--output', type=str, default='data/output.csv', help='Output CSV file path')
+    parser.add_argument('--autotrader-trace', type=str, default=TRACE_MODE_OFF, choices=TRACE_MODES,
+                        help='Playwright tracing for AutoTrader: off, on-failure (keep only failing attempts) or always')
+    parser.add_argument('--cargurus-trace', type=str, default=TRACE_MODE_OFF, choices=TRACE_MODES,
+                        help='Playwright tracing for CarGurus: off, on-failure (keep only failing attempts) or always')
+    parser.add_argument('--trace-dir', type=str, default=None, help='Directory for saved Playwright traces (default: logs/traces)')
+    parser.add_argument('--artifact-dir', type=str, default=None, help='Directory for compressed debug page dumps (default: logs/artifacts)')
+    parser.add_argument('--artifact-max-mb', type=int, default=200, help='Disk quota for debug page dumps in MB; oldest are evicted first')
+    replay_group = parser.add_mutually_exclusive_group()
+    replay_group.add_argument('--record', type=str, default=None, metavar='ARCHIVE_DIR',
+                              help='Record the scrapers\' browser traffic into a replay archive')
+    replay_group.add_argument('--replay', type=str, default=None, metavar='ARCHIVE_DIR',
+                              help='Serve browser traffic from a replay archive instead of the live sites')
+    parser.add_argument('--replay-latency-ms', type=float, default=0, help='Added latency per replayed response')
+    parser.add_argument('--replay-bandwidth-kbps', type=float, default=None, help='Simulated bandwidth for replayed responses')
+    parser.add_argument('--skip-facebook', action='store_true', help='Do not ingest the Facebook CSV exports')
+    parser.add_argument('--facebook-dir', type=str, default=str(DATA_DIR), help=f'Directory with the {FACEBOOK_CSV_PATTERN} exports')
+    parser.add_argument('--facebook-manifest', type=str, default=str(DEFAULT_MANIFEST_PATH),
+                        help='Checkpoint manifest of the ingested Facebook exports')
+    parser.add_argument('--facebook-engine', type=str, default=ENGINE_ROWS, choices=ENGINES,
+                        help='Parser for new Facebook exports: rows (row by row) or pandas (column-wise, same output)')
     
     args = parser.parse_args()
     asyncio.run(main(args)) 
\ No newline at end of file
@@ -3,11 +3,21 @@ import numpy as np
 import os
 from pathlib import Path
 import datetime
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from src.file_watcher import FileWatcher, file_version
+from src.processors.approval_index import ApprovalSource, current_approval_index, get_approval_source
+from src.processors.reference_tables import EMPTY_TABLE, ScoringData, YearValueTable
+from src.processors.shared_reference import attach_scoring_data, publish_scoring_data
 
 # Define the path to the NRCan data relative to this script's location
 # Assumes data dir is ../data relative to src/
 FUEL_DATA_PATH = Path(__file__).parent.parent / "data" / "MY2015-2024 Fuel Consumption Ratings.csv"
 
+# A reloaded reference table with fewer rows than this fraction of the previous one is not swapped in
+MIN_RELOADED_ROWS_FRACTION = 0.5
+
 # --- Constants for TCO Calculation ---
 AVG_ANNUAL_MILEAGE_KM = 15000
 AVG_VEHICLE_LIFESPAN_KM = 300000
@@ -55,7 +65,7 @@ MAKE_MAINTENANCE_FACTORS = {
 class VehicleDataProcessor:
     def __init__(self, reliability_data_path, tax_rate=DEFAULT_TAX_RATE,
                  annual_insurance_cost=DEFAULT_ANNUAL_INSURANCE_COST,
-                 province=DEFAULT_PROVINCE):
+                 province=DEFAULT_PROVINCE, approval_index=None, scoring_data=None):
         """
         Initialize the data processor with reliability data and fuel consumption data.
 
@@ -64,73 +74,28 @@ class VehicleDataProcessor:
             tax_rate (float): Purchase tax rate.
             annual_insurance_cost (float): Estimated average annual insurance cost.
             province (str): Default province code for fuel price lookups (e.g., "ON").
+            approval_index (ApprovalSource or ApprovalIndex, optional): Approved vehicles; defaults to the
+                shared source for data/approved_vehicles_reliability.csv (a fixed ApprovalIndex is never reloaded).
+            scoring_data (ScoringData, optional): Ready-made snapshot (e.g. attached from shared memory);
+                nothing is loaded from disk, and reload() keeps it unless its files are readable and changed.
         """
-        # Load the primary approved vehicles and their reliability data
-        self.approved_vehicles_data = []
-        approved_vehicles_path = Path(__file__).parent.parent / "data" / "approved_vehicles_reliability.csv"
-        try:
-            # Explicitly specify dtype for Year to avoid mixed type warnings / issues
-            approved_df = pd.read_csv(approved_vehicles_path, dtype={'Year': 'Int64'}) # Use Int64 to handle potential NA as pandas integer
-            # Ensure required columns exist
-            required_cols = ['Make', 'Model', 'Year', 'QIRRate', 'DefectRate'] # Composite score is optional in file
-            if not all(col in approved_df.columns for col in required_cols):
-                raise ValueError(f"Approved vehicles CSV is missing one or more required columns: {required_cols}")
-
-            # Normalize make and model for consistent matching later
-            approved_df['Make_lc'] = approved_df['Make'].str.lower().str.strip()
-            approved_df['Model_norm'] = approved_df['Model'].str.lower().str.replace('-', ' ', regex=False).str.strip()
-            # Convert Year to integer, coercing errors to NaT which will then be dropped
-            approved_df['Year'] = pd.to_numeric(approved_df['Year'], errors='coerce')
-            
-            # Convert QIRRate and DefectRate to numeric, coercing errors to np.nan
-            approved_df['QIRRate'] = pd.to_numeric(approved_df['QIRRate'], errors='coerce')
-            approved_df['DefectRate'] = pd.to_numeric(approved_df['DefectRate'], errors='coerce')
-            
-            approved_df.dropna(subset=['Make_lc', 'Model_norm', 'Year'], inplace=True) # Drop rows where key info is missing
-            approved_df['Year'] = approved_df['Year'].astype(int)
-            
-            # Normalize composite score (should be float between 0 and 100)
-            if 'Composite score' in approved_df.columns:
-                # Ensure it's treated as a score from 0 to 100. If it's 0-1, multiply by 100.
-                # Assuming CSV provides it as 0-100 directly based on previous context.
-                approved_df['CompositeScore'] = pd.to_numeric(approved_df['Composite score'], errors='coerce').fillna(0)
-                # If the values are typically small (e.g. 0.x, 1.x), it might imply they need *100.
-                # For now, assuming they are already scaled 0-100.
-            else:
-                approved_df['CompositeScore'] = 0 # Default if column is missing
-
-            cols_to_keep = ['Make_lc', 'Model_norm', 'Year', 'CompositeScore', 'QIRRate', 'DefectRate']
-            self.approved_vehicles_data = approved_df[cols_to_keep].to_dict('records')
-            
-            # Create a set of (make, model) tuples for quick lookup
-            self.approved_make_model_set = set()
-            if 'Make_lc' in approved_df.columns and 'Model_norm' in approved_df.columns:
-                self.approved_make_model_set = set(zip(approved_df['Make_lc'], approved_df['Model_norm']))
-            
-            print(f"Successfully loaded {len(self.approved_vehicles_data)} records from {approved_vehicles_path} and created {len(self.approved_make_model_set)} unique make/model pairs for approval.")
-        except FileNotFoundError:
-            print(f"CRITICAL ERROR: Approved vehicles data not found at {approved_vehicles_path}. No vehicles will be processed.")
-        except ValueError as ve:
-            print(f"CRITICAL ERROR: Value error processing approved vehicles CSV: {ve}. No vehicles will be processed.")
-        except Exception as e:
-            print(f"CRITICAL ERROR: Failed to load or process approved vehicles data from {approved_vehicles_path}: {e}. No vehicles will be processed.")
-        
-        # Load OLD reliability data (chart_data_filtered.csv) - this might become supplementary or be removed
-        # For now, keep it, but its QIR/DefectRate will be overridden by approved_vehicles_data if a match is found
-        try:
-            self.reliability_data = pd.read_csv(reliability_data_path)
-            self.qir_rate_dict = self._convert_to_lookup_dict('QIRRate') # Used for non-approved or as fallback
-            self.defect_rate_dict = self._convert_to_lookup_dict('DefectRate') # Used for non-approved or as fallback
-        except Exception as e:
-            print(f"Warning: Could not load or process the old reliability data from {reliability_data_path}: {e}")
-            self.reliability_data = pd.DataFrame() # Empty DataFrame
-            self.qir_rate_dict = {}
-            self.defect_rate_dict = {}
-        
-        # Load Fuel Consumption Data
-        self.fuel_data = self._load_fuel_data()
-        # Create a lookup dict for fuel data: {(make, model, year): combined_l_100km}
-        self.fuel_lookup = self._create_fuel_lookup()
+        # Approved vehicles (with their QIRRate, DefectRate and Composite score), the OLD reliability
+        # data (chart_data_filtered.csv) and the fuel consumption data, as one ScoringData snapshot.
+        # reload() / watch() replace the snapshot when the files change; each process_car_listings
+        # call scores with the snapshot it started with.
+        self.reliability_data_path = reliability_data_path
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        if scoring_data is not None:
+            self._approvals = scoring_data.approval_index
+            self.data = scoring_data
+        else:
+            self._approvals = approval_index if approval_index is not None else get_approval_source()
+            self.data = self._load_scoring_data()
+        if self.data.approval_index:
+            print(f"Using {len(self.data.approval_index)} approved make/model/year entries for approval.")
+        else:
+            print("CRITICAL ERROR: No approved vehicles loaded. No vehicles will be processed.")
         
         # Store TCO constants/parameters
         self.avg_annual_mileage = AVG_ANNUAL_MILEAGE_KM
@@ -164,6 +129,98 @@ class VehicleDataProcessor:
             'van': 11.0
         }
 
+    @property
+    def approval_index(self):
+        return self.data.approval_index
+
+    def _load_scoring_data(self, previous=None):
+        """
+        Build a ScoringData snapshot. Parts whose files did not change are reused from `previous`,
+        and a file that fails to load keeps its previous data.
+        """
+        approval_index = current_approval_index(self._approvals, refresh=True)
+
+        reliability_version = file_version(self.reliability_data_path)
+        if previous is not None and reliability_version == previous.versions["reliability"]:
+            qir_table, defect_table = previous.qir_table, previous.defect_table
+        else:
+            # Load OLD reliability data (chart_data_filtered.csv) - this might become supplementary or be removed
+            # For now, keep it, but its QIR/DefectRate will be overridden by the approval index if a match is found
+            try:
+                reliability_data = pd.read_csv(self.reliability_data_path)
+                qir_table = self._convert_to_lookup_table(reliability_data, 'QIRRate') # Used for non-approved or as fallback
+                defect_table = self._convert_to_lookup_table(reliability_data, 'DefectRate') # Used for non-approved or as fallback
+            except Exception as e:
+                print(f"Warning: Could not load or process the old reliability data from {self.reliability_data_path}: {e}")
+                qir_table = defect_table = None
+            if previous is not None and not (self._acceptable_reload(qir_table, previous.qir_table, "QIRRate")
+                                             and self._acceptable_reload(defect_table, previous.defect_table, "DefectRate")):
+                # Keep the previous tables (and version, so the next check retries the file)
+                qir_table, defect_table = previous.qir_table, previous.defect_table
+                reliability_version = previous.versions["reliability"]
+            elif qir_table is None:
+                qir_table = defect_table = EMPTY_TABLE
+
+        fuel_version = file_version(FUEL_DATA_PATH)
+        if previous is not None and fuel_version == previous.versions["fuel"]:
+            fuel_table = previous.fuel_table
+        else:
+            # Load Fuel Consumption Data
+            fuel_table = self._create_fuel_lookup(self._load_fuel_data())
+            if previous is not None and not self._acceptable_reload(fuel_table, previous.fuel_table, "fuel consumption"):
+                fuel_table, fuel_version = previous.fuel_table, previous.versions["fuel"]
+
+        return ScoringData(approval_index, qir_table, defect_table, fuel_table,
+                           {"reliability": reliability_version, "fuel": fuel_version})
+
+    @staticmethod
+    def _acceptable_reload(table, previous_table, description):
+        """
+        Whether a reloaded table may replace `previous_table`. A table that failed to load (None),
+        came out empty or lost more than half of its rows is most likely a file caught mid-write.
+        """
+        if not len(previous_table):
+            return True
+        rows = len(table) if table is not None else 0
+        if rows < len(previous_table) * MIN_RELOADED_ROWS_FRACTION:
+            print(f"Warning: Reloaded {description} data has {rows} rows (previously {len(previous_table)}); "
+                  f"keeping the previous data.")
+            return False
+        return True
+
+    def reload(self):
+        """
+        Re-read whichever of the approved vehicles, reliability and fuel files changed, and swap
+        the new snapshot in. Scoring already in progress finishes with the previous snapshot.
+
+        Returns:
+            bool: True if anything was reloaded
+        """
+        with self._reload_lock:
+            previous = self.data
+            data = self._load_scoring_data(previous)
+            if all(new is old for new, old in zip(data[:4], previous[:4])):
+                return False
+            self.data = data # A single assignment, so readers see the old or the new snapshot, never a mix
+        print(f"Reference data reloaded: {len(data.approval_index)} approved entries, "
+              f"{len(data.fuel_table)} fuel consumption ratings.")
+        return True
+
+    def watch(self, interval_s=5.0):
+        """Reload in a background thread whenever one of the data files changes (see reload())."""
+        if self._watcher is None:
+            paths = [self.reliability_data_path, FUEL_DATA_PATH]
+            if isinstance(self._approvals, ApprovalSource):
+                paths.append(self._approvals.path)
+            self._watcher = FileWatcher(paths, lambda changed: self.reload(), interval_s=interval_s,
+                                        name="reference-data-watcher")
+        self._watcher.start()
+        return self._watcher
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.stop()
+
     def _load_fuel_data(self):
         """Load and preprocess the NRCan fuel consumption data."""
         try:
@@ -191,139 +248,86 @@ class VehicleDataProcessor:
             print(f"Warning: Error loading fuel consumption data: {e}. Fuel costs will use default estimates.")
             return None
 
-    def _create_fuel_lookup(self):
-        """Create a lookup dictionary from the fuel data DataFrame."""
-        if self.fuel_data is None:
-            return {}
-
-        lookup = {}
-        # Handle potential multiple entries per make/model/year (e.g., different engines)
-        # We'll average them for simplicity
-        grouped = self.fuel_data.groupby(['make', 'model', 'year'])['combined_l_100km'].mean()
-        for index, value in grouped.items():
-            make, model, year = index
-            lookup[(make, model, year)] = value
-        return lookup
-
-    def _get_fuel_consumption(self, make, model, year):
-        """Get fuel consumption (L/100km) for a specific vehicle, with fallbacks."""
+    def _create_fuel_lookup(self, fuel_data):
+        """Create a lookup table from the fuel data DataFrame: (make, model, year) -> combined_l_100km."""
+        if fuel_data is None:
+            return EMPTY_TABLE
+        # Multiple entries per make/model/year (e.g., different engines) are averaged by the lookups
+        return YearValueTable.from_rows(zip(fuel_data['make'], fuel_data['model'], fuel_data['year'], fuel_data['combined_l_100km']))
+
+    def _get_fuel_consumption(self, make, model, year, data=None):
+        """Get fuel consumption (L/100km) for a specific vehicle, with fallbacks (from `data`, default: the current snapshot)."""
+        data = data if data is not None else self.data
         make = make.lower()
         model = model.lower()
         year = int(year)
-        key = (make, model, year)
 
-        # 1. Direct match
-        if key in self.fuel_lookup:
-            return self.fuel_lookup[key]
+        # 1. Direct match (averaged over the engines of that year)
+        consumption = data.fuel_table.mean(make, model, year)
+        if consumption is not None:
+            return consumption
 
         # 2. Fallback: Average for make/model across available years
-        if self.fuel_data is not None:
-            model_avg = self.fuel_data[
-                (self.fuel_data['make'] == make) &
-                (self.fuel_data['model'] == model)
-            ]['combined_l_100km'].mean()
-            if not pd.isna(model_avg):
-                # print(f"Warning: No exact year match for {make} {model} {year}. Using model average: {model_avg:.2f} L/100km")
-                return model_avg
+        model_avg = data.fuel_table.mean(make, model)
+        if model_avg is not None:
+            # print(f"Warning: No exact year match for {make} {model} {year}. Using model average: {model_avg:.2f} L/100km")
+            return model_avg
 
         # 3. Fallback: Average for make across all models/years
-        if self.fuel_data is not None:
-            make_avg = self.fuel_data[self.fuel_data['make'] == make]['combined_l_100km'].mean()
-            if not pd.isna(make_avg):
-                # print(f"Warning: No model match for {make} {model} {year}. Using make average: {make_avg:.2f} L/100km")
-                return make_avg
+        make_avg = data.fuel_table.mean(make)
+        if make_avg is not None:
+            # print(f"Warning: No model match for {make} {model} {year}. Using make average: {make_avg:.2f} L/100km")
+            return make_avg
 
         # 4. Fallback: Broad default (e.g., overall average or a fixed guess)
         # print(f"Warning: No fuel data found for {make} {model} {year}. Using default: 9.0 L/100km")
         return 9.0 # General fallback guess
 
-    def _convert_to_lookup_dict(self, chart_type):
-        """Convert reliability data to a nested dictionary for easy lookup."""
-        filtered_data = self.reliability_data[self.reliability_data['ChartType'] == chart_type]
-        result = {}
-        
-        for _, row in filtered_data.iterrows():
-            # Check for NaN in 'Year' before attempting conversion
-            if pd.isna(row['Year']):
-                # print(f"Warning: Skipping row due to missing or invalid year: {row.to_dict()}")
-                continue  # Skip this row
-
-            make = str(row['Make']).lower().strip()
-            model = str(row['Model']).lower().replace('-', ' ').strip() # Normalize model name
-            try:
-                year = int(row['Year'])
-            except ValueError:
-                # print(f"Warning: Skipping row due to non-integer year after NaN check (should be rare): {row.to_dict()}")
-                continue # Skip if year is not a valid integer after all
-
-            value = row['Value']
-            
-            if make not in result:
-                result[make] = {}
-                
-            if model not in result[make]:
-                result[make][model] = {}
-                
-            result[make][model][year] = value
-            
-        return result
+    def _convert_to_lookup_table(self, reliability_data, chart_type):
+        """Convert reliability data to a (make, model, year) lookup table for one chart type."""
+        filtered_data = reliability_data[reliability_data['ChartType'] == chart_type]
+        # Skip rows with a missing or invalid year
+        years = pd.to_numeric(filtered_data['Year'], errors='coerce')
+        filtered_data, years = filtered_data[years.notna()], years[years.notna()]
+
+        makes = filtered_data['Make'].astype(str).str.lower().str.strip()
+        models = filtered_data['Model'].astype(str).str.lower().str.replace('-', ' ', regex=False).str.strip() # Normalize model name
+        # A make/model/year listed twice keeps its last value
+        return YearValueTable.from_rows(zip(makes, models, years.astype(int), filtered_data['Value']))
     
-    def get_reliability_scores(self, make, model, year):
+    def get_reliability_scores(self, make, model, year, data=None):
         """
         Get QIRRate and DefectRate for a vehicle.
-        Prioritizes data from approved_vehicles_data, then falls back to old reliability data.
+        Prioritizes data from the approved vehicles index, then falls back to old reliability data.
         
         Args:
             make (str): Vehicle make (assumed to be lowercased by caller).
             model (str): Vehicle model (assumed to be normalized: lowercased, spaces for hyphens by caller).
             year (int): Vehicle year.
+            data (ScoringData, optional): Snapshot to read from (default: the current one).
         
         Returns:
             tuple: (QIRRate, DefectRate) with values or np.nan if not found/applicable.
         """
         # year is already int, make is lower, model is normalized (e.g. "civic si")
+        data = data if data is not None else self.data
         
-        # 1. Check in self.approved_vehicles_data (primary source)
-        for approved_vehicle in self.approved_vehicles_data:
-            # Using startswith for model matching as done in process_car_listings
-            if (approved_vehicle['Make_lc'] == make and
-                approved_vehicle['Year'] == year and
-                model.startswith(approved_vehicle['Model_norm'])): # model is the normalized scraped model
-                
-                qir = approved_vehicle.get('QIRRate')     # This will be np.nan if missing from CSV and coerced
-                defect = approved_vehicle.get('DefectRate') # This will be np.nan if missing
-                return qir, defect
-
-        # 2. Fallback to old reliability data (self.qir_rate_dict, self.defect_rate_dict from chart_data_filtered.csv)
-        # These dictionaries now use normalized model keys due to changes in _convert_to_lookup_dict
-        qir_rate = None
-        defect_rate = None
-        
-        # Try to get scores directly from old data using normalized make/model
-        if make in self.qir_rate_dict:
-            if model in self.qir_rate_dict[make]:
-                if year in self.qir_rate_dict[make][model]:
-                    qir_rate = self.qir_rate_dict[make][model][year]
-                    
-        if make in self.defect_rate_dict:
-            if model in self.defect_rate_dict[make]:
-                if year in self.defect_rate_dict[make][model]:
-                    defect_rate = self.defect_rate_dict[make][model][year]
+        # 1. Check the approved vehicles (primary source)
+        row = data.approval_index.find(make, model, year)
+        if row >= 0:
+            # np.nan if missing from the CSV
+            return data.approval_index.value(row, 'QIRRate'), data.approval_index.value(row, 'DefectRate')
+
+        # 2. Fallback to old reliability data (qir_table, defect_table from chart_data_filtered.csv), keyed by
+        # the same normalized make/model
+        qir_rate = data.qir_table.get(make, model, year)
+        defect_rate = data.defect_table.get(make, model, year)
         
-        # If not found, try to estimate from nearby years (for old data)
-        if qir_rate is None and make in self.qir_rate_dict and model in self.qir_rate_dict.get(make, {}):
-            years = list(self.qir_rate_dict[make][model].keys())
-            if years:
-                closest_year = min(years, key=lambda y_old: abs(y_old - year))
-                if abs(closest_year - year) <= 2:  # Only use if within 2 years
-                    qir_rate = self.qir_rate_dict[make][model][closest_year]
-        
-        if defect_rate is None and make in self.defect_rate_dict and model in self.defect_rate_dict.get(make, {}):
-            years = list(self.defect_rate_dict[make][model].keys())
-            if years:
-                closest_year = min(years, key=lambda y_old: abs(y_old - year))
-                if abs(closest_year - year) <= 2:  # Only use if within 2 years
-                    defect_rate = self.defect_rate_dict[make][model][closest_year]
+        # If not found, try to estimate from nearby years (for old data), only within 2 years
+        if qir_rate is None:
+            qir_rate = data.qir_table.nearest(make, model, year, max_distance=2)
+        if defect_rate is None:
+            defect_rate = data.defect_table.nearest(make, model, year, max_distance=2)
         
         return qir_rate, defect_rate
     
@@ -409,7 +413,7 @@ class VehicleDataProcessor:
         adjusted_maint_cost_per_km = base_maint_factor * BASE_MAINTENANCE_COST_PER_KM * age_factor * mileage_factor
         return adjusted_maint_cost_per_km * for_annual_mileage
 
-    def calculate_tco(self, listing_price, make, model, year, mileage, province_code=None):
+    def calculate_tco(self, listing_price, make, model, year, mileage, province_code=None, data=None):
         """
         Calculates the estimated Total Cost of Ownership over AVG_OWNERSHIP_YEARS.
 
@@ -421,6 +425,7 @@ class VehicleDataProcessor:
             mileage (int): Current mileage of the vehicle.
             province_code (str, optional): Province code for specific fuel prices. 
                                          Defaults to instance's default province.
+            data (ScoringData, optional): Fuel and reliability snapshot to use (default: the current one).
 
         Returns:
             dict: A dictionary containing various TCO components and totals.
@@ -451,7 +456,7 @@ class VehicleDataProcessor:
         details['estimated_resale_value_after_period'] = cbb_future_residual_val
 
         # 3. Fuel Costs over AVG_OWNERSHIP_YEARS
-        fuel_consumption_l_100km = self._get_fuel_consumption(make, model, year)
+        fuel_consumption_l_100km = self._get_fuel_consumption(make, model, year, data=data)
         
         actual_province = province_code if province_code else self.province
         current_fuel_price_per_litre = self._get_provincial_fuel_price(actual_province)
@@ -496,7 +501,7 @@ class VehicleDataProcessor:
         
         details['tco_calculation_years'] = AVG_OWNERSHIP_YEARS
         
-        qir, defect = self.get_reliability_scores(make, model, year)
+        qir, defect = self.get_reliability_scores(make, model, year, data=data)
         details['reliability_qir'] = qir
         details['reliability_defect_rate'] = defect
 
@@ -542,24 +547,80 @@ class VehicleDataProcessor:
         )
         return round(weighted_score, 2)
 
-    def process_car_listings(self, listings):
+    def process_car_listings(self, listings, top_deals=None):
         """
         Process a list of scraped car listings, calculate TCO, deal scores, and filter.
 
         Args:
             listings (list): List of dictionaries, where each dict is a scraped car listing.
+            top_deals (TopDeals, optional): Receives each scored listing as soon as it is scored.
 
         Returns:
             pandas.DataFrame: Processed and scored car listings, sorted by deal score.
         """
-        processed_cars = []
-        if not self.approved_make_model_set and not self.approved_vehicles_data:
+        data = self.data # One snapshot for the whole batch, even if the files are reloaded meanwhile
+        if not data.approval_index:
             print("CRITICAL: No approved vehicles loaded. Cannot process listings against approval list.")
             # Depending on desired behavior, could return empty DF or process without approval filter
             # For now, let's assume we want to strictly filter if the file was intended to be used.
             # If the approved_vehicles_reliability.csv was optional, this behavior would change.
 
-        for i, car_data in enumerate(listings):
+        return self._finalize_results(self._score_listings(listings, data, top_deals=top_deals))
+
+    def process_car_listings_in_processes(self, listings, workers=None, chunk_size=500, top_deals=None):
+        """
+        Same as process_car_listings, with the scoring split across worker processes.
+
+        The current snapshot is published once to shared memory (see shared_reference); each
+        worker attaches to it read-only instead of loading the data files itself, so workers
+        start almost immediately and share one copy of the reference data.
+
+        Args:
+            listings (list): List of dictionaries, where each dict is a scraped car listing.
+            workers (int, optional): Number of processes (default: one per CPU).
+            chunk_size (int): Listings per task.
+            top_deals (TopDeals, optional): Receives the scored listings of each chunk as it completes.
+
+        Returns:
+            pandas.DataFrame: Same result as process_car_listings.
+        """
+        data = self.data
+        if not data.approval_index:
+            print("CRITICAL: No approved vehicles loaded. Cannot process listings against approval list.")
+        chunks = [(listings[start:start + chunk_size], start) for start in range(0, len(listings), chunk_size)]
+        if len(chunks) <= 1:
+            return self._finalize_results(self._score_listings(listings, data, top_deals=top_deals))
+
+        settings = {"tax_rate": self.tax_rate, "annual_insurance_cost": self.estimated_annual_insurance,
+                    "province": self.province}
+        processed_cars = []
+        with publish_scoring_data(data) as shared:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_scoring_worker,
+                                     initargs=(shared.name, self.reliability_data_path, settings)) as pool:
+                for chunk_result in pool.map(_score_chunk, chunks):
+                    processed_cars.extend(chunk_result)
+                    if top_deals is not None:
+                        top_deals.extend(chunk_result)
+        return self._finalize_results(processed_cars)
+
+    @classmethod
+    def from_shared(cls, name, reliability_data_path=None, **kwargs):
+        """A processor scoring with the ScoringData published as shared memory block `name` (see publish())."""
+        return cls(reliability_data_path, scoring_data=attach_scoring_data(name), **kwargs)
+
+    def publish(self):
+        """
+        Publish the current snapshot to shared memory for from_shared() in other processes.
+
+        Returns:
+            SharedScoringData: Handle owning the block; close() it once the workers are done
+        """
+        return publish_scoring_data(self.data)
+
+    def _score_listings(self, listings, data, index_offset=0, top_deals=None):
+        """Filter and score listings against `data`; `index_offset` is the position of listings[0] in the whole batch."""
+        processed_cars = []
+        for i, car_data in enumerate(listings, start=index_offset):
             # Ensure basic fields are present
             if not all(k in car_data for k in ['make', 'model', 'year', 'price', 'mileage', 'url']):
                 print(f"Skipping car due to missing essential fields: {car_data.get('title', 'N/A')}")
@@ -583,11 +644,9 @@ class VehicleDataProcessor:
                 print(f"DEBUG: Skipping car due to invalid or missing year: {car_data.get('title', 'N/A')}")
                 continue
 
-            if not self.approved_make_model_set: # If set is empty (e.g. file load failed but we didn't exit)
-                 print(f"DEBUG: Approved make/model set is empty. Cannot filter {scraped_make_lc} {scraped_model_norm}. Processing depends on error handling strategy.")
-                 # To strictly enforce, we might 'continue' here. For now, let it pass if set is empty due to load failure.
-                 # This assumes if the file is truly missing and critical, earlier checks in __init__ or main would halt.
-            elif (scraped_make_lc, scraped_model_norm) not in self.approved_make_model_set:
+            # Same rules as the scrapers: trims of an approved model and the approved years only
+            approved_row = data.approval_index.find(scraped_make_lc, scraped_model_norm, scraped_year)
+            if approved_row < 0:
                 # print(f"DEBUG: Skipping car {scraped_make_lc} {scraped_model_norm} as it's not in the approved list.")
                 continue
             
@@ -595,19 +654,6 @@ class VehicleDataProcessor:
             # print(f"DP_DEBUG Pre-TCO: Make={car_data.get('make')}, Model={car_data.get('model')}, Year={scraped_year}, Price={price}, Mileage={car_data.get('mileage')}")
 
             try:
-                # --- Match against approved vehicles list (using Make, Model, Year) ---
-                matched_approved_vehicle_data = None
-                for approved_vehicle in self.approved_vehicles_data:
-                    if (scraped_make_lc == approved_vehicle['Make_lc'] and 
-                        scraped_year == approved_vehicle['Year'] and 
-                        scraped_model_norm.startswith(approved_vehicle['Model_norm'])):
-                        matched_approved_vehicle_data = approved_vehicle
-                        break # Found a match
-                
-                if not matched_approved_vehicle_data:
-                    # print(f"Skipping unmatched vehicle: {scraped_make_lc} {scraped_model_full} {scraped_year}")
-                    continue # Not in the approved list
-                
                 # --- Vehicle is approved, proceed with processing ---
                 # print(f"Processing approved vehicle: {scraped_make_lc} {scraped_model_full} {scraped_year}")
 
@@ -652,10 +698,10 @@ class VehicleDataProcessor:
                     })
                     continue
                 
-                tco_details = self.calculate_tco(price, make, model_name, year, mileage, province_code=self.province)
+                tco_details = self.calculate_tco(price, make, model_name, year, mileage, province_code=self.province, data=data)
 
-                # Get CompositeScore from matched_approved_vehicle_data
-                composite_score = matched_approved_vehicle_data.get('CompositeScore', 0)
+                # Composite score of the matched approved vehicle (0 if missing)
+                composite_score = data.approval_index.value(approved_row, 'Composite score', default=0)
 
                 car_processed_data = {
                     'id': listing_id,
@@ -680,6 +726,8 @@ class VehicleDataProcessor:
                 # --- End Debug Print ---
 
                 processed_cars.append(car_processed_data)
+                if top_deals is not None:
+                    top_deals.push(car_processed_data)
 
             except Exception as e:
                 print(f"Error processing car: {car_data}. Error: {e}")
@@ -694,6 +742,10 @@ class VehicleDataProcessor:
                     'deal_score': np.nan, 'error_processing': str(e)
                 })
 
+        return processed_cars
+
+    def _finalize_results(self, processed_cars):
+        """Build the results DataFrame from scored listings, with the TCO details expanded into columns."""
         df = pd.DataFrame(processed_cars)
         
         # Expand TCO details into separate columns if the column exists and is not empty
@@ -839,4 +891,19 @@ class VehicleDataProcessor:
             
         df_copy_for_export.to_csv(output_file, index=False)
         print(f"Exported {len(df_final_export)} listings to {output_file}")
-        return str(output_file) 
\ No newline at end of file
+        return str(output_file) 
+
+
+# Worker-process side of process_car_listings_in_processes: one processor per worker,
+# attached to the parent's shared snapshot by the pool initializer.
+_worker_processor = None
+
+
+def _init_scoring_worker(name, reliability_data_path, settings):
+    global _worker_processor
+    _worker_processor = VehicleDataProcessor.from_shared(name, reliability_data_path, **settings)
+
+
+def _score_chunk(chunk):
+    listings, index_offset = chunk
+    return _worker_processor._score_listings(listings, _worker_processor.data, index_offset)
@@ -0,0 +1,165 @@
+"""
+Incremental ingestion of the Facebook Marketplace CSV exports (data/facebook-*.csv).
+
+A checkpoint manifest records, per export, its size, mtime, a SHA-256 of the bytes
+already ingested, and how many rows and bytes have been processed. On the next run:
+- unchanged files (same size and mtime) are skipped without being opened
+- compressed exports (.gz/.zst) are re-read in full whenever they change
+- files that only grew are parsed from the last processed byte
+- rewritten files (the ingested prefix no longer hashes the same) and new files
+  are parsed in full
+
+The manifest is saved by commit(), after the caller has stored the listings, so a
+failed run is simply ingested again.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from src.input_streams import COMPRESSED_SUFFIXES, compression_of, mapped
+from src.process_facebook_data import ENGINE_PANDAS, ENGINE_ROWS, parse_facebook_csv, parse_facebook_tail
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_FACEBOOK_DIR = PROJECT_ROOT / "data"
+DEFAULT_FACEBOOK_PATTERN = "facebook-*.csv"
+DEFAULT_MANIFEST_PATH = PROJECT_ROOT / "logs" / "facebook_ingest.json"
+
+FACEBOOK_SOURCE_NAME = "Facebook Marketplace"
+
+_MANIFEST_VERSION = 1
+_HASH_BLOCK_BYTES = 1024 * 1024
+
+
+def _sha256_of_range(path, start, end, hasher=None):
+    """Feed (decompressed) bytes [start, end) of `path` into `hasher` (a new SHA-256 if None) and return it."""
+    hasher = hasher or hashlib.sha256()
+    with mapped(path) as buffer:
+        view = memoryview(buffer)
+        try:
+            for offset in range(start, min(end, len(buffer)), _HASH_BLOCK_BYTES):
+                hasher.update(view[offset:min(offset + _HASH_BLOCK_BYTES, end)]) # No copy out of the mapping
+        finally:
+            view.release()
+    return hasher
+
+
+class FacebookIngest:
+    """Finds new Facebook export rows since the last committed run."""
+
+    def __init__(self, data_dir=DEFAULT_FACEBOOK_DIR, pattern=DEFAULT_FACEBOOK_PATTERN,
+                 manifest_path=DEFAULT_MANIFEST_PATH, engine=ENGINE_ROWS):
+        """
+        Args:
+            data_dir (str or Path): Directory holding the exports
+            pattern (str): Glob for the export files
+            manifest_path (str or Path): Checkpoint manifest (JSON)
+            engine (str): Parser for whole files, ENGINE_ROWS or ENGINE_PANDAS (appended tails are parsed row by row)
+        """
+        self.data_dir = Path(data_dir)
+        self.pattern = pattern
+        self.manifest_path = Path(manifest_path)
+        self.engine = engine
+        self._manifest = self._load_manifest()
+        self._pending = {}
+
+    def collect(self):
+        """
+        Parse what is new in the exports since the last commit().
+
+        Returns:
+            list: Listing dicts with the scrapers' fields (source, body_type) added
+        """
+        listings = []
+        # Archived exports may be compressed (facebook-2025-05-16.csv.gz / .zst)
+        files = sorted({path for suffix in ("", *COMPRESSED_SUFFIXES) for path in self.data_dir.glob(self.pattern + suffix)})
+        skipped = 0
+        for path in files:
+            key = str(path.resolve())
+            try:
+                stat = path.stat()
+            except OSError as e:
+                print(f"Could not stat Facebook export {path}: {e}")
+                continue
+            entry = self._manifest["files"].get(key)
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                skipped += 1
+                continue
+
+            try:
+                file_listings, new_entry = self._ingest_file(path, stat, entry)
+            except (OSError, ValueError) as e:
+                print(f"Error ingesting Facebook export {path}: {e}")
+                continue
+            self._pending[key] = new_entry
+            listings.extend(file_listings)
+
+        for listing in listings:
+            listing.setdefault("source", FACEBOOK_SOURCE_NAME)
+            listing.setdefault("body_type", "unknown")
+        print(f"Facebook exports: {len(files)} found, {skipped} unchanged since the last run, "
+              f"{len(self._pending)} (re)ingested, {len(listings)} new listings.")
+        return listings
+
+    def _ingest_file(self, path, stat, entry):
+        start = 0
+        rows_before = 0
+        hasher = None
+        if entry and compression_of(path):
+            print(f"{path.name} changed; ingesting it again from the start.") # Offsets are not comparable across recompression
+        elif entry and stat.st_size >= entry["bytes_processed"]:
+            # Appended to? Only if the part ingested last time is byte-for-byte the same
+            hasher = _sha256_of_range(path, 0, entry["bytes_processed"])
+            if hasher.hexdigest() == entry["sha256"]:
+                start = entry["bytes_processed"]
+                rows_before = entry["rows_processed"]
+            else:
+                print(f"{path.name} was rewritten; ingesting it again from the start.")
+                hasher = None
+        elif entry:
+            print(f"{path.name} shrank; ingesting it again from the start.")
+
+        listings, end_offset, rows_read = parse_facebook_tail(path, start)
+        if start == 0 and self.engine == ENGINE_PANDAS and rows_read and not compression_of(path) and end_offset == stat.st_size:
+            listings = parse_facebook_csv(str(path), engine=ENGINE_PANDAS) # Same rows, parsed column-wise
+        hasher = _sha256_of_range(path, start if hasher else 0, end_offset, hasher)
+
+        print(f"{path.name}: {rows_read} rows read from byte {start}, {len(listings)} listings kept.")
+        return listings, {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": hasher.hexdigest(),
+            "bytes_processed": end_offset,
+            "rows_processed": rows_before + rows_read,
+            "ingested_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def commit(self):
+        """Save the checkpoints of the files parsed by collect() (call once their listings are stored)."""
+        if not self._pending:
+            return
+        self._manifest["files"].update(self._pending)
+        try:
+            self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._manifest, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.manifest_path)
+            self._pending = {}
+        except OSError as e:
+            print(f"Could not save Facebook ingest manifest to {self.manifest_path}: {e}")
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == _MANIFEST_VERSION and isinstance(data.get("files"), dict):
+                return data
+            print(f"Ignoring Facebook ingest manifest {self.manifest_path} with an unknown format.")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Could not read Facebook ingest manifest {self.manifest_path}: {e}. Ingesting all exports.")
+        return {"version": _MANIFEST_VERSION, "files": {}}
@@ -0,0 +1,74 @@
+"""
+Polling watcher for the reference data files (approved vehicles, reliability, fuel).
+
+A daemon thread stats the watched files every `interval_s` and calls `on_change`
+with the paths whose (mtime, size) changed. Polling is used rather than inotify so
+it works the same on every platform and on network drives; a stat per file every
+few seconds costs nothing next to a scrape.
+"""
+
+import os
+import threading
+from pathlib import Path
+
+
+def file_version(path):
+    """(mtime_ns, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class FileWatcher:
+    """Calls a function when any of a set of files changes."""
+
+    def __init__(self, paths, on_change, interval_s=2.0, name="file-watcher"):
+        """
+        Args:
+            paths (iterable): Files to watch (missing files are watched for creation)
+            on_change (callable): Called from the watcher thread with the list of changed paths
+            interval_s (float): Seconds between polls
+            name (str): Thread name
+        """
+        self.paths = [Path(p) for p in paths]
+        self.on_change = on_change
+        self.interval_s = interval_s
+        self.name = name
+        self._versions = {path: file_version(path) for path in self.paths}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        """Poll once; call on_change if anything changed. Returns the changed paths."""
+        changed = []
+        for path in self.paths:
+            version = file_version(path)
+            if version != self._versions[path]:
+                self._versions[path] = version
+                changed.append(path)
+        if changed:
+            try:
+                self.on_change(changed)
+            except Exception as e:  # Keep watching; the next change gets another try
+                print(f"{self.name}: error handling change to {', '.join(p.name for p in changed)}: {e}")
+        return changed
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 1)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.check()
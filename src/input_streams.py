@@ -0,0 +1,84 @@
+"""
+Opening bulk input files (listing exports, reference CSVs) whatever their storage.
+
+`.gz` and `.zst` files are decompressed as a stream (zstd needs the optional
+`zstandard` package), so archived exports can stay compressed in data/. Large
+uncompressed files are memory-mapped for byte-level work (row boundary scans,
+hashing, slicing a byte range) so no copy of the file is read into memory.
+"""
+
+import gzip
+import io
+import mmap
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSED_SUFFIXES = {".gz": COMPRESSION_GZIP, ".zst": COMPRESSION_ZSTD}
+
+# Smaller files are simply read; mapping them costs more than it saves
+MMAP_MIN_BYTES = 1024 * 1024
+
+
+def compression_of(path):
+    """COMPRESSION_GZIP / COMPRESSION_ZSTD from the file suffix, or None for a plain file."""
+    return COMPRESSED_SUFFIXES.get(Path(path).suffix.lower())
+
+
+def logical_name(path):
+    """File name without the compression suffix ("facebook-2025-05-16.csv.gz" -> "facebook-2025-05-16.csv")."""
+    path = Path(path)
+    return path.stem if compression_of(path) else path.name
+
+
+def open_binary(path):
+    """Binary read stream of the (decompressed) contents."""
+    compression = compression_of(path)
+    if compression == COMPRESSION_GZIP:
+        return gzip.open(path, "rb")
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ImportError(f"Reading {path} needs the 'zstandard' package (pip install zstandard).")
+        raw = open(path, "rb")
+        try:
+            return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True, read_across_frames=True)
+        except BaseException:
+            raw.close()
+            raise
+    return open(path, "rb")
+
+
+def open_text(path, encoding="utf-8", newline=""):
+    """Text read stream of the (decompressed) contents; newline='' as the csv module expects."""
+    if compression_of(path) is None:
+        return open(path, mode="r", encoding=encoding, newline=newline)
+    return io.TextIOWrapper(io.BufferedReader(open_binary(path)), encoding=encoding, newline=newline)
+
+
+@contextmanager
+def mapped(path):
+    """
+    The whole (decompressed) contents as a read-only buffer.
+
+    Plain files of at least MMAP_MIN_BYTES are memory-mapped; smaller and compressed
+    files are read into bytes. Either way the buffer supports len(), slicing and find().
+    """
+    if compression_of(path) is not None:
+        with open_binary(path) as f:
+            yield f.read()
+        return
+    with open(path, "rb") as f:
+        size = f.seek(0, io.SEEK_END)
+        if size < MMAP_MIN_BYTES:
+            f.seek(0)
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
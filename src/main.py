@@ -1,19 +1,41 @@
 import os
 import argparse
+import asyncio
 from pathlib import Path
-import pandas as pd
 import shutil
 import random # Added for playwright scraper if it uses it
+import time
 
 # Import scrapers
 # from src.scrapers.autotrader_scraper import AutoTraderScraper # REMOVE Selenium version
 from src.scrapers.autotrader_scraper_playwright import AutoTraderPlaywrightScraper # ADD Playwright version
 from src.scrapers.cargurus_scraper import CarGurusScraper
 from src.scrapers.facebook_scraper import FacebookMarketplaceScraper # Selenium based
-from src.scrapers.facebook_scraper_playwright import FacebookMarketplacePlaywrightScraper # ADDED
+from src.scrapers.facebook_scraper_playwright import FacebookMarketplacePlaywrightScraper, EXTRACTION_NETWORK, EXTRACTION_DOM
+from src.scrapers.tracing import TRACE_MODES, TRACE_MODE_OFF
+from src.scrapers.artifact_store import DebugArtifactStore
+from src.scrapers.replay import ReplayArchive, REPLAY_MODE_RECORD, REPLAY_MODE_REPLAY
 
 # Import data processor
 from src.data_processor import VehicleDataProcessor
+from src.processors.approval_index import ApprovalSource
+from src.processors.top_deals import TopDeals
+
+async def scrape_all(scrapers, limit):
+    """Run all scrapers concurrently on one event loop and return their combined listings."""
+    async def run(scraper):
+        print(f"\nUsing {scraper.name} with {type(scraper).__name__} scraper")
+        started = time.perf_counter()
+        try:
+            listings = await scraper.scrape(limit)
+        except Exception as e:
+            print(f"Error scraping {scraper.name}: {str(e)}")
+            return []
+        print(f"{scraper.name} finished in {time.perf_counter() - started:.2f}s with {len(listings)} listings")
+        return listings
+
+    results = await asyncio.gather(*(run(scraper) for scraper in scrapers))
+    return [listing for listings in results for listing in listings]
 
 def main():
     """Main function to run the car deal finder."""
@@ -27,8 +49,30 @@ def main():
                         help="Scraping method to use for Facebook (defaults to playwright)")
     parser.add_argument("--sites", type=str, default="all", 
                         help="Sites to scrape (comma-separated: autotrader,cargurus,facebook,all)")
+    parser.add_argument("--facebook_extraction", type=str, default=EXTRACTION_NETWORK, choices=[EXTRACTION_NETWORK, EXTRACTION_DOM],
+                        help="Facebook (Playwright): decode listings from the feed's network responses (default) or read the rendered cards")
+    parser.add_argument("--autotrader_trace", type=str, default=TRACE_MODE_OFF, choices=TRACE_MODES,
+                        help="Playwright tracing for AutoTrader: off (default), on-failure or always")
+    parser.add_argument("--cargurus_trace", type=str, default=TRACE_MODE_OFF, choices=TRACE_MODES,
+                        help="Playwright tracing for CarGurus: off (default), on-failure or always")
+    parser.add_argument("--trace_dir", type=str, default=None, help="Directory for saved Playwright traces (default: logs/traces)")
+    parser.add_argument("--artifact_dir", type=str, default=None, help="Directory for compressed debug page dumps (default: logs/artifacts)")
+    replay_group = parser.add_mutually_exclusive_group()
+    replay_group.add_argument("--record", type=str, default=None, metavar="ARCHIVE_DIR",
+                              help="Record browser traffic of the Playwright scrapers into a replay archive")
+    replay_group.add_argument("--replay", type=str, default=None, metavar="ARCHIVE_DIR",
+                              help="Serve browser traffic from a replay archive instead of the live sites")
+    parser.add_argument("--replay_latency_ms", type=float, default=0, help="Added latency per replayed response")
+    parser.add_argument("--replay_bandwidth_kbps", type=float, default=None, help="Simulated bandwidth for replayed responses")
     
     args = parser.parse_args()
+
+    replay = None
+    if args.record:
+        replay = ReplayArchive(args.record, mode=REPLAY_MODE_RECORD)
+    elif args.replay:
+        replay = ReplayArchive(args.replay, mode=REPLAY_MODE_REPLAY, latency_ms=args.replay_latency_ms,
+                               bandwidth_kbps=args.replay_bandwidth_kbps)
     
     # Set up paths
     base_dir = Path(__file__).parent.parent
@@ -80,29 +124,19 @@ def main():
                 print(f"Error copying reliability data: {str(e)}")
                 return
     
-    # Initialize data processor
-    data_processor = VehicleDataProcessor(reliability_data_path)
-    
-    # --- Load Approved Vehicles for Scraper Filtering ---
-    approved_vehicles_for_scraping = []
-    # Use the same reliability_data_path that was confirmed or copied earlier
-    approved_vehicles_csv_for_scraping_path = reliability_data_path 
-    if approved_vehicles_csv_for_scraping_path.exists():
-        try:
-            df_approved = pd.read_csv(approved_vehicles_csv_for_scraping_path, usecols=['Make', 'Model', 'Year'])
-            df_approved.dropna(inplace=True)
-            df_approved['Make_lc'] = df_approved['Make'].str.lower().str.strip()
-            df_approved['Model_norm'] = df_approved['Model'].str.lower().str.replace('-', ' ', regex=False).str.strip()
-            # Ensure Year is integer
-            df_approved['Year'] = pd.to_numeric(df_approved['Year'], errors='coerce').dropna().astype(int)
-            approved_vehicles_for_scraping = list(zip(df_approved['Make_lc'], df_approved['Model_norm'], df_approved['Year']))
-            print(f"Loaded {len(approved_vehicles_for_scraping)} approved make/model/year combinations for scraper filtering.")
-        except Exception as e:
-            print(f"Warning: Could not load or process approved vehicles for scraper filtering from {approved_vehicles_csv_for_scraping_path}: {e}")
+    # --- Load Approved Vehicles (one source for the scrapers and the data processor) ---
+    # The scrapers and the data processor follow it, so edits to the file are picked up without a restart.
+    approval_source = ApprovalSource(reliability_data_path)
+    if reliability_data_path.exists():
+        approval_index = approval_source.refresh()
+        print(f"Loaded {len(approval_index)} approved make/model/year combinations for scraper filtering.")
     else:
-        print(f"Warning: Approved vehicles file {approved_vehicles_csv_for_scraping_path} not found. Scrapers will not pre-filter by make/model/year.")
+        print(f"Warning: Approved vehicles file {reliability_data_path} not found. Scrapers will not pre-filter by make/model/year.")
     # --- End Load Approved Vehicles ---
 
+    # Initialize data processor
+    data_processor = VehicleDataProcessor(reliability_data_path, approval_index=approval_source)
+
     # Determine which sites to scrape
     sites_to_scrape = args.sites.lower().split(',')
     if 'all' in sites_to_scrape:
@@ -134,56 +168,72 @@ def main():
     if 'autotrader' in sites_to_scrape:
         scrapers.append(AutoTraderPlaywrightScraper(
             postal_code=args.postal_code, 
-            approved_vehicles_list=approved_vehicles_for_scraping
+            approved_vehicles_list=approval_source,
+            replay=replay,
+            trace_mode=args.autotrader_trace,
+            trace_dir=args.trace_dir
         ))
     
     if 'cargurus' in sites_to_scrape:
         scrapers.append(CarGurusScraper(
             postal_code=args.postal_code,
-            approved_vehicles_list=approved_vehicles_for_scraping
+            approved_vehicles_list=approval_source,
+            trace_mode=args.cargurus_trace,
+            trace_dir=args.trace_dir,
+            artifact_store=DebugArtifactStore(root_dir=args.artifact_dir),
+            replay=replay
         ))
     
     if 'facebook' in sites_to_scrape:
-        if facebook_scraper_class:
+        if facebook_scraper_class is FacebookMarketplacePlaywrightScraper:
+            scrapers.append(facebook_scraper_class(replay=replay, extraction=args.facebook_extraction))
+        elif facebook_scraper_class:
             scrapers.append(facebook_scraper_class())
         else:
             print("Error: No Facebook scraper class was selected. Check --method argument.")
 
-    # Scrape listings
-    all_listings = []
-    
-    for scraper in scrapers:
-        print(f"\nUsing {scraper.name} with {type(scraper).__name__} scraper")
-        listings = scraper.scrape(args.limit)
-        all_listings.extend(listings)
+    # Reload the approvals, reliability and fuel data in the background whenever the files change,
+    # so edits made during a long scrape are in place by the time listings are scored
+    data_processor.watch()
+    try:
+        # Scrape listings (all sites concurrently)
+        started = time.perf_counter()
+        all_listings = asyncio.run(scrape_all(scrapers, args.limit))
+        print(f"\nScraping finished in {time.perf_counter() - started:.2f}s")
+
+        if replay:
+            replay.close()
     
-    # Process listings
-    if all_listings:
-        print("\nProcessing listings...")
-        results_df = data_processor.process_car_listings(all_listings)
+        # Process listings
+        if all_listings:
+            print("\nProcessing listings...")
+            data_processor.reload() # Picks up an edit the watcher has not polled yet
+            top_deals = TopDeals(k=5) # Best deals kept as listings are scored; no sort of the results
+            results_df = data_processor.process_car_listings(all_listings, top_deals=top_deals)
         
-        # Export results
-        if not results_df.empty:
-            output_file = data_processor.export_to_csv(results_df, output_path)
-            print(f"\nResults exported to {output_file}")
-            print(f"Found {len(results_df)} deals")
+            # Export results
+            if not results_df.empty:
+                output_file = data_processor.export_to_csv(results_df, output_path)
+                print(f"\nResults exported to {output_file}")
+                print(f"Found {len(results_df)} deals")
             
-            # Display top 5 deals
-            if len(results_df) > 0:
-                print("\nTop 5 Best Deals:")
-                top_deals = results_df.head(5)
+                # Display top 5 deals
+                if len(top_deals) > 0:
+                    print("\nTop 5 Best Deals:")
                 
-                for i, (_, deal) in enumerate(top_deals.iterrows(), 1):
-                    print(f"{i}. {deal['year']} {deal['make']} {deal['model']}")
-                    print(f"   Price: ${deal['price']:.2f}, Mileage: {deal['mileage']:.0f} km")
-                    print(f"   Composite Score: {deal['composite_score']:.2f}")
-                    print(f"   Deal Score: {deal['deal_score']:.2f}")
-                    print(f"   URL: {deal['url']}")
-                    print()
+                    for i, deal in enumerate(top_deals.best(), 1):
+                        print(f"{i}. {deal['year']} {deal['make']} {deal['model']}")
+                        print(f"   Price: ${deal['price']:.2f}, Mileage: {deal['mileage']:.0f} km")
+                        print(f"   Composite Score: {deal['composite_score']:.2f}")
+                        print(f"   Deal Score: {deal['deal_score']:.2f}")
+                        print(f"   URL: {deal['url']}")
+                        print()
+            else:
+                print("No valid listings found after processing")
         else:
-            print("No valid listings found after processing")
-    else:
-        print("No listings found to process")
+            print("No listings found to process")
+    finally:
+        data_processor.stop_watching()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,7 +1,15 @@
 import csv
+import io
 import re
 import os
 import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from src.input_streams import compression_of, logical_name, mapped, open_text
+from src.processors.make_model_recognizer import get_recognizer
+from src.processors.approval_index import get_approval_index
+from src.processors.title_classifier import get_non_vehicle_classifier, is_non_vehicle_title
 
 # Get the absolute path of the directory where the script is located
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -13,76 +21,8 @@ output_csv_path = os.path.join(script_dir, "../data/output.csv") # This might al
 
 # --- Helper Functions ---
 def parse_title(title_str):
-    if not title_str or not isinstance(title_str, str):
-        return None, None, None
-    
-    # Regex to find a 4-digit year
-    year_match = re.search(r'\b(\d{4})\b', title_str)
-    year = int(year_match.group(1)) if year_match else None
-    
-    # Remaining string after attempting to extract year
-    remaining_title = title_str.replace(year_match.group(0), '').strip() if year_match else title_str
-    
-    # Tentative: Split the rest by space, assume first word is Make, rest is Model
-    # This is a simplification and might need refinement
-    parts = remaining_title.split()
-    make = None
-    model = None
-
-    if not year: # If no year, very hard to determine make/model reliably from title alone
-        # try to see if first word is a common make even without year
-        # This helps with titles like "Honda Civic" without a year explicitly stated
-        potential_makes = [
-            "Acura", "Audi", "BMW", "Buick", "Cadillac", "Chevrolet", "Chrysler", "Dodge", "Ford", "GMC", 
-            "Honda", "Hyundai", "Infiniti", "Jaguar", "Jeep", "Kia", "Land Rover", "Lexus", "Lincoln", 
-            "Mazda", "Mercedes-Benz", "MINI", "Mitsubishi", "Nissan", "Porsche", "Ram", "Scion", 
-            "Subaru", "Suzuki", "Tesla", "Toyota", "Volkswagen", "Volvo"
-        ]
-        if parts and parts[0] in potential_makes:
-            make = parts[0]
-            model = " ".join(parts[1:]) if len(parts) > 1 else None
-        elif len(parts) >= 2: # if not a known make, but has at least two words
-             # take first word as make and second as model
-            make = parts[0]
-            model = parts[1]
-
-    elif parts:
-        # Common makes to help with parsing
-        # Order matters for multi-word makes (e.g., "Land Rover" before "Rover")
-        known_makes_map = {
-            "Land Rover": "Land Rover",
-            "Mercedes-Benz": "Mercedes-Benz",
-            # Single word makes
-            "Acura": "Acura", "Alfa Romeo": "Alfa Romeo", "Aston Martin": "Aston Martin",
-            "Audi": "Audi", "Bentley": "Bentley", "BMW": "BMW", "Buick": "Buick",
-            "Cadillac": "Cadillac", "Chevrolet": "Chevrolet", "Chrysler": "Chrysler",
-            "Dodge": "Dodge", "Ferrari": "Ferrari", "Fiat": "Fiat", "Ford": "Ford",
-            "Genesis": "Genesis", "GMC": "GMC", "Honda": "Honda", "Hyundai": "Hyundai",
-            "Infiniti": "Infiniti", "Jaguar": "Jaguar", "Jeep": "Jeep", "Kia": "Kia",
-            "Lamborghini": "Lamborghini", "Lexus": "Lexus", "Lincoln": "Lincoln",
-            "Lotus": "Lotus", "Maserati": "Maserati", "Mazda": "Mazda",
-            "McLaren": "McLaren", "MINI": "MINI", "Mitsubishi": "Mitsubishi",
-            "Nissan": "Nissan", "Polestar": "Polestar", "Pontiac": "Pontiac", "Porsche": "Porsche",
-            "Ram": "Ram", "Rivian": "Rivian", "Rolls-Royce": "Rolls-Royce", "Saab": "Saab",
-            "Saturn": "Saturn", "Scion": "Scion", "Smart": "Smart", "Subaru": "Subaru",
-            "Suzuki": "Suzuki", "Tesla": "Tesla", "Toyota": "Toyota",
-            "Volkswagen": "Volkswagen", "Volvo": "Volvo"
-        }
-
-        # Check for two-word makes first
-        if len(parts) >= 2 and f"{parts[0]} {parts[1]}" in known_makes_map:
-            make = known_makes_map[f"{parts[0]} {parts[1]}"]
-            model = " ".join(parts[2:])
-        elif parts[0] in known_makes_map:
-            make = known_makes_map[parts[0]]
-            model = " ".join(parts[1:])
-        else: # If make not in known_makes, assume first word is make, rest is model
-            make = parts[0]
-            model = " ".join(parts[1:])
-
-    if model == "": model = None # Handle cases where model becomes empty string
-
-    return year, make, model
+    """Return (year, make, model) for a listing title; make/model are normalized (lowercase)."""
+    return get_recognizer().parse(title_str)
 
 def parse_price(price_str):
     if not price_str or not isinstance(price_str, str):
@@ -136,166 +76,503 @@ def parse_mileage(mileage_str):
 
     return None
 
-# --- Load Approved Vehicles --- (Make, Model, Year)
-approved_vehicles = set()
-try:
-    with open(approved_vehicles_csv_path, mode='r', encoding='utf-8-sig') as f_approved:
-        reader = csv.reader(f_approved)
-        header_approved = next(reader) # Skip header
-        make_col_idx = header_approved.index('Make')
-        model_col_idx = header_approved.index('Model')
-        year_col_idx = header_approved.index('Year')
-        for row in reader:
-            try:
-                make = row[make_col_idx].strip().lower()
-                model = row[model_col_idx].strip().lower()
-                year = int(row[year_col_idx].strip())
-                approved_vehicles.add((make, model, year))
-                # Add variations for model (e.g. mazda3 vs mazda 3)
-                approved_vehicles.add((make, model.replace(" ", ""), year))
-                approved_vehicles.add((make, model.replace("-", ""), year))
-                approved_vehicles.add((make, model.replace(" ", "-"), year))
-
-            except (ValueError, IndexError):
-                # print(f"Skipping bad row in approved_vehicles: {row}")
-                continue
-except FileNotFoundError:
-    print(f"Error: Approved vehicles file not found at {approved_vehicles_csv_path}")
-    # exit()
-except Exception as e:
-    print(f"Error reading approved_vehicles: {e}")
-    # exit()
+# --- Approved Vehicles --- (Make, Model, Year)
+# Loaded on first use through the shared approval index and reloaded when the CSV changes.
+def get_approved_vehicles():
+    """The shared ApprovalIndex (the same approval rules as the scrapers and VehicleDataProcessor)."""
+    return get_approval_index()
 
 # --- Process Facebook Data --- #
 # processed_listings = [] # This will be initialized in the function
 
-non_vehicle_keywords = [
-    "parts", "wanted", "buy cars", "cash for cars", "scrap", "tires", "rims", "engine", 
-    "transmission", "battery", "wrecking", "salvage", "repair", "service", "mechanic",
-    "desk", "cowl", "enclosed mobility", "scooter", "trades or offer", "we buy cars", "cash cash cash",
-    "any car and truck"
+# Rows per chunk yielded by iter_facebook_csv
+DEFAULT_CHUNK_ROWS = 1000
+# Target size of the byte ranges handed to each worker process
+DEFAULT_RANGE_BYTES = 4 * 1024 * 1024
+_BOUNDARY_SCAN_BYTES = 1024 * 1024
+
+
+def _column_indices(header_fb):
+    """Column positions of the fields we use, found by header name (with the old fixed positions as fallback)."""
+    # Attempt to dynamically find column indices, default if not found or error
+    try:
+        cols = {
+            "url": header_fb.index('Link'), # Common name for URL
+            "price": header_fb.index('Price'),
+            "title": header_fb.index('Title'),
+            "location": header_fb.index('Location'),
+            "mileage": header_fb.index('Mileage'),
+            # For alternative price, check if 'Alternate Price' or similar exists
+            "alt_price": header_fb.index('Alternate Price') if 'Alternate Price' in header_fb else -1,
+        }
+    except ValueError:
+        # Fallback to default indices if specific headers are not found
+        print("Warning: Could not find all expected headers (Link, Price, Title, Location, Mileage). Using default column indices [0,2,3,4,5]. This may lead to incorrect parsing.")
+        cols = {"url": 0, "price": 2, "title": 3, "location": 4, "mileage": 5,
+                "alt_price": 6 if len(header_fb) > 6 else -1}
+    return cols
+
+
+def _file_info(input_csv_path):
+    """Per-file values stamped on (or used for) every row, computed once instead of per row."""
+    return {
+        "source_file": logical_name(input_csv_path), # Add source file (the same name whether compressed or not)
+        "scraped_date": datetime.date.today().isoformat(), # Add scraped date
+        "current_year": datetime.datetime.now().year,
+        "approved_vehicles": get_approved_vehicles(), # One snapshot per file (also shipped to worker processes)
+    }
+
+
+def _parse_row(row, cols, file_info):
+    """Parse one export row into a listing dict, or None if the row is filtered out."""
+    def field(name):
+        idx = cols[name]
+        # Defensive access to row elements
+        return row[idx].strip() if idx != -1 and len(row) > idx and row[idx] else None
+
+    title_str = field("title")
+    price_str = field("price")
+    mileage_str = field("mileage")
+    url = field("url")
+    location = field("location")
+    alt_price_str = field("alt_price") or None
+
+    if not title_str:
+        return None
+
+    if is_non_vehicle_title(title_str):
+        return None
+
+    year, make, model = parse_title(title_str)
+    if not year or not make or not model:
+        return None
+
+    if not file_info["approved_vehicles"].matches(make, model, year):
+        return None
+
+    mileage_km = parse_mileage(mileage_str)
+    if mileage_km is None and "enclosed mobility" not in title_str.lower() and "scooter" not in title_str.lower():
+        mileage_km = -1
+    elif mileage_km is not None:
+        mileage_km = int(mileage_km)
+
+    price = parse_price(price_str)
+    if price is None and alt_price_str:
+        price = parse_price(alt_price_str)
+
+    if price == 0: # Skip free listings
+        return None
+
+    # Stricter filter for very cheap vehicles that are likely not cars or are problematic
+    if price is not None and price < 1000: # Increased threshold slightly
+        # If it's very new (e.g. < 5 years old) and < $1000, it's suspicious
+        is_suspiciously_new = year is not None and (file_info["current_year"] - year) < 5
+        # If it's very low mileage (e.g. < 50000km) and < $1000, also suspicious
+        is_suspiciously_low_mileage = mileage_km is not None and mileage_km != -1 and mileage_km < 50000
+
+        if is_suspiciously_new or is_suspiciously_low_mileage:
+            return None
+
+    if price is None: # Skip if price couldn't be parsed at all
+        return None
+
+    # Ensure values are appropriate before adding
+    # Example: ensure year is plausible, mileage isn't excessively high for the price etc.
+    # For now, this is basic, can be expanded.
+    if year and year < 1980: # Skip very old cars unless specifically desired
+        return None
+
+    return {
+        "title": title_str,
+        "price": price,
+        "year": year,
+        "make": make,
+        "model": model,
+        "mileage": mileage_km if mileage_km is not None else -1, # Use -1 for unknown after filtering
+        "location": location,
+        "url": url,
+        "source_file": file_info["source_file"],
+        "scraped_date": file_info["scraped_date"],
+    }
+
+
+def _parse_rows(rows, cols, file_info, chunk_size):
+    """Parse `rows` and yield the kept listings in lists of up to `chunk_size`."""
+    chunk = []
+    for row in rows:
+        try:
+            listing = _parse_row(row, cols, file_info)
+        except Exception:
+            continue
+        if listing is None:
+            continue
+        chunk.append(listing)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _row_boundaries(buffer, start, targets):
+    """
+    Byte offsets of the first row start at or after each target offset in `buffer` (see input_streams.mapped).
+
+    A newline ends a row only outside a quoted field, so the buffer is scanned from `start` (a
+    known row start) keeping the parity of the quote characters seen. Counting bytes is far
+    cheaper than parsing, and it keeps quoted titles with embedded newlines in one piece.
+    """
+    boundaries = []
+    targets = iter(sorted(targets))
+    target = next(targets, None)
+    in_quotes = False
+    pos = start
+    while target is not None:
+        block = buffer[pos:pos + _BOUNDARY_SCAN_BYTES]
+        if not block:
+            break
+        block_end = pos + len(block)
+        cursor = 0
+        while target is not None and target < block_end:
+            # Bring the quote state up to the target, then look for the next unquoted newline
+            local_target = max(target - pos, cursor)
+            in_quotes ^= block.count(b'"', cursor, local_target) % 2 == 1
+            cursor = local_target
+            newline = -1
+            while True:
+                idx = block.find(b"\n", cursor)
+                if idx < 0:
+                    break
+                in_quotes ^= block.count(b'"', cursor, idx) % 2 == 1
+                cursor = idx + 1
+                if not in_quotes:
+                    newline = idx
+                    break
+            if newline < 0:
+                break # The boundary is in a later block
+            boundaries.append(pos + newline + 1)
+            while target is not None and target <= pos + newline:
+                target = next(targets, None)
+        in_quotes ^= block.count(b'"', cursor) % 2 == 1
+        pos = block_end
+    return boundaries
+
+
+def _split_byte_ranges(buffer, data_start, range_bytes, min_ranges):
+    """Split the data rows of `buffer` (from `data_start`) into byte ranges that start and end on row boundaries."""
+    size = len(buffer)
+    if size <= data_start:
+        return []
+    count = max(min_ranges, -(-(size - data_start) // range_bytes))
+    step = (size - data_start) / count
+    targets = [int(data_start + step * i) for i in range(1, count)]
+    edges = [data_start] + sorted(set(b for b in _row_boundaries(buffer, data_start, targets) if b < size)) + [size]
+    return [(lo, hi) for lo, hi in zip(edges, edges[1:]) if hi > lo]
+
+
+def _parse_byte_range(input_csv_path, start, end, cols, file_info, chunk_size):
+    """Worker: parse the rows in [start, end) of the (memory-mapped) export. Returns a list of listing chunks."""
+    with mapped(input_csv_path) as buffer:
+        text = buffer[start:end].decode("utf-8")
+    return list(_parse_rows(csv.reader(io.StringIO(text, newline="")), cols, file_info, chunk_size))
+
+
+def _header_end(buffer):
+    """Header row fields and the byte offset where the data rows begin."""
+    header_text = buffer[:_BOUNDARY_SCAN_BYTES].decode("utf-8", errors="ignore")
+    header_fb = next(csv.reader(io.StringIO(header_text, newline="")), [])
+    boundaries = _row_boundaries(buffer, 0, [0])
+    data_start = boundaries[0] if boundaries else len(buffer)
+    if header_fb and header_fb[0].startswith("\ufeff"):
+        header_fb[0] = header_fb[0][1:]
+    return header_fb, data_start
+
+
+def iter_facebook_csv(input_csv_path, chunk_size=DEFAULT_CHUNK_ROWS, workers=1, range_bytes=DEFAULT_RANGE_BYTES):
+    """
+    Parse a Facebook Marketplace CSV export incrementally.
+
+    With workers > 1 the file is split into byte ranges on row boundaries and the ranges are
+    parsed in a process pool; at most two ranges per worker are in flight, so memory stays
+    bounded however large the export is. Chunks come out in file order either way.
+    Compressed exports (.gz/.zst) are decompressed as a stream and parsed in this process.
+
+    Args:
+        input_csv_path (str): Path to the export
+        chunk_size (int): Maximum listings per yielded chunk
+        workers (int): Worker processes; 1 parses in this process
+        range_bytes (int): Target size of each worker's byte range
+
+    Yields:
+        list: Parsed listing dicts (same fields as parse_facebook_csv)
+    """
+    file_info = _file_info(input_csv_path)
+    if workers <= 1 or compression_of(input_csv_path):
+        with open_text(input_csv_path, encoding='utf-8-sig') as f_facebook:
+            reader = csv.reader(f_facebook)
+            header_fb = next(reader, None) # Skip header
+            if header_fb is None:
+                return
+            cols = _column_indices(header_fb)
+            yield from _parse_rows(reader, cols, file_info, chunk_size)
+        return
+
+    with mapped(input_csv_path) as buffer:
+        header_fb, data_start = _header_end(buffer)
+        if not header_fb:
+            return
+        ranges = _split_byte_ranges(buffer, data_start, range_bytes, workers)
+    cols = _column_indices(header_fb)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for start, end in ranges:
+            in_flight.append(executor.submit(_parse_byte_range, input_csv_path, start, end, cols, file_info, chunk_size))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def _complete_rows_end(data, min_fields):
+    """
+    Length of the complete rows at the start of `data` (bytes): up to the last newline outside
+    quotes, plus a final unterminated row if its quotes are balanced and it has `min_fields` fields.
+    """
+    in_quotes = False
+    end = 0
+    cursor = 0
+    while True:
+        idx = data.find(b"\n", cursor)
+        if idx < 0:
+            break
+        in_quotes ^= data.count(b'"', cursor, idx) % 2 == 1
+        cursor = idx + 1
+        if not in_quotes:
+            end = cursor
+    remainder = data[end:]
+    if remainder.strip() and remainder.count(b'"') % 2 == 0:
+        last_row = next(csv.reader(io.StringIO(remainder.decode("utf-8", errors="replace"), newline="")), [])
+        if len(last_row) >= min_fields:
+            return len(data)
+    return end
+
+
+def parse_facebook_tail(input_csv_path, start_offset=0):
+    """
+    Parse the rows of an export that start at or after byte `start_offset` (0 = the whole file).
+
+    Only complete rows are parsed, so a row still being written is left for the next call.
+    Offsets of compressed exports count decompressed bytes.
+
+    Returns:
+        tuple: (listings, end_offset, rows_read); resume from end_offset after the file grows
+    """
+    with mapped(input_csv_path) as buffer:
+        header_fb, data_start = _header_end(buffer)
+        if not header_fb:
+            return [], 0, 0
+        start = max(start_offset, data_start)
+        data = buffer[start:]
+    data = data[:_complete_rows_end(data, len(header_fb))]
+
+    rows_read = 0
+
+    def counted(reader):
+        nonlocal rows_read
+        for row in reader:
+            rows_read += 1
+            yield row
+
+    reader = csv.reader(io.StringIO(data.decode("utf-8"), newline=""))
+    listings = []
+    for chunk in _parse_rows(counted(reader), _column_indices(header_fb), _file_info(input_csv_path), DEFAULT_CHUNK_ROWS):
+        listings.extend(chunk)
+    return listings, start + len(data), rows_read
+
+
+# --- Vectorized (pandas) parsing --- #
+# Same rules as _parse_row, applied to whole columns; parse_facebook_csv(engine=ENGINE_PANDAS) uses it.
+ENGINE_ROWS = "rows"
+ENGINE_PANDAS = "pandas"
+ENGINES = (ENGINE_ROWS, ENGINE_PANDAS)
+
+_NUMBER = r'(\d+\.?\d*|\d+)'
+# Mileage patterns in parse_mileage's order of precedence: (regex, multiplier, "full number" threshold, to km)
+_MILEAGE_RULES = [
+    (_NUMBER + r'\s*k\s*km', 1000, None, 1),
+    (_NUMBER + r'\s*km', 1000, 3000, 1),
+    (_NUMBER + r'\s*k\s*miles', 1000, None, 1.60934),
+    (_NUMBER + r'\s*miles', 1000, 3000, 1.60934),
 ]
 
+
+def _clean_column(df, idx):
+    """Stripped column `idx` with empty or missing fields as None (like _parse_row's field())."""
+    import pandas as pd
+
+    if idx not in df.columns:
+        return pd.Series([None] * len(df), index=df.index, dtype=object)
+    column = df[idx].str.strip().astype(object)
+    return column.where(column.notna() & (column != ""), None)
+
+
+def _parse_price_column(prices):
+    """Vectorized parse_price: float, 0 for "free", NaN where unparseable or missing."""
+    import numpy as np
+    import pandas as pd
+
+    lowered = prices.str.lower()
+    cleaned = lowered.str.replace(r'[^\d.]', '', regex=True)
+    values = pd.to_numeric(cleaned.where(cleaned.notna() & (cleaned != ""), np.nan), errors="coerce")
+    values = values.astype(float)
+    return values.mask(lowered.str.contains("free", regex=False, na=False), 0.0)
+
+
+def _parse_mileage_column(mileages):
+    """Vectorized parse_mileage: kilometres as float, NaN where no rule matches."""
+    import numpy as np
+    import pandas as pd
+
+    text = mileages.str.lower().str.replace(',', '', regex=False)
+    result = pd.Series(np.nan, index=mileages.index, dtype=float)
+    unresolved = text.notna()
+    for pattern, multiplier, full_number_above, to_km in _MILEAGE_RULES:
+        values = pd.to_numeric(text[unresolved].str.extract(pattern, expand=False), errors="coerce")
+        matched = values.dropna()
+        if matched.empty:
+            continue
+        if full_number_above is None:
+            km = matched * multiplier
+        else:
+            km = matched.where(matched > full_number_above, matched * multiplier)
+        if to_km != 1:
+            km = km * to_km
+        result.loc[km.index] = km
+        unresolved.loc[km.index] = False
+
+    # Last resort: a bare number; small values are taken to mean thousands
+    values = pd.to_numeric(text[unresolved].str.extract(r'^' + _NUMBER + r'$', expand=False), errors="coerce").dropna()
+    result.loc[values.index] = values.where(values >= 500, values * 1000)
+    return result
+
+
+def _read_export_frame(input_csv_path):
+    """
+    Header row and the used data columns of an export as strings, labelled by column position.
+
+    Raises ValueError (pandas' ParserError) for rows with more fields than the header.
+    """
+    import pandas as pd
+
+    with open_text(input_csv_path, encoding='utf-8-sig') as f_facebook:
+        header_fb = next(csv.reader(f_facebook), None)
+    if header_fb is None:
+        return None, None, None
+    cols = _column_indices(header_fb)
+    used = sorted({idx for idx in cols.values() if 0 <= idx < len(header_fb)})
+    # pandas infers .gz/.zst decompression from the suffix
+    df = pd.read_csv(input_csv_path, header=None, skiprows=1, dtype=str, keep_default_na=False,
+                     encoding='utf-8', names=range(len(header_fb)), usecols=used, skip_blank_lines=True)
+    return header_fb, cols, df
+
+
+def parse_facebook_frame(input_csv_path):
+    """
+    Parse a Facebook export with column-wise pandas operations.
+
+    Returns:
+        pandas.DataFrame: One row per kept listing, with the same columns, values and order as
+        parse_facebook_csv's dicts
+    """
+    import numpy as np
+    import pandas as pd
+
+    file_info = _file_info(input_csv_path)
+    columns = ["title", "price", "year", "make", "model", "mileage", "location", "url", "source_file", "scraped_date"]
+    header_fb, cols, df = _read_export_frame(input_csv_path)
+    if header_fb is None or df.empty:
+        return pd.DataFrame(columns=columns)
+
+    titles = _clean_column(df, cols["title"])
+    keep = titles.notna() & ~get_non_vehicle_classifier().flag_column(titles)
+    df, titles = df[keep], titles[keep]
+
+    parsed = get_recognizer().parse_column(titles)
+    years = pd.to_numeric(parsed["year"], errors="coerce")
+    makes, models = parsed["make"], parsed["model"]
+    keep = years.notna() & makes.notna() & (makes != "") & models.notna() & (models != "")
+
+    # Approval, looked up once per distinct (make, model, year)
+    year_ints = years.fillna(0).astype(int)
+    keep &= file_info["approved_vehicles"].matches_column(makes.fillna(""), models.fillna(""), year_ints)
+
+    df, titles, years, makes, models = df[keep], titles[keep], year_ints[keep], makes[keep], models[keep]
+
+    mileage = _parse_mileage_column(_clean_column(df, cols["mileage"]))
+    price = _parse_price_column(_clean_column(df, cols["price"]))
+    alt_price = _parse_price_column(_clean_column(df, cols["alt_price"]))
+    price = price.fillna(alt_price) if cols["alt_price"] != -1 else price
+
+    known_mileage = mileage.notna() & (mileage != -1)
+    cheap = price.notna() & (price < 1000)
+    suspicious = cheap & (((file_info["current_year"] - years) < 5) | (known_mileage & (np.trunc(mileage) < 50000)))
+    keep = ~(price == 0) & ~suspicious & price.notna() & (years >= 1980)
+
+    mileage_km = np.trunc(mileage.fillna(-1)).astype("int64")
+    out = pd.DataFrame({
+        "title": titles,
+        "price": price,
+        "year": years,
+        "make": makes,
+        "model": models,
+        "mileage": mileage_km,
+        "location": _clean_column(df, cols["location"]),
+        "url": _clean_column(df, cols["url"]),
+        "source_file": file_info["source_file"],
+        "scraped_date": file_info["scraped_date"],
+    }, columns=columns)
+    return out[keep].reset_index(drop=True)
+
+
+def compare_parsers(input_csv_path):
+    """
+    Differential check of the pandas path against the row-wise path on one export.
+
+    Returns:
+        list: (position, row-wise listing, pandas listing) for every difference; empty if identical
+    """
+    expected = parse_facebook_csv(input_csv_path, engine=ENGINE_ROWS)
+    actual = parse_facebook_csv(input_csv_path, engine=ENGINE_PANDAS)
+    differences = [(i, a, b) for i, (a, b) in enumerate(zip(expected, actual)) if a != b]
+    for i in range(min(len(expected), len(actual)), max(len(expected), len(actual))):
+        differences.append((i, expected[i] if i < len(expected) else None, actual[i] if i < len(actual) else None))
+    return differences
+
+
 # def get_parsed_facebook_listings(): # Old function name
-def parse_facebook_csv(input_csv_path): # New function name and parameter
+def parse_facebook_csv(input_csv_path, workers=1, engine=ENGINE_ROWS): # New function name and parameter
+    """
+    Parse a whole Facebook export into a list of listings (see iter_facebook_csv for chunked parsing).
+
+    Args:
+        input_csv_path (str): Path to the export
+        workers (int): Worker processes for the row-wise engine
+        engine (str): ENGINE_ROWS (row by row) or ENGINE_PANDAS (column-wise; same output)
+    """
     local_processed_listings = [] # Use a local list
     try:
-        # with open(facebook_csv_path, mode='r', encoding='utf-8') as f_facebook: # Old hardcoded path
-        with open(input_csv_path, mode='r', encoding='utf-8') as f_facebook: # Use function argument
-            reader = csv.reader(f_facebook)
-            header_fb = next(reader) # Skip header
-            # Attempt to dynamically find column indices, default if not found or error
+        if engine == ENGINE_PANDAS:
             try:
-                url_idx = header_fb.index('Link') # Common name for URL
-                price_idx = header_fb.index('Price') 
-                title_idx = header_fb.index('Title')
-                loc_idx = header_fb.index('Location')
-                mileage_idx = header_fb.index('Mileage')
-                # For alternative price, check if 'Alternate Price' or similar exists
-                alt_price_idx = header_fb.index('Alternate Price') if 'Alternate Price' in header_fb else -1 
-            except ValueError:
-                # Fallback to default indices if specific headers are not found
-                print("Warning: Could not find all expected headers (Link, Price, Title, Location, Mileage). Using default column indices [0,2,3,4,5]. This may lead to incorrect parsing.")
-                url_idx, price_idx, title_idx, loc_idx, mileage_idx = 0, 2, 3, 4, 5
-                alt_price_idx = 6 if len(header_fb) > 6 else -1
-
-
-            for row_num, row in enumerate(reader):
-                try:
-                    # Defensive access to row elements
-                    title_str = row[title_idx].strip() if len(row) > title_idx and row[title_idx] else None
-                    price_str = row[price_idx].strip() if len(row) > price_idx and row[price_idx] else None
-                    mileage_str = row[mileage_idx].strip() if len(row) > mileage_idx and row[mileage_idx] else None
-                    url = row[url_idx].strip() if len(row) > url_idx and row[url_idx] else None
-                    location = row[loc_idx].strip() if len(row) > loc_idx and row[loc_idx] else None
-                    
-                    alt_price_str = None
-                    if alt_price_idx != -1 and len(row) > alt_price_idx and row[alt_price_idx] and row[alt_price_idx].strip():
-                        alt_price_str = row[alt_price_idx].strip()
-
-                    if not title_str: 
-                        continue
-
-                    if any(keyword in title_str.lower() for keyword in non_vehicle_keywords):
-                        continue
-
-                    year, make, model = parse_title(title_str)
-                    if not year or not make or not model:
-                        continue
-                    
-                    make_lower = make.lower()
-                    model_lower = model.lower()
-
-                    approved_key = (make_lower, model_lower, year)
-                    approved_key_no_space = (make_lower, model_lower.replace(" ", ""), year)
-                    approved_key_no_dash = (make_lower, model_lower.replace("-", ""), year)
-                    approved_key_dash_instead_of_space = (make_lower, model_lower.replace(" ", "-"), year)
-                    
-                    if not (
-                        approved_key in approved_vehicles or 
-                        approved_key_no_space in approved_vehicles or 
-                        approved_key_no_dash in approved_vehicles or
-                        approved_key_dash_instead_of_space in approved_vehicles
-                    ):
-                        continue
-
-                    mileage_km = parse_mileage(mileage_str)
-                    if mileage_km is None and "enclosed mobility" not in title_str.lower() and "scooter" not in title_str.lower():
-                        mileage_km = -1 
-                    elif mileage_km is not None:
-                        mileage_km = int(mileage_km)
-
-                    price = parse_price(price_str)
-                    if price is None and alt_price_str:
-                        price = parse_price(alt_price_str)
-                    
-                    if price == 0: # Skip free listings
-                        continue
-                    
-                    # Stricter filter for very cheap vehicles that are likely not cars or are problematic
-                    if price is not None and price < 1000: # Increased threshold slightly
-                        current_year_for_calc = datetime.datetime.now().year 
-                        # If it's very new (e.g. < 5 years old) and < $1000, it's suspicious
-                        is_suspiciously_new = year is not None and (current_year_for_calc - year) < 5
-                        # If it's very low mileage (e.g. < 50000km) and < $1000, also suspicious
-                        is_suspiciously_low_mileage = mileage_km is not None and mileage_km != -1 and mileage_km < 50000
-                        
-                        if is_suspiciously_new or is_suspiciously_low_mileage:
-                            # print(f"Skipping suspiciously cheap listing: {title_str} Price: {price} Year: {year} Mileage: {mileage_km}")
-                            continue 
-
-                    if price is None: # Skip if price couldn't be parsed at all
-                        continue
-                    
-                    # Ensure values are appropriate before adding
-                    # Example: ensure year is plausible, mileage isn't excessively high for the price etc.
-                    # For now, this is basic, can be expanded.
-                    if year and year < 1980: # Skip very old cars unless specifically desired
-                        continue
-
-                    listing_details = {
-                        "title": title_str,
-                        "price": price,
-                        "year": year,
-                        "make": make,
-                        "model": model,
-                        "mileage": mileage_km if mileage_km is not None else -1, # Use -1 for unknown after filtering
-                        "location": location,
-                        "url": url,
-                        "source_file": os.path.basename(input_csv_path), # Add source file
-                        "scraped_date": datetime.date.today().isoformat() # Add scraped date
-                    }
-                    local_processed_listings.append(listing_details)
-                
-                except Exception as e:
-                    # print(f"Error processing row {row_num+2} in {os.path.basename(input_csv_path)}: {row}. Error: {e}")
-                    continue
-        
+                return parse_facebook_frame(input_csv_path).to_dict("records")
+            except ValueError as e: # Ragged rows the C parser rejects; the csv module copes with them
+                print(f"Column-wise parsing failed for {input_csv_path} ({e}); parsing row by row.")
+        for chunk in iter_facebook_csv(input_csv_path, workers=workers):
+            local_processed_listings.extend(chunk)
     except FileNotFoundError:
         print(f"Error: Facebook data file not found at {input_csv_path}")
     except Exception as e:
         print(f"Error reading or processing Facebook data from {input_csv_path}: {e}")
-        
+
     return local_processed_listings
 
 # It's generally good practice not to have executable code at the module level
@@ -317,6 +594,18 @@ def parse_facebook_csv(input_csv_path): # New function name and parameter
 
 
 if __name__ == '__main__':
+    import sys
+    if len(sys.argv) > 2 and sys.argv[1] == "--compare":
+        # Differential check: python -m src.process_facebook_data --compare data/facebook-*.csv
+        failed = False
+        for path in sys.argv[2:]:
+            differences = compare_parsers(path)
+            print(f"{path}: {'identical' if not differences else f'{len(differences)} differences'}")
+            for position, expected, actual in differences[:5]:
+                print(f"  #{position}: rows={expected} pandas={actual}")
+            failed = failed or bool(differences)
+        sys.exit(1 if failed else 0)
+
     print("Starting Facebook data processing...")
     # Check if dependent files exist before processing
     # if not os.path.exists(facebook_csv_path):
@@ -325,10 +614,8 @@ if __name__ == '__main__':
         print(f"CRITICAL: Approved vehicles file not found: {approved_vehicles_csv_path}")
     else:
         print(f"Loading approved vehicles from: {approved_vehicles_csv_path}")
-        # Note: approved_vehicles set is loaded globally when script is imported/run.
-        # If this script is only run as main, the global loading is fine.
-        # If imported, ensure approved_vehicles is loaded before get_parsed_facebook_listings is called.
-        if not approved_vehicles: # Check if it was loaded successfully
+        # Note: the approved vehicles set is loaded on first use (and reloaded when the file changes).
+        if not get_approved_vehicles(): # Check if it was loaded successfully
             print("Warning: Approved vehicles set is empty. Filtering by approval might not work as expected.")
 
         # facebook_listings = get_parsed_facebook_listings()
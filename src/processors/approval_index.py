@@ -0,0 +1,377 @@
+"""
+The approved vehicles list, as one immutable index shared by the whole pipeline.
+
+approved_vehicles_reliability.csv is parsed once into an ApprovalIndex, and the same
+object is handed to the scrapers, the Facebook parser, the title recognizer and
+VehicleDataProcessor, so every component approves exactly the same listings:
+
+- make and model are normalized with normalize_make / normalize_model
+- an approved model also approves its trims ("civic" approves "civic si") and the
+  spelling without spaces ("mazda 3" approves "mazda3"); the longest approved model
+  wins, so "3 series" is preferred to "3" when both are listed
+- the year must be one of the approved years for that model (entries without a year
+  approve every year)
+
+Rows are stored as arrays: make and model ids into tuples of interned strings, NumPy
+year and reliability columns, and a prefix index from (make, model without spaces) to
+a year-sorted slice, so a lookup is a few dict probes and one binary search.
+
+ApprovalSource re-reads the file when its mtime changes (checked at most once per
+`check_interval_s`, or on refresh()), so long-running processes pick up edits without
+a restart; get_approval_index() returns its current index. Each reload builds a new
+index, so code holding the previous one keeps a consistent view until it asks again,
+and a file that fails to load leaves the previous index in place.
+"""
+
+import bisect
+import csv
+import sys
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from src.file_watcher import file_version
+from src.input_streams import open_text
+from src.processors.make_model_recognizer import DEFAULT_APPROVED_VEHICLES_PATH, normalize_make, normalize_model
+
+# Normalized approval criterion; year is None when any year of the make/model is approved
+ApprovedCriterion = namedtuple("ApprovedCriterion", ["make", "model", "year"])
+
+# Columns an approved vehicles CSV must have
+REQUIRED_COLUMNS = ("Make", "Model", "Year")
+
+# Numeric columns of the approved vehicles CSV kept with each row
+RELIABILITY_COLUMNS = ("QIRRate", "DefectRate", "Composite score")
+
+# Year value stored for entries that approve every year
+ANY_YEAR = -1
+
+
+def _compact(model):
+    return model.replace(" ", "")
+
+
+def _to_year(year):
+    """Listing/CSV year as an int, or None if missing or not a number."""
+    if year is None or year != year or year == "":  # None/NaN/empty
+        return None
+    try:
+        return int(float(str(year).strip()))
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value) if value not in (None, "") else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _is_filtered_out(value):
+    """The CSV's Filter column excludes a row when it is FALSE (rows without the column are kept)."""
+    return value is not None and str(value).strip().lower() in ("false", "0", "no")
+
+
+class ApprovalIndex:
+    """Immutable index of approved (make, model, year) entries."""
+
+    def __init__(self, entries=(), models=None, columns=None, version=None):
+        """
+        Args:
+            entries (iterable): (make, model, year) entries in file order; year may be None (any year)
+            models (iterable, optional): (make, model) pairs as written in the file, for the title recognizer
+                (default: the entries' make/model)
+            columns (dict, optional): Column name -> values aligned with `entries` (see RELIABILITY_COLUMNS)
+            version: Identifies the source data (ApprovalSource uses the file's (mtime_ns, size))
+        """
+        self.version = version
+        make_ids, model_ids, make_names, model_names = {}, {}, [], []
+        row_make, row_model, row_year, raw_models = [], [], [], []
+        for make_raw, model_raw, year in entries:
+            make, model = normalize_make(make_raw), normalize_model(model_raw)
+            if not make or not model:
+                continue
+            if make not in make_ids:
+                make_ids[make] = len(make_names)
+                make_names.append(sys.intern(make))
+            if model not in model_ids:
+                model_ids[model] = len(model_names)
+                model_names.append(sys.intern(model))
+            year = _to_year(year)
+            row_make.append(make_ids[make])
+            row_model.append(model_ids[model])
+            row_year.append(ANY_YEAR if year is None else year)
+            raw_models.append((make_raw, model_raw))
+
+        self.makes = tuple(make_names)
+        self.model_names = tuple(model_names)
+        self.make_ids = np.array(row_make, dtype=np.int32)
+        self.model_ids = np.array(row_model, dtype=np.int32)
+        self.years = np.array(row_year, dtype=np.int32)
+        self.models = frozenset(raw_models if models is None else models)
+        self.columns = {
+            name: np.array([_to_float(v) for v in values], dtype=np.float64)
+            for name, values in (columns or {}).items()
+        }
+
+        # Prefix index: (make, model without spaces) -> [lo, hi) of the rows sorted by year
+        compact = [_compact(name) for name in self.model_names]
+        order = sorted(range(len(row_year)), key=lambda r: (row_make[r], compact[row_model[r]], row_year[r], r))
+        sorted_rows = np.array(order, dtype=np.int32)
+        self._build_prefix_index(sorted_rows, self.years[sorted_rows])
+
+    @classmethod
+    def from_arrays(cls, makes, model_names, models, make_ids, model_ids, years, columns, sorted_rows, sorted_years,
+                    version=None):
+        """
+        An index around arrays produced by another index (see shared_reference); the arrays are
+        used as given (e.g. read-only views of shared memory), only the prefix dicts are rebuilt.
+        """
+        index = cls.__new__(cls)
+        index.version = version
+        index.makes, index.model_names, index.models = tuple(makes), tuple(model_names), frozenset(models)
+        index.make_ids, index.model_ids, index.years, index.columns = make_ids, model_ids, years, dict(columns)
+        index._build_prefix_index(sorted_rows, sorted_years)
+        return index
+
+    def _build_prefix_index(self, sorted_rows, sorted_years):
+        self._sorted_rows = sorted_rows
+        self._sorted_years = sorted_years
+        self._spans = {}
+        lengths = {}
+        compact = [_compact(name) for name in self.model_names]
+        make_ids, model_ids = self.make_ids.tolist(), self.model_ids.tolist()
+        for pos, row in enumerate(sorted_rows.tolist()):
+            make, model = self.makes[make_ids[row]], compact[model_ids[row]]
+            lo, _ = self._spans.get((make, model), (pos, pos))
+            self._spans[(make, model)] = (lo, pos + 1)
+            lengths.setdefault(make, set()).add(len(model))
+        # Longest first, so the most specific approved model is found first
+        self._prefix_lengths = {make: tuple(sorted(found, reverse=True)) for make, found in lengths.items()}
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_APPROVED_VEHICLES_PATH, version=None):
+        """
+        Read the approved vehicles CSV (Make, Model, Year and the RELIABILITY_COLUMNS; may be .gz/.zst).
+
+        Rows whose Filter column is FALSE are left out. Rows without a valid year only feed
+        the title recognizer's models.
+
+        Raises:
+            OSError: If the file cannot be read
+            ValueError: If the Make, Model or Year column is missing (e.g. a half-written file)
+        """
+        entries, models = [], set()
+        columns = {name: [] for name in RELIABILITY_COLUMNS}
+        with open_text(path, encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            missing = [name for name in REQUIRED_COLUMNS if name not in (reader.fieldnames or ())]
+            if missing:
+                raise ValueError(f"{path} has no {', '.join(missing)} column(s)")
+            for row in reader:
+                make_raw, model_raw = (row.get("Make") or "").strip(), (row.get("Model") or "").strip()
+                if not make_raw or not model_raw or _is_filtered_out(row.get("Filter")):
+                    continue
+                models.add((make_raw, model_raw))
+                year = _to_year(row.get("Year"))
+                if year is None:
+                    continue
+                entries.append((make_raw, model_raw, year))
+                for name in RELIABILITY_COLUMNS:
+                    columns[name].append(row.get(name))
+        return cls(entries, models=models, columns=columns, version=version)
+
+    @classmethod
+    def from_entries(cls, approved_vehicles_list):
+        """
+        Build an index from the list formats used across the project: (make, model, year) or
+        (make, model) tuples, and dicts with make/model[/year] keys in either case.
+        """
+        entries = []
+        for entry in approved_vehicles_list or []:
+            if isinstance(entry, dict):
+                make = entry.get("make", entry.get("Make"))
+                model = entry.get("model", entry.get("Model"))
+                year = entry.get("year", entry.get("Year"))
+            else:
+                make, model = entry[0], entry[1]
+                year = entry[2] if len(entry) > 2 else None
+            if make is None or model is None or make != make or model != model:  # Skip missing/NaN
+                continue
+            entries.append((make, model, year))
+        return cls(entries)
+
+    def __len__(self):
+        return len(self.years)
+
+    def __bool__(self):
+        return len(self.years) > 0
+
+    def find(self, make, model, year):
+        """
+        Row (in file order) approving this listing, or -1.
+
+        Exact year matches are preferred to entries approving any year; a listing without
+        a year only matches the latter.
+        """
+        if not make or not model:
+            return -1
+        make = normalize_make(make)
+        lengths = self._prefix_lengths.get(make)
+        if not lengths:
+            return -1
+        model = _compact(normalize_model(model))
+        year = _to_year(year)
+        for length in lengths:
+            if length > len(model):
+                continue
+            span = self._spans.get((make, model[:length]))
+            if span is None:
+                continue
+            row = self._find_year(span, year)
+            if row >= 0:
+                return row
+        return -1
+
+    def matches(self, make, model, year):
+        return self.find(make, model, year) >= 0
+
+    def matches_column(self, makes, models, years):
+        """
+        Vectorized matches() over aligned sequences (e.g. pandas Series); each distinct
+        (make, model, year) is looked up once.
+
+        Returns:
+            numpy.ndarray: Boolean mask
+        """
+        found = {}
+        mask = np.zeros(len(makes), dtype=bool)
+        for i, key in enumerate(zip(makes, models, years)):
+            hit = found.get(key)
+            if hit is None:
+                hit = found[key] = self.matches(*key)
+            mask[i] = hit
+        return mask
+
+    def value(self, row, column, default=np.nan):
+        """A RELIABILITY_COLUMNS value of a row returned by find() (`default` if missing or NaN)."""
+        values = self.columns.get(column)
+        if values is None or row < 0:
+            return default
+        value = values[row]
+        return default if np.isnan(value) else float(value)
+
+    def criteria(self):
+        """Unique ApprovedCriterion entries in file order (for search planning)."""
+        seen = {}
+        for make_id, model_id, year in zip(self.make_ids.tolist(), self.model_ids.tolist(), self.years.tolist()):
+            criterion = ApprovedCriterion(self.makes[make_id], self.model_names[model_id], None if year == ANY_YEAR else year)
+            seen.setdefault(criterion, None)
+        return list(seen)
+
+    def _find_year(self, span, year):
+        lo, hi = span
+        years = self._sorted_years
+        if year is not None:
+            # bisect over the array: for one probe into a short slice it beats np.searchsorted's call overhead
+            pos = bisect.bisect_left(years, year, lo, hi)
+            if pos < hi and years[pos] == year:
+                return int(self._sorted_rows[pos])
+        if years[lo] == ANY_YEAR:
+            return int(self._sorted_rows[lo])
+        return -1
+
+
+EMPTY_APPROVAL_INDEX = ApprovalIndex()
+
+
+def as_approval_index(approved_vehicles):
+    """An ApprovalIndex as is, or one built from a legacy approved vehicles list (None -> empty)."""
+    if isinstance(approved_vehicles, ApprovalIndex):
+        return approved_vehicles
+    if not approved_vehicles:
+        return EMPTY_APPROVAL_INDEX
+    return ApprovalIndex.from_entries(approved_vehicles)
+
+
+class ApprovalSource:
+    """Lazily loaded, mtime-invalidated ApprovalIndex of the approved vehicles CSV."""
+
+    def __init__(self, path=DEFAULT_APPROVED_VEHICLES_PATH, check_interval_s=1.0):
+        """
+        Args:
+            path (str or Path): Approved vehicles CSV (Make, Model, Year columns; may be .gz/.zst)
+            check_interval_s (float): Minimum time between mtime checks
+        """
+        self.path = path
+        self.check_interval_s = check_interval_s
+        self._lock = threading.Lock()
+        self._index = None
+        self._checked_at = 0.0
+
+    def current(self):
+        """The current ApprovalIndex, reloaded first if the file changed since it was read."""
+        index = self._index
+        if index is not None and time.monotonic() - self._checked_at < self.check_interval_s:
+            return index
+        return self.refresh()
+
+    def refresh(self):
+        """Check the file now (ignoring check_interval_s) and return the current ApprovalIndex."""
+        with self._lock:
+            version = file_version(self.path)
+            if self._index is None or version != self._index.version:
+                index = self._load(version)
+                if index is not None and not index and self._index:
+                    # An empty list would reject every listing; far more likely a file caught mid-write
+                    print(f"Warning: {self.path} has no approved vehicles; keeping the previously loaded "
+                          f"list ({len(self._index)} entries).")
+                elif index is not None:
+                    self._index = index
+                elif self._index is None:
+                    self._index = EMPTY_APPROVAL_INDEX
+                else:
+                    # Keep approving with the previous list; the next check retries the load
+                    print(f"Keeping the previously loaded approved vehicles ({len(self._index)} entries).")
+            self._checked_at = time.monotonic()
+            return self._index
+
+    def _load(self, version):
+        if version is None:
+            print(f"Error: Approved vehicles file not found at {self.path}")
+            return None
+        try:
+            return ApprovalIndex.from_csv(self.path, version=version)
+        except (OSError, ValueError) as e:
+            print(f"Error reading approved vehicles from {self.path}: {e}")
+            return None
+
+
+def current_approval_index(approvals, refresh=False):
+    """
+    The ApprovalIndex to use now for `approvals`: an ApprovalSource's current index (checked
+    against the file immediately if `refresh`), an ApprovalIndex as is, or one built from a
+    legacy approved vehicles list.
+    """
+    if isinstance(approvals, ApprovalSource):
+        return approvals.refresh() if refresh else approvals.current()
+    return as_approval_index(approvals)
+
+
+_default_source = None
+
+
+def get_approval_source():
+    """Approval source for the default approved vehicles CSV, shared by all callers in this process."""
+    global _default_source
+    if _default_source is None:
+        _default_source = ApprovalSource()
+    return _default_source
+
+
+def get_approval_index():
+    """The current ApprovalIndex of the default approved vehicles CSV."""
+    return get_approval_source().current()
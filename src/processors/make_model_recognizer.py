@@ -0,0 +1,216 @@
+"""
+Make/model recognition for listing titles, shared by all scrapers and the Facebook CSV parser.
+
+All known makes and aliases are compiled into one regex alternation (longest alternatives
+first, so multi-word makes such as "land rover" or "alfa romeo" win over shorter ones),
+and the known models of each make into one pattern per make. A title is parsed in a
+single pass into (year, make, model), with make and model normalized the same way as the
+approved vehicles list ("Mercedes-Benz" -> "mercedes-benz", "CR-V" -> "cr v").
+"""
+
+import datetime
+import re
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+DEFAULT_APPROVED_VEHICLES_PATH = PROJECT_ROOT / "data" / "approved_vehicles_reliability.csv"
+
+# Canonical make -> aliases seen in titles (the canonical name itself is always matched)
+MAKE_ALIASES = {
+    "acura": [], "alfa romeo": [], "amc": [], "aston martin": [], "audi": [], "bentley": [],
+    "bmw": [], "buick": [], "cadillac": [], "chevrolet": ["chevy", "chev"], "chrysler": [],
+    "dodge": [], "ferrari": [], "fiat": [], "ford": [], "genesis": [], "gmc": [], "honda": [],
+    "hummer": [], "hyundai": [], "infiniti": [], "jaguar": [], "jeep": [], "kia": [],
+    "lamborghini": [], "land rover": ["landrover"], "lexus": [], "lincoln": [], "lotus": [],
+    "maserati": [], "mazda": [], "mclaren": [], "mercedes-benz": ["mercedes benz", "mercedes", "benz"],
+    "mini": [], "mitsubishi": [], "nissan": [], "oldsmobile": [], "plymouth": [], "polestar": [],
+    "pontiac": [], "porsche": [], "ram": [], "rivian": [], "rolls-royce": ["rolls royce"],
+    "saab": [], "saturn": [], "scion": [], "smart": [], "subaru": [], "suzuki": [], "tesla": [],
+    "toyota": [], "volkswagen": ["vw"], "volvo": [],
+}
+
+# Aliases that name a model line and imply the make; the matched words stay in the model
+MODEL_LINE_ALIASES = {
+    "range rover": "land rover",
+}
+
+# Words that are also makes but usually mean something else when followed by these
+_MAKE_FALSE_FRIENDS = {
+    "mini": r"(?![\s\-]*vans?\b)",
+    "smart": r"(?=[\s\-]*(?:fortwo|forfour|eq)\b)",
+}
+
+_STOP_WORDS = {"for", "with", "in", "at", "near", "from", "sale", "obo", "only", "must", "needs"}
+_SEPARATORS = r"[\s\-_/]*"
+_YEAR_RE = re.compile(r"(?<!\d)(19[5-9]\d|20\d\d)(?!\d)")
+
+
+def normalize_make(make):
+    return " ".join(str(make).lower().split())
+
+
+def normalize_model(model):
+    """Lowercase and treat '-', '_' and repeated spaces alike ("3_Series" -> "3 series")."""
+    return " ".join(re.sub(r"[-_]", " ", str(model).lower()).split())
+
+
+def _flexible(phrase):
+    """Pattern matching a phrase with any of ' ', '-', '_' or nothing between its words."""
+    return _SEPARATORS.join(re.escape(token) for token in re.split(r"[\s\-_]+", phrase) if token)
+
+
+class MakeModelRecognizer:
+    """Parses listing titles into (year, make, model) using patterns compiled once."""
+
+    def __init__(self, approved_models=None, make_aliases=None):
+        """
+        Args:
+            approved_models (iterable, optional): (make, model) pairs whose models should be
+                recognized exactly (typically the approved vehicles list)
+            make_aliases (dict, optional): Canonical make -> aliases (default: MAKE_ALIASES)
+        """
+        make_aliases = make_aliases if make_aliases is not None else MAKE_ALIASES
+        self.max_year = datetime.date.today().year + 1
+
+        alias_to_make = {}
+        models_by_make = {}
+        for make, aliases in make_aliases.items():
+            make = normalize_make(make)
+            alias_to_make[make] = (make, False)
+            for alias in aliases:
+                alias_to_make[normalize_make(alias)] = (make, False)
+        for alias, make in MODEL_LINE_ALIASES.items():
+            alias_to_make[alias] = (make, True)
+        for make, model in approved_models or []:
+            make, model = normalize_make(make), normalize_model(model)
+            if not make or not model:
+                continue
+            alias_to_make.setdefault(make, (make, False))
+            models_by_make.setdefault(make, set()).add(model)
+
+        # One alternation for all makes; longest first so "land rover" beats "land"
+        alternatives = []
+        self._group_to_make = {}
+        for alias in sorted(alias_to_make, key=len, reverse=True):
+            group = f"m{len(alternatives)}"
+            alternatives.append(f"(?P<{group}>{_flexible(alias)}){_MAKE_FALSE_FRIENDS.get(alias, '')}")
+            self._group_to_make[group] = alias_to_make[alias]
+        # A make may run straight into a digit ("mazda3") but not into a letter
+        self._make_re = re.compile(r"(?<![a-z0-9])(?:" + "|".join(alternatives) + r")(?![a-z])")
+
+        self._model_res = {}
+        self._model_names = {}
+        for make, models in models_by_make.items():
+            alternatives = []
+            for model in sorted(models, key=len, reverse=True):
+                variants = [model]
+                # "mazda3" is also written "mazda 3" / "3" after the make
+                if model.startswith(make) and model != make:
+                    variants.append(model[len(make):].strip())
+                for variant in variants:
+                    group = f"v{len(self._model_names)}"
+                    self._model_names[group] = model
+                    alternatives.append(f"(?P<{group}>{_flexible(variant)})")
+            self._model_res[make] = re.compile(
+                r"[\s\-_:,/]*(?:" + "|".join(alternatives) + r")(?![a-z0-9])"
+            )
+
+    def parse(self, title):
+        """
+        Parse a listing title.
+
+        Returns:
+            tuple: (year, make, model) with make/model normalized; any part may be None
+        """
+        if not title or not isinstance(title, str):
+            return None, None, None
+        text = title.lower()
+
+        year = None
+        year_match = _YEAR_RE.search(text)
+        if year_match and int(year_match.group(1)) <= self.max_year:
+            year = int(year_match.group(1))
+
+        make_match = self._make_re.search(text)
+        if make_match:
+            make, keep_in_model = self._group_to_make[make_match.lastgroup]
+            model_start = make_match.start() if keep_in_model else make_match.end()
+            return year, make, self._parse_model(make, text, model_start, max_words=3 if keep_in_model else 2)
+
+        if year_match:
+            # Unknown make: assume "<year> <make> <model ...>"
+            words = re.sub(r"[^\w\s\-]", " ", text[year_match.end():]).split()
+            if len(words) >= 2:
+                return year, normalize_make(words[0]), normalize_model(" ".join(self._model_words(words[1:])))
+        return year, None, None
+
+    def _parse_model(self, make, text, start, max_words=2):
+        model_re = self._model_res.get(make)
+        if model_re is not None:
+            match = model_re.match(text, start)
+            if match:
+                return self._model_names[match.lastgroup]
+        words = self._model_words(re.sub(r"[^\w\s\-]", " ", text[start:]).split(), max_words)
+        return normalize_model(" ".join(words)) or None
+
+    @staticmethod
+    def _model_words(words, max_words=2):
+        model_words = []
+        for word in words:
+            if word in _STOP_WORDS or _YEAR_RE.fullmatch(word):
+                break
+            model_words.append(word)
+            if len(model_words) == max_words:
+                break
+        return model_words
+
+    def parse_many(self, titles):
+        """Parse an iterable of titles; repeated titles are parsed once."""
+        cache = {}
+        results = []
+        for title in titles:
+            result = cache.get(title) if isinstance(title, str) else None
+            if result is None:
+                result = self.parse(title)
+                if isinstance(title, str):
+                    cache[title] = result
+            results.append(result)
+        return results
+
+    def parse_column(self, titles):
+        """
+        Parse a pandas Series of titles.
+
+        Returns:
+            pandas.DataFrame: Columns year, make, model aligned with the input index
+        """
+        import pandas as pd
+
+        unique_titles = titles.dropna().unique()
+        parsed = dict(zip(unique_titles, self.parse_many(unique_titles)))
+        rows = [parsed.get(title, (None, None, None)) if isinstance(title, str) else (None, None, None)
+                for title in titles]
+        return pd.DataFrame(rows, columns=["year", "make", "model"], index=titles.index)
+
+
+_default_recognizer = None
+_default_recognizer_version = None
+
+
+def get_recognizer():
+    """Shared recognizer built from the built-in makes and the approved vehicles list (rebuilt when the list changes)."""
+    global _default_recognizer, _default_recognizer_version
+    from src.processors.approval_index import get_approval_index  # Imports this module
+
+    index = get_approval_index()
+    if _default_recognizer is None or index.version != _default_recognizer_version:
+        if index.version is None:
+            print("Warning: Approved vehicles list unavailable. Only built-in makes will be recognized.")
+        _default_recognizer = MakeModelRecognizer(approved_models=index.models)
+        _default_recognizer_version = index.version
+    return _default_recognizer
+
+
+def parse_title(title):
+    """Parse a title with the shared recognizer. Returns (year, make, model)."""
+    return get_recognizer().parse(title)
@@ -0,0 +1,127 @@
+"""
+Array-backed lookup tables for the scoring reference data.
+
+The OLD reliability data (chart_data_filtered.csv, one value per make/model/year and
+chart type) and the NRCan fuel consumption ratings are kept as YearValueTables: rows
+sorted by (make, model, year), with make/model ids into string tables and NumPy id,
+year and value arrays. Lookups are binary searches over those arrays, and a table is
+nothing but arrays and strings, so it can be published to shared memory and used by
+other processes without being rebuilt (see shared_reference).
+"""
+
+import bisect
+from collections import namedtuple
+
+import numpy as np
+
+# Everything VehicleDataProcessor scores with; replaced as a whole on reload.
+# qir_table/defect_table/fuel_table are YearValueTables; versions holds the (mtime_ns, size)
+# of the reliability and fuel files the snapshot was built from.
+ScoringData = namedtuple("ScoringData", ["approval_index", "qir_table", "defect_table", "fuel_table", "versions"])
+
+# Arrays of a YearValueTable, in the order they are published
+TABLE_ARRAYS = ("pair_keys", "years", "values")
+
+
+class YearValueTable:
+    """Immutable (make, model, year) -> value table; keys are matched exactly as stored."""
+
+    def __init__(self, makes, models, pair_keys, years, values):
+        """
+        Use from_rows() to build a table; this takes the arrays as built (or as published).
+
+        Args:
+            makes (tuple): Make string table
+            models (tuple): Model string table
+            pair_keys (numpy.ndarray): int64 make_id << 32 | model_id per row, sorted
+            years (numpy.ndarray): int32 year per row, sorted within each make/model
+            values (numpy.ndarray): float64 value per row
+        """
+        self.makes = makes
+        self.models = models
+        self.pair_keys = pair_keys
+        self.years = years
+        self.values = values
+        self._make_ids = {make: i for i, make in enumerate(makes)}
+        self._model_ids = {model: i for i, model in enumerate(models)}
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build a table from (make, model, year, value) rows. Rows with the same key keep
+        their input order, so get() returns the last one and mean() averages them all.
+        """
+        make_ids, model_ids, keys, years, values = {}, {}, [], [], []
+        for make, model, year, value in rows:
+            make_id = make_ids.setdefault(make, len(make_ids))
+            model_id = model_ids.setdefault(model, len(model_ids))
+            keys.append((make_id << 32) | model_id)
+            years.append(int(year))
+            try:
+                values.append(float(value))
+            except (TypeError, ValueError):
+                values.append(np.nan)
+        order = sorted(range(len(keys)), key=lambda r: (keys[r], years[r], r))
+        return cls(
+            tuple(make_ids), tuple(model_ids),
+            np.array([keys[r] for r in order], dtype=np.int64),
+            np.array([years[r] for r in order], dtype=np.int32),
+            np.array([values[r] for r in order], dtype=np.float64),
+        )
+
+    def __len__(self):
+        return len(self.years)
+
+    def get(self, make, model, year):
+        """Value stored for this exact key (NaN if stored as missing), or None."""
+        lo, hi = self._pair_range(make, model)
+        if lo == hi:
+            return None
+        end = bisect.bisect_right(self.years, year, lo, hi)
+        if end > lo and self.years[end - 1] == year:
+            return float(self.values[end - 1])
+        return None
+
+    def nearest(self, make, model, year, max_distance):
+        """Value of the closest year of this make/model within `max_distance` years (the earlier year on ties), or None."""
+        lo, hi = self._pair_range(make, model)
+        if lo == hi:
+            return None
+        pos = bisect.bisect_left(self.years, year, lo, hi)
+        best = None
+        if pos > lo:
+            best = pos - 1 # Last row of the closest earlier (or equal) year
+        if pos < hi:
+            later = bisect.bisect_right(self.years, self.years[pos], lo, hi) - 1
+            if best is None or abs(int(self.years[pos]) - year) < abs(int(self.years[best]) - year):
+                best = later
+        if best is None or abs(int(self.years[best]) - year) > max_distance:
+            return None
+        return float(self.values[best])
+
+    def mean(self, make, model=None, year=None):
+        """Mean value over the rows of a make, a make/model or a make/model/year, or None if there are none."""
+        if model is None:
+            make_id = self._make_ids.get(make)
+            if make_id is None:
+                return None
+            lo = bisect.bisect_left(self.pair_keys, make_id << 32)
+            hi = bisect.bisect_left(self.pair_keys, (make_id + 1) << 32, lo)
+        else:
+            lo, hi = self._pair_range(make, model)
+            if year is not None:
+                lo, hi = bisect.bisect_left(self.years, year, lo, hi), bisect.bisect_right(self.years, year, lo, hi)
+        values = self.values[lo:hi]
+        values = values[~np.isnan(values)]
+        return float(values.mean()) if len(values) else None
+
+    def _pair_range(self, make, model):
+        make_id, model_id = self._make_ids.get(make), self._model_ids.get(model)
+        if make_id is None or model_id is None:
+            return 0, 0
+        key = (make_id << 32) | model_id
+        lo = bisect.bisect_left(self.pair_keys, key)
+        return lo, bisect.bisect_right(self.pair_keys, key, lo)
+
+
+EMPTY_TABLE = YearValueTable.from_rows([])
@@ -0,0 +1,189 @@
+"""
+Publishing the scoring reference data to shared memory for worker processes.
+
+A ScoringData snapshot (approval index, reliability and fuel tables) is nothing but
+NumPy arrays and string tables, so it is packed once into a single
+multiprocessing.shared_memory block:
+
+    [8-byte manifest length][JSON manifest][arrays, each 8-byte aligned]
+
+The manifest gives each array's dtype, shape and offset. String tables are stored as
+one UTF-8 blob plus an int64 offsets array. A worker attaches by name and gets a
+ScoringData whose arrays are read-only views of the block, so starting a worker
+costs decoding a few thousand short strings, and N workers share one copy of the
+tables instead of each building its own.
+
+Usage (parent):
+    with publish_scoring_data(processor.data) as shared:
+        ... start workers with shared.name ...
+Worker:
+    data = attach_scoring_data(name)
+"""
+
+import json
+import struct
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.processors.approval_index import RELIABILITY_COLUMNS, ApprovalIndex
+from src.processors.reference_tables import TABLE_ARRAYS, ScoringData, YearValueTable
+
+_FORMAT_VERSION = 1
+_ALIGN = 8
+_LENGTH = struct.Struct("<Q")
+_TABLES = ("qir_table", "defect_table", "fuel_table")
+
+# Blocks attached by this process, kept open for as long as their views are in use
+_attached = {}
+
+
+def _encode_strings(strings):
+    """String table -> (UTF-8 blob, int64 end offsets)."""
+    encoded = [s.encode("utf-8") for s in strings]
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), np.cumsum([len(e) for e in encoded], dtype=np.int64)
+
+
+def _decode_strings(blob, ends):
+    data = blob.tobytes()
+    starts = [0] + ends.tolist()[:-1]
+    return tuple(data[start:end].decode("utf-8") for start, end in zip(starts, ends.tolist()))
+
+
+def _collect_arrays(data):
+    """Name -> array for everything in the snapshot, plus the manifest's non-array fields."""
+    index = data.approval_index
+    arrays = {
+        "approval.make_ids": index.make_ids,
+        "approval.model_ids": index.model_ids,
+        "approval.years": index.years,
+        "approval.sorted_rows": index._sorted_rows,
+        "approval.sorted_years": index._sorted_years,
+    }
+    strings = {
+        "approval.makes": index.makes,
+        "approval.model_names": index.model_names,
+        # Raw (make, model) pairs for the title recognizer, flattened
+        "approval.models": [part for pair in sorted(index.models) for part in pair],
+    }
+    for name in RELIABILITY_COLUMNS:
+        if name in index.columns:
+            arrays[f"approval.column.{name}"] = index.columns[name]
+    for table_name in _TABLES:
+        table = getattr(data, table_name)
+        for name in TABLE_ARRAYS:
+            arrays[f"{table_name}.{name}"] = getattr(table, name)
+        strings[f"{table_name}.makes"] = table.makes
+        strings[f"{table_name}.models"] = table.models
+    for name, values in strings.items():
+        arrays[f"{name}.blob"], arrays[f"{name}.ends"] = _encode_strings(values)
+    meta = {
+        "format": _FORMAT_VERSION,
+        "approval_version": index.version,
+        "versions": data.versions,
+        "strings": list(strings),
+    }
+    return arrays, meta
+
+
+class SharedScoringData:
+    """A ScoringData snapshot published to shared memory (owned by the publishing process)."""
+
+    def __init__(self, shm):
+        self._shm = shm
+        self.name = shm.name
+        self.size = shm.size
+
+    def close(self):
+        """Release the block (unlinked, so it disappears once every attached worker exits)."""
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def publish_scoring_data(data):
+    """
+    Copy a ScoringData snapshot into a new shared memory block.
+
+    Returns:
+        SharedScoringData: Handle holding the block; close() it once the workers are done
+    """
+    arrays, meta = _collect_arrays(data)
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // _ALIGN) * _ALIGN
+    meta["arrays"] = layout
+    manifest = json.dumps(meta).encode("utf-8")
+    data_start = -(-(_LENGTH.size + len(manifest)) // _ALIGN) * _ALIGN
+
+    shm = shared_memory.SharedMemory(create=True, size=max(data_start + offset, 1))
+    try:
+        shm.buf[:_LENGTH.size] = _LENGTH.pack(len(manifest))
+        shm.buf[_LENGTH.size:_LENGTH.size + len(manifest)] = manifest
+        for name, (dtype, shape, array_offset) in layout.items():
+            array = arrays[name]
+            if array.nbytes:
+                target = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=data_start + array_offset)
+                target[...] = array
+                del target # No view may outlive the block
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    return SharedScoringData(shm)
+
+
+def attach_scoring_data(name):
+    """
+    ScoringData backed by the shared memory block `name` (published by a parent process).
+
+    The arrays are read-only views of the block; the block stays attached for the life of
+    this process.
+    """
+    shm = _attached.get(name)
+    if shm is None:
+        # Workers share the publisher's resource tracker, so attaching does not change who unlinks the block
+        shm = _attached[name] = shared_memory.SharedMemory(name=name)
+    (length,) = _LENGTH.unpack(bytes(shm.buf[:_LENGTH.size]))
+    meta = json.loads(bytes(shm.buf[_LENGTH.size:_LENGTH.size + length]).decode("utf-8"))
+    if meta.get("format") != _FORMAT_VERSION:
+        raise ValueError(f"Shared scoring data {name} has an unknown format: {meta.get('format')}")
+    data_start = -(-(_LENGTH.size + length) // _ALIGN) * _ALIGN
+
+    arrays = {}
+    for array_name, (dtype, shape, offset) in meta["arrays"].items():
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=data_start + offset)
+        array.flags.writeable = False
+        arrays[array_name] = array
+    strings = {name: _decode_strings(arrays[f"{name}.blob"], arrays[f"{name}.ends"]) for name in meta["strings"]}
+
+    raw_models = strings["approval.models"]
+    approval_version = meta["approval_version"]
+    index = ApprovalIndex.from_arrays(
+        strings["approval.makes"], strings["approval.model_names"], zip(raw_models[::2], raw_models[1::2]),
+        arrays["approval.make_ids"], arrays["approval.model_ids"], arrays["approval.years"],
+        {column: arrays[f"approval.column.{column}"] for column in RELIABILITY_COLUMNS
+         if f"approval.column.{column}" in arrays},
+        arrays["approval.sorted_rows"], arrays["approval.sorted_years"],
+        version=tuple(approval_version) if isinstance(approval_version, list) else approval_version,
+    )
+    tables = {
+        table_name: YearValueTable(
+            strings[f"{table_name}.makes"], strings[f"{table_name}.models"],
+            *(arrays[f"{table_name}.{array_name}"] for array_name in TABLE_ARRAYS),
+        )
+        for table_name in _TABLES
+    }
+    versions = {key: tuple(value) if isinstance(value, list) else value for key, value in meta["versions"].items()}
+    return ScoringData(index, tables["qir_table"], tables["defect_table"], tables["fuel_table"], versions)
@@ -0,0 +1,77 @@
+"""
+Listing title classification shared by every source.
+
+Listings for parts, wanted ads, "we buy cars" services and the like are recognized
+by keyword. All keywords are compiled into one regex alternation (longest first,
+matched only as whole words, with any run of spaces/dashes between the words of a
+phrase), so a title is classified in a single pass however many keywords there are.
+"""
+
+import re
+
+# Phrases that mark a listing as not a vehicle for sale
+NON_VEHICLE_KEYWORDS = [
+    "parts", "wanted", "buy cars", "cash for cars", "scrap", "tires", "rims", "engine",
+    "transmission", "battery", "wrecking", "salvage", "repair", "service", "mechanic",
+    "desk", "cowl", "enclosed mobility", "scooter", "trades or offer", "we buy cars", "cash cash cash",
+    "any car and truck"
+]
+
+
+def _keyword_pattern(keyword):
+    words = keyword.lower().split()
+    return r"[\s\-]+".join(re.escape(word) for word in words)
+
+
+class TitleClassifier:
+    """Flags titles that contain any of a set of keywords (whole words, case-insensitive)."""
+
+    def __init__(self, keywords=None):
+        """
+        Args:
+            keywords (iterable, optional): Words or phrases to flag (default: NON_VEHICLE_KEYWORDS)
+        """
+        keywords = NON_VEHICLE_KEYWORDS if keywords is None else keywords
+        self.keywords = sorted({" ".join(k.lower().split()) for k in keywords if k and k.strip()}, key=len, reverse=True)
+        if self.keywords:
+            alternation = "|".join(_keyword_pattern(k) for k in self.keywords)
+            self._regex = re.compile(r"(?<![a-z0-9])(?:" + alternation + r")(?![a-z0-9])", re.IGNORECASE)
+        else:
+            self._regex = None
+
+    def match(self, title):
+        """The first keyword found in `title` (as listed in `keywords`), or None."""
+        if not title or self._regex is None:
+            return None
+        found = self._regex.search(title)
+        return re.sub(r"[\s\-]+", " ", found.group(0).lower()) if found else None
+
+    def is_flagged(self, title):
+        return self.match(title) is not None
+
+    def flag_column(self, titles):
+        """
+        Classify a pandas Series of titles.
+
+        Returns:
+            pandas.Series: True where a keyword is found (False for missing titles)
+        """
+        if self._regex is None:
+            return titles.notna() & False
+        return titles.str.contains(self._regex, na=False)
+
+
+_default_classifier = None
+
+
+def get_non_vehicle_classifier():
+    """Shared classifier for NON_VEHICLE_KEYWORDS."""
+    global _default_classifier
+    if _default_classifier is None:
+        _default_classifier = TitleClassifier()
+    return _default_classifier
+
+
+def is_non_vehicle_title(title):
+    """True if the title looks like parts, services or a wanted ad rather than a vehicle for sale."""
+    return get_non_vehicle_classifier().is_flagged(title)
@@ -0,0 +1,158 @@
+"""
+Best-deal ranking without sorting every result.
+
+TopDeals keeps the best K scored listings (by deal_score) in a bounded min-heap as
+listings stream in, optionally also the best K per make/model. Each push is
+O(log K), and the heap never holds more than K listings per group, so a live
+best-deals view costs nothing next to scoring, however many listings go by.
+
+For results already in a DataFrame, top_k_indices() / top_k_frame() select the best
+K rows with np.argpartition and sort only those K.
+
+Listings without a numeric score (errors, missing price) are never ranked. Ties keep
+the listing seen first, the same order a stable descending sort would give.
+"""
+
+import heapq
+import math
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SCORE_KEY = "deal_score"
+DEFAULT_GROUP_KEYS = ("make", "model")
+
+
+def _score_of(listing, key):
+    """Numeric score of a listing, or None if it has none (missing, NaN or not a number)."""
+    try:
+        score = float(listing.get(key))
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(score) else score
+
+
+class _BoundedHeap:
+    """Min-heap of (score, -sequence, listing) holding at most `k` entries."""
+
+    __slots__ = ("k", "entries")
+
+    def __init__(self, k):
+        self.k = k
+        self.entries = []
+
+    def push(self, score, sequence, listing):
+        entry = (score, -sequence, listing)
+        if len(self.entries) < self.k:
+            heapq.heappush(self.entries, entry)
+            return True
+        # Replaces the worst entry only if strictly better, so ties keep the earlier listing
+        if entry[:2] > self.entries[0][:2]:
+            heapq.heapreplace(self.entries, entry)
+            return True
+        return False
+
+    def best(self):
+        return [listing for _, _, listing in sorted(self.entries, key=lambda e: e[:2], reverse=True)]
+
+
+class TopDeals:
+    """The best `k` listings seen so far, overall and optionally per make/model."""
+
+    def __init__(self, k=5, score_key=DEFAULT_SCORE_KEY, per_group=None, group_keys=DEFAULT_GROUP_KEYS):
+        """
+        Args:
+            k (int): Number of best listings to keep overall
+            score_key (str): Listing field to rank by (higher is better)
+            per_group (int, optional): Also keep the best `per_group` listings of each group
+            group_keys (tuple): Listing fields forming the group (default: make and model)
+        """
+        if k < 0 or (per_group is not None and per_group < 0):
+            raise ValueError("k and per_group must not be negative")
+        self.k = k
+        self.score_key = score_key
+        self.per_group = per_group
+        self.group_keys = tuple(group_keys)
+        self._overall = _BoundedHeap(k)
+        self._groups = {}
+        self._seen = 0
+
+    def __len__(self):
+        return len(self._overall.entries)
+
+    def push(self, listing):
+        """
+        Offer one scored listing (a dict). Returns True if it entered the overall top k.
+        """
+        score = _score_of(listing, self.score_key)
+        if score is None:
+            return False
+        sequence = self._seen
+        self._seen += 1
+        if self.per_group:
+            group = tuple(listing.get(key) for key in self.group_keys)
+            heap = self._groups.get(group)
+            if heap is None:
+                heap = self._groups[group] = _BoundedHeap(self.per_group)
+            heap.push(score, sequence, listing)
+        return self._overall.push(score, sequence, listing) if self.k else False
+
+    def extend(self, listings):
+        for listing in listings:
+            self.push(listing)
+        return self
+
+    def best(self):
+        """The best listings so far, best first."""
+        return self._overall.best()
+
+    def best_by_group(self):
+        """Group -> its best listings, best first (empty unless per_group was given)."""
+        return {group: heap.best() for group, heap in self._groups.items()}
+
+
+def top_k_indices(scores, k):
+    """
+    Positions of the `k` highest scores, best first (NaN scores are never selected).
+
+    Uses np.argpartition, so only the selected scores are sorted; ties at the cut-off
+    keep the earliest positions, as a stable descending sort would.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    candidates = np.flatnonzero(~np.isnan(scores))
+    if k <= 0 or not len(candidates):
+        return np.empty(0, dtype=np.intp)
+    values = scores[candidates]
+    if k < len(candidates):
+        cutoff = values[np.argpartition(-values, k - 1)[k - 1]]
+        above = candidates[values > cutoff]
+        at_cutoff = candidates[values == cutoff][:k - len(above)] # Earliest ties only
+        candidates = np.concatenate([above, at_cutoff])
+    # Best first; equal scores in original order
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
+
+
+def top_k_frame(df, k, score_key=DEFAULT_SCORE_KEY, by=None):
+    """
+    The best `k` rows of a results DataFrame by `score_key`, best first.
+
+    Args:
+        df (pandas.DataFrame): Scored listings
+        k (int): Rows to return (per group when `by` is given)
+        score_key (str): Column to rank by (higher is better)
+        by (list, optional): Columns to group by, e.g. ["make", "model"]
+
+    Returns:
+        pandas.DataFrame: The selected rows (with their original index)
+    """
+    if df.empty or score_key not in df.columns:
+        return df.iloc[:0]
+    scores = pd.to_numeric(df[score_key], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    if by is None:
+        return df.iloc[top_k_indices(scores, k)]
+    # Rank within each group; only rows inside their group's top k are sorted
+    ranks = pd.Series(scores, index=df.index).groupby([df[column] for column in by], sort=False, dropna=False) \
+        .rank(method="first", ascending=False)
+    selected = np.flatnonzero((ranks <= k).to_numpy())
+    order = np.lexsort((selected, -scores[selected]))
+    return df.iloc[selected[order]]
@@ -0,0 +1,179 @@
+"""Bounded, compressed store for debug page dumps (captcha, retry and no-listings pages)."""
+
+import asyncio
+import gzip
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional, gzip is always available
+    zstandard = None
+
+DEFAULT_ARTIFACT_DIR = Path(__file__).resolve().parent.parent.parent / "logs" / "artifacts"
+DEFAULT_MAX_TOTAL_BYTES = 200 * 1024 * 1024  # 200 MB on disk (compressed)
+DEFAULT_MAX_AGE_DAYS = 14
+
+COMPRESSION_EXTENSIONS = {"zstd": ".html.zst", "gzip": ".html.gz"}
+
+
+class DebugArtifactStore:
+    """
+    Writes page dumps off the event loop, compressed, deduplicated by content hash
+    and kept within a total size and age quota (oldest files are evicted first).
+    """
+
+    def __init__(self, root_dir=None, max_total_bytes=DEFAULT_MAX_TOTAL_BYTES,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, compression=None):
+        """
+        Args:
+            root_dir (str or Path, optional): Directory for artifacts (default: logs/artifacts)
+            max_total_bytes (int): Maximum total size of stored artifacts
+            max_age_days (float): Artifacts older than this are deleted
+            compression (str, optional): "zstd" or "gzip"; defaults to zstd when installed
+        """
+        self.root_dir = Path(root_dir) if root_dir else DEFAULT_ARTIFACT_DIR
+        self.max_total_bytes = max_total_bytes
+        self.max_age_s = max_age_days * 24 * 3600
+        if compression is None:
+            compression = "zstd" if zstandard is not None else "gzip"
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unsupported compression '{compression}'. Use 'zstd' or 'gzip'.")
+        if compression == "zstd" and zstandard is None:
+            print("Warning: zstandard is not installed. Falling back to gzip for debug artifacts.")
+            compression = "gzip"
+        self.compression = compression
+
+        self._lock = threading.Lock()
+        self._known_digests = None  # digest prefix -> path, loaded lazily from file names
+        self._pending = set()
+
+    async def save_page(self, page, source, label):
+        """
+        Capture page.content() and write it in the background.
+
+        Returns:
+            asyncio.Task or None: The background write, or None if the page could not be read
+        """
+        try:
+            content = await page.content()
+        except Exception as e:
+            print(f"Could not read page content for {source} {label} artifact: {e}")
+            return None
+        return self.save_text(content, source, label)
+
+    def save_text(self, content, source, label):
+        """Schedule a compressed write of `content` without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(None, self._write, content, source, label)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def flush(self):
+        """Wait for all scheduled writes to finish."""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+    def _write(self, content, source, label):
+        data = content.encode("utf-8", errors="replace")
+        digest = hashlib.sha256(data).hexdigest()[:16]
+
+        with self._lock:
+            self.root_dir.mkdir(parents=True, exist_ok=True)
+            known = self._load_known_digests()
+            existing = known.get(digest)
+            if existing is not None and existing.exists():
+                os.utime(existing)  # Refresh age so repeated pages are not evicted first
+                print(f"Debug artifact for {source} {label} is identical to {existing.name}; not stored again.")
+                return existing
+
+            path = self.root_dir / (
+                f"{source}_{label}_{time.strftime('%Y%m%d_%H%M%S')}_{digest}{COMPRESSION_EXTENSIONS[self.compression]}"
+            )
+            tmp_path = path.with_name(path.name + ".tmp")
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(self._compress(data))
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Could not save debug artifact {path.name}: {e}")
+                tmp_path.unlink(missing_ok=True)
+                return None
+            known[digest] = path
+            print(f"Saved {source} {label} page to {path}")
+
+            self._enforce_quota()
+            return path
+
+    def _compress(self, data):
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _load_known_digests(self):
+        if self._known_digests is None:
+            self._known_digests = {}
+            for path in self._artifact_files():
+                digest = _digest_from_name(path.name)
+                if digest:
+                    self._known_digests[digest] = path
+        return self._known_digests
+
+    def _artifact_files(self):
+        if not self.root_dir.exists():
+            return []
+        suffixes = tuple(COMPRESSION_EXTENSIONS.values())
+        return [p for p in self.root_dir.iterdir() if p.is_file() and p.name.endswith(suffixes)]
+
+    def _enforce_quota(self):
+        """Evict files past the age limit, then the oldest files until under the size limit."""
+        now = time.time()
+        entries = []
+        for path in self._artifact_files():
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            too_old = now - mtime > self.max_age_s
+            if not too_old and total <= self.max_total_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            digest = _digest_from_name(path.name)
+            if digest and self._known_digests is not None:
+                self._known_digests.pop(digest, None)
+
+
+def _digest_from_name(name):
+    for ext in COMPRESSION_EXTENSIONS.values():
+        if name.endswith(ext):
+            stem = name[:-len(ext)]
+            return stem.rsplit("_", 1)[-1] if "_" in stem else None
+    return None
+
+
+def read_artifact(path):
+    """Return the decompressed HTML text of a stored artifact."""
+    path = Path(path)
+    raw = path.read_bytes()
+    if path.name.endswith(COMPRESSION_EXTENSIONS["zstd"]):
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst artifacts")
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(raw)
+    elif path.name.endswith(COMPRESSION_EXTENSIONS["gzip"]):
+        data = gzip.decompress(raw)
+    else:
+        data = raw
+    return data.decode("utf-8", errors="replace")
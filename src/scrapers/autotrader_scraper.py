@@ -4,7 +4,6 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
-import time
 from tqdm import tqdm
 import random
 import json
@@ -12,6 +11,17 @@ from curl_cffi import requests as curl_requests
 from bs4 import BeautifulSoup
 
 from src.scrapers.base_scraper import BaseScraper
+from src.scrapers.tracing import AttemptTracer, TRACE_MODE_OFF
+from src.scrapers.artifact_store import DebugArtifactStore
+from src.scrapers.query_planner import (
+    BROAD_QUERY, plan_queries, autotrader_path, autotrader_year_range,
+)
+from src.scrapers.selector_cache import get_selector_cache
+from src.scrapers.readiness import ReadinessStrategy
+from src.scrapers.embedded_state import extract_autotrader_state
+from src.scrapers.rate_control import (
+    get_rate_controller, BLOCK_CAPTCHA, BLOCK_INCAPSULA, BLOCK_TIMEOUT, BLOCK_NO_LISTINGS,
+)
 
 
 class AutoTraderScraper(BaseScraper):
@@ -21,27 +31,105 @@ class AutoTraderScraper(BaseScraper):
     DEFAULT_MAX_PRICE = 20000
     DEFAULT_SEARCH_RADIUS_KM = 250 # Autotrader's 'prx' likely uses km
 
-    # Constants for retry mechanism
+    # Elements that indicate a CAPTCHA / bot check instead of results
+    CAPTCHA_INDICATORS = [
+        "div[class*='captcha']",
+        "div[class*='challenge']",
+        "div[class*='security-check']",
+        "div[class*='bot-detection']",
+        "div[class*='incapsula']",
+        "div[class*='cloudflare']",
+        "iframe[src*='captcha']",
+        "iframe[src*='challenge']",
+        "iframe[src*='security']",
+        "iframe[src*='incapsula']",
+        "iframe[src*='cloudflare']",
+        "form[action*='captcha']",
+        "form[action*='challenge']",
+        "form[action*='security']",
+        "form[action*='incapsula']",
+        "form[action*='cloudflare']",
+    ]
+
+    # Cookie consent buttons, most specific first
+    COOKIE_SELECTORS = [
+        'button:has-text("Accept All")',
+        'button:has-text("Allow All")',
+        'button:has-text("Accept cookies")',
+        'button:has-text("I accept")',
+        'button:has-text("Agree and Proceed")',
+        'button[aria-label*="cookie"]',
+        'button[aria-label*="Cookie"]',
+        'button[data-test*="cookie"]',
+        'button[data-test*="Cookie"]',
+        '//button[contains(text(), "Accept")]',
+        '//button[contains(text(), "Allow")]',
+        '//button[contains(text(), "Agree")]'
+    ]
+
+    # Listing containers, most specific first
+    LISTING_SELECTORS = [
+        # Primary selectors
+        "div[data-test='result-item']",
+        "div.result-item",
+        "div[data-test='listing-card']",
+        "div.listing-card",
+        # Class-based selectors
+        "div[class*='result-item']",
+        "div[class*='listing-item']",
+        "div[class*='listing-card']",
+        "div[class*='vehicle-card']",
+        "div[class*='ad-listing']",
+        "div[class*='listing-container'] > div",
+        # Fallback selectors
+        "section.listing-section div.listing-item",
+        "ul.listings > li",
+    ]
+
+    # Shown instead of listings when a search has no results
+    EMPTY_RESULTS_SELECTORS = [
+        "div[class*='no-results']",
+        "div[class*='noResults']",
+        "div[class*='zero-results']",
+    ]
+
+    # Constants for retry mechanism (the wait between attempts comes from the rate controller)
     MAX_RETRIES = 3
-    INITIAL_RETRY_DELAY_S = 10
-    MAX_RETRY_DELAY_S = 60
     
-    def __init__(self, postal_code="L6M3S7", max_price=None, search_radius_km=None, approved_vehicles_list=None):
+    def __init__(self, postal_code="L6M3S7", max_price=None, search_radius_km=None, approved_vehicles_list=None,
+                 trace_mode=TRACE_MODE_OFF, trace_dir=None, artifact_store=None, replay=None):
         """Initialize the AutoTrader scraper with dynamic search parameters."""
         super().__init__("AutoTrader.ca")
         self.base_url = "https://www.autotrader.ca"
+        self.trace_mode = trace_mode
+        self.trace_dir = trace_dir
+        self.artifacts = artifact_store if artifact_store is not None else DebugArtifactStore()
+        self.replay = replay # Optional ReplayArchive for offline record/replay runs
+        self.rate = get_rate_controller(self.base_url) # Adaptive pacing shared by all AutoTrader requests
+        self.selectors = get_selector_cache() # Remembers which fallback selectors match
+        # Results pages are server-rendered, so readiness is the first listing card (or a bot check)
+        self.readiness = ReadinessStrategy(
+            self.name, content_selectors=self.LISTING_SELECTORS, empty_selectors=self.EMPTY_RESULTS_SELECTORS,
+            block_selectors=self.CAPTCHA_INDICATORS + ["iframe#main-iframe"],
+        )
         
         self.postal_code = postal_code.replace(" ", "") # Ensure no spaces
         self.max_price = max_price if max_price is not None else self.DEFAULT_MAX_PRICE
         self.search_radius_km = search_radius_km if search_radius_km is not None else self.DEFAULT_SEARCH_RADIUS_KM
-        self.approved_vehicles = approved_vehicles_list if approved_vehicles_list else []
+        self._set_approvals(approved_vehicles_list) # ApprovalSource, ApprovalIndex or a legacy list
+        self._plan_searches()
+        print(f"AutoTrader Scraper initialized with {len(self.search_urls)} planned search(es), first: {self.search_urls[0]}")
+
+    def _plan_searches(self):
+        """Build the search URLs from the current approval index."""
+        approved_criteria = self.approval_index.criteria()
 
-        # Construct the search URL dynamically
+        # Construct the search URLs dynamically
         # Common parameters:
         # rcp=100 (results per page)
         # rcs=0 (results offset/skip for pagination)
         # srt=9 (sort: 9 seems to be a common default, possibly "best match" or "date")
-        # yRng=2010%2C2023 (Year range - keeping existing default for now, can be parameterized later if needed)
+        # yRng=min%2Cmax (year range, from the approved vehicles list)
         # prx={search_radius_km} (proximity/distance)
         # loc={postal_code} (postal code)
         # sts=Used (status)
@@ -49,21 +137,26 @@ class AutoTraderScraper(BaseScraper):
         # hprc=True (likely "has price")
         # wcp=True (unknown, keeping from original)
         # inMarket=advancedSearch (type of search)
-        # Default vehicle types from original: /cars/sedan-coupe-hatchback/on/ (Ontario, specific types)
-        # For broader search, might remove /sedan-coupe-hatchback and /on
-        
-        # Using a more general path for cars, assuming 'on' (Ontario) is not always desired.
-        # Province filter can be added if 'loc' with postal code isn't sufficient or if it's a required field.
-        # The original URL had "/on/" after "/cars/vehicle_types/", which implies provincial filtering.
-        # For now, let's make it general and rely on postal code + radius.
-        self.search_url = (
-            f"{self.base_url}/cars/"
-            f"?rcp=100&rcs=0&srt=9&yRng=2010%2C2023"
+        # Make/model are path facets: /cars/{make}/{model}/
+        #
+        # The approved list is pushed into the searches (per approved make/model, or per make for
+        # makes with many models, with their year ranges) so only pages likely to contain approved
+        # cars are downloaded. search_url is the broad search over the overall approved year range,
+        # only used to get through the cookie/bot checks once every planned search has run.
+        self.search_queries = plan_queries(approved_criteria)
+        self.search_urls = [self._build_search_url(query) for query in self.search_queries]
+        overall_query = plan_queries(approved_criteria, max_queries=1)[0]
+        self.search_url = self._build_search_url(overall_query._replace(make=None, model=None))
+
+    def _build_search_url(self, query=BROAD_QUERY):
+        """Search URL for a planned query (make/model facets and year range)."""
+        return (
+            f"{self.base_url}{autotrader_path(query)}"
+            f"?rcp=100&rcs=0&srt=9&yRng={autotrader_year_range(query)}"
             f"&prx={self.search_radius_km}&loc={self.postal_code}"
             f"&priceFrom=500&priceTo={self.max_price}"
             f"&sts=Used&inMarket=advancedSearch&hprc=True&wcp=True"
         )
-        print(f"AutoTrader Scraper initialized with URL: {self.search_url}")
 
     async def _setup_playwright_page(self, playwright: pw_async.Playwright):
         """Setup and return a Playwright browser page and context with enhanced anti-detection measures."""
@@ -150,6 +243,8 @@ class AutoTraderScraper(BaseScraper):
         )
 
         # Add stealth scripts to avoid detection
+        if self.replay:
+            await self.replay.attach(context)
         page = await context.new_page()
         await page.add_init_script("""
             Object.defineProperty(navigator, 'webdriver', {
@@ -224,6 +319,10 @@ class AutoTraderScraper(BaseScraper):
 
         return browser, context, page
 
+    async def _detect_captcha(self, page):
+        """Return the first CAPTCHA indicator found on the page, or None."""
+        return await self.selectors.probe(page, "autotrader", "captcha", self.CAPTCHA_INDICATORS)
+
     async def _handle_incapsula_challenge(self, page):
         """Handle Incapsula security challenge if present."""
         try:
@@ -232,14 +331,10 @@ class AutoTraderScraper(BaseScraper):
             if incapsula_iframe:
                 print("Detected Incapsula security check, attempting to handle...")
                 
-                # Wait for the iframe to load
-                await page.wait_for_timeout(5000)  # Wait for initial load
-                
-                # Get the iframe content
+                # Get the iframe content once it has loaded
                 frame_content = await incapsula_iframe.content_frame()
                 if frame_content:
-                    # Wait for any potential challenge elements
-                    await frame_content.wait_for_timeout(3000)
+                    await frame_content.wait_for_load_state("domcontentloaded", timeout=15000)
                     
                     # Check for common challenge elements
                     challenge_elements = [
@@ -254,29 +349,23 @@ class AutoTraderScraper(BaseScraper):
                         element = await frame_content.query_selector(selector)
                         if element:
                             print(f"Found challenge element: {selector}")
-                            # Wait a bit before interacting
-                            await page.wait_for_timeout(2000)
                             
                             if selector == 'input[type="text"]':
                                 # If it's a text input, we might need to solve a CAPTCHA
                                 print("Text input detected - might be a CAPTCHA")
                                 return False
-                            elif selector == 'input[type="checkbox"]':
-                                # If it's a checkbox, try to click it
-                                await element.click()
-                                await page.wait_for_timeout(2000)
-                            elif selector == 'button[type="submit"]':
-                                # If it's a submit button, try to click it
+                            elif selector in ('input[type="checkbox"]', 'button[type="submit"]'):
+                                # Checkbox or submit button: click it and let the challenge redirect
                                 await element.click()
-                                await page.wait_for_timeout(5000)
-                
-                # Wait for potential redirect
-                await page.wait_for_timeout(5000)
+                                break
                 
-                # Check if we're still on the challenge page
-                if await page.query_selector('iframe#main-iframe'):
+                # Wait for the challenge to go away (redirect to the real page)
+                try:
+                    await page.wait_for_selector('iframe#main-iframe', state="detached", timeout=15000)
+                except pw_async.TimeoutError:
                     print("Still on Incapsula challenge page after handling attempt")
                     return False
+                await self.readiness.wait(page)
                 
                 print("Successfully handled Incapsula challenge")
                 return True
@@ -292,7 +381,11 @@ class AutoTraderScraper(BaseScraper):
         Scrape car listings from AutoTrader.ca using Playwright with enhanced anti-detection.
         """
         print(f"Scraping {self.name} with enhanced Playwright configuration...")
+        if self._refresh_approvals():
+            self._plan_searches()
         listings = []
+        seen_urls = set()
+        next_query_idx = 0 # Planned searches completed so far are not repeated on retry
         
         retries = 0
         while retries <= self.MAX_RETRIES:
@@ -300,331 +393,265 @@ class AutoTraderScraper(BaseScraper):
             context = None 
             page = None
             playwright_instance = None
-            trace_path = f"autotrader_playwright_trace_attempt_{retries + 1}.zip"
-            tracing_started_this_attempt = False
+            tracer = AttemptTracer("autotrader", self.trace_mode, self.trace_dir)
             
             try:
                 playwright_instance = await pw_async.async_playwright().start()
                 browser, context, page = await self._setup_playwright_page(playwright_instance)
-                
-                print(f"Starting Playwright trace for attempt {retries + 1}")
-                await context.tracing.start(screenshots=True, snapshots=True, sources=True)
-                tracing_started_this_attempt = True
-
-                # Simulate human-like interactions to improve stealth
-                await page.mouse.move(random.randint(100, 1820), random.randint(100, 980))
-                await page.wait_for_timeout(random.randint(500, 1500))
-                await page.evaluate("window.scrollBy(0, Math.floor(Math.random()*300 + 100))")
-                await page.wait_for_timeout(random.randint(500, 1500))
-
-                # Add random delays between actions to appear more human-like
-                def random_delay():
-                    time.sleep(random.uniform(2, 5))
+                await tracer.start(context, retries + 1)
 
-                print(f"Attempting to load URL: {self.search_url}")
-                await page.goto(self.search_url, timeout=60000, wait_until="networkidle")
-                random_delay()
-
-                # Add a longer delay after page load
-                print("Waiting for dynamic content to load...")
-                await page.wait_for_timeout(5000)  # 5 second delay
+                # The first load gets through the cookie/bot checks and is also the first results
+                # page of the next planned search, so it is not fetched twice
+                warmup_url = self.search_urls[next_query_idx] if next_query_idx < len(self.search_urls) else self.search_url
+                print(f"Attempting to load URL: {warmup_url}")
+                await self.rate.wait()
+                ready = await self.readiness.goto(page, warmup_url)
+                preloaded_url = warmup_url
 
                 # Enhanced CAPTCHA detection
-                captcha_indicators = [
-                    "div[class*='captcha']",
-                    "div[class*='challenge']",
-                    "div[class*='security-check']",
-                    "div[class*='bot-detection']",
-                    "div[class*='incapsula']",
-                    "div[class*='cloudflare']",
-                    "iframe[src*='captcha']",
-                    "iframe[src*='challenge']",
-                    "iframe[src*='security']",
-                    "iframe[src*='incapsula']",
-                    "iframe[src*='cloudflare']",
-                    "form[action*='captcha']",
-                    "form[action*='challenge']",
-                    "form[action*='security']",
-                    "form[action*='incapsula']",
-                    "form[action*='cloudflare']"
-                ]
-
-                for indicator in captcha_indicators:
-                    if await page.query_selector(indicator):
-                        print(f"CAPTCHA detected with indicator: {indicator}")
-                        filepath = f"autotrader_captcha_page_{time.strftime('%Y%m%d_%H%M%S')}.html"
-                        with open(filepath, "w", encoding="utf-8") as f:
-                            f.write(await page.content())
-                        raise ConnectionError("CAPTCHA detected")
+                indicator = await self._detect_captcha(page)
+                if indicator:
+                    print(f"CAPTCHA detected with indicator: {indicator}")
+                    self.rate.on_block(BLOCK_CAPTCHA)
+                    await self.artifacts.save_page(page, "autotrader", "captcha_page")
+                    raise ConnectionError("CAPTCHA detected")
 
                 # Handle Incapsula challenge if present
                 if not await self._handle_incapsula_challenge(page):
                     print("Failed to handle Incapsula challenge")
+                    self.rate.on_block(BLOCK_INCAPSULA)
                     raise ConnectionError("Failed to handle Incapsula challenge")
 
-                # Handle cookie consent with more robust selectors
-                cookie_selectors = [
-                    'button:has-text("Accept All")',
-                    'button:has-text("Allow All")',
-                    'button:has-text("Accept cookies")',
-                    'button:has-text("I accept")',
-                    'button:has-text("Agree and Proceed")',
-                    'button[aria-label*="cookie"]',
-                    'button[aria-label*="Cookie"]',
-                    'button[data-test*="cookie"]',
-                    'button[data-test*="Cookie"]',
-                    '//button[contains(text(), "Accept")]',
-                    '//button[contains(text(), "Allow")]',
-                    '//button[contains(text(), "Agree")]'
-                ]
-
-                for selector in cookie_selectors:
+                # Handle cookie consent (all known buttons are probed at once)
+                cookie_selector = await self.selectors.probe(page, "autotrader", "cookie", self.COOKIE_SELECTORS)
+                if cookie_selector:
                     try:
-                        cookie_button = await page.query_selector(selector)
+                        cookie_button = await page.query_selector(cookie_selector)
                         if cookie_button and await cookie_button.is_visible():
-                            print(f"Found cookie button with selector: {selector}")
+                            print(f"Found cookie button with selector: {cookie_selector}")
                             await cookie_button.click(timeout=5000)
-                            random_delay()
-                            break
+                            await cookie_button.wait_for_element_state("hidden", timeout=5000)
                     except Exception as e:
-                        continue
-
-                # Wait for listings with more robust selectors
-                listing_selectors = [
-                    # Primary selectors
-                    "div[data-test='result-item']",
-                    "div.result-item",
-                    "div[data-test='listing-card']",
-                    "div.listing-card",
-                    # Class-based selectors
-                    "div[class*='result-item']",
-                    "div[class*='listing-item']",
-                    "div[class*='listing-card']",
-                    "div[class*='vehicle-card']",
-                    "div[class*='ad-listing']",
-                    "div[class*='listing-container'] > div",
-                    # Fallback selectors
-                    "section.listing-section div.listing-item",
-                    "ul.listings > li",
-                ]
+                        print(f"Could not click cookie button {cookie_selector}: {e}")
 
+                # Wait for listings; the selector that worked last time is preferred
+                listing_selector = await self.selectors.find(page, "autotrader", "listing", self.LISTING_SELECTORS,
+                                                             timeout_ms=20000 if ready else 5000)
                 listing_container = None
-                for selector in listing_selectors:
-                    try:
-                        print(f"Trying AutoTrader selector: {selector}")
-                        listing_container = await page.wait_for_selector(selector, timeout=10000)
-                        if listing_container:
-                            # Verify we can find actual listings within this container
-                            found = await page.query_selector_all(selector)
-                            if found:
-                                print(f"AutoTrader selector succeeded: {selector}, found {len(found)} items")
-                                break
-                            else:
-                                print(f"Selector {selector} found container but no items inside")
-                                listing_container = None
-                    except Exception as e:
-                        print(f"AutoTrader selector {selector} failed: {e}")
-                        continue
+                if listing_selector:
+                    found = await page.query_selector_all(listing_selector)
+                    print(f"AutoTrader selector succeeded: {listing_selector}, found {len(found)} items")
+                    listing_container = found[0] if found else None
 
-                if not listing_container:
+                # A narrow planned search can legitimately have no results
+                if not listing_container and not await self.selectors.probe(page, "autotrader", "empty", self.EMPTY_RESULTS_SELECTORS):
                     # Save page snapshot for debugging
-                    filepath = f"autotrader_no_listings_page_{time.strftime('%Y%m%d_%H%M%S')}.html"
-                    with open(filepath, "w", encoding="utf-8") as f:
-                        f.write(await page.content())
-                    print(f"Saved AutoTrader no-listings snapshot to {filepath}")
+                    self.rate.on_block(BLOCK_NO_LISTINGS)
+                    await self.artifacts.save_page(page, "autotrader", "no_listings_page")
                     raise ConnectionError("No listing container found")
 
-                current_page_num = 1
                 processed_this_attempt = 0
-                while True: # Loop for pages
-                    # Navigate to specific page using URL offset
-                    offset = (current_page_num - 1) * 100  # matches rcp=100 results per page
-                    page_url = self.search_url.replace("rcs=0", f"rcs={offset}")
-                    print(f"Playwright: Loading page {current_page_num}, offset={offset}: {page_url}")
-                    await page.goto(page_url, timeout=60000, wait_until="domcontentloaded")
-                    # Ensure elements are loaded
-                    await page.wait_for_selector("div.result-item", timeout=20000, state="visible")
-                    time.sleep(random.uniform(1,3))  # give it a moment
-                    
-                    listing_elements = await page.query_selector_all("div.result-item")
-                    if not listing_elements and current_page_num == 1:
-                        print("No listings found on the first page with Playwright. This might be a soft block or an issue with search criteria.")
-                        filepath = f"autotrader_playwright_no_listings_page_{time.strftime('%Y%m%d_%H%M%S')}.html"
-                        with open(filepath, "w", encoding="utf-8") as f:
-                            f.write(await page.content())
-                        print(f"Saved Playwright no-listings page content to {filepath}")
-                        break 
-
-                    print(f"Found {len(listing_elements)} elements on page {current_page_num} with Playwright.")
-
-                    for element_idx, element_handle in enumerate(listing_elements):
-                        if (element_idx + 1) % 20 == 0: 
-                            print(f"Processing item {element_idx + 1} of {len(listing_elements)} on page {current_page_num}...")
-
-                        if len(listings) >= limit:
-                            print(f"Reached scrape limit of {limit} listings.")
-                            break 
-                        
+                while next_query_idx < len(self.search_urls) and len(listings) < limit: # Loop for planned searches
+                    query_idx = next_query_idx
+                    query_url = self.search_urls[query_idx]
+                    # Each search gets its share of what is left of the limit (unused shares pass on
+                    # to the later searches), so the searches for every make get a turn
+                    query_limit = len(listings) + -(-(limit - len(listings)) // (len(self.search_urls) - query_idx))
+                    print(f"Search {query_idx + 1}/{len(self.search_urls)} (up to {query_limit - len(listings)} listings): {query_url}")
+                    current_page_num = 1
+                    while True: # Loop for pages
+                        # Navigate to specific page using URL offset
+                        offset = (current_page_num - 1) * 100  # matches rcp=100 results per page
+                        page_url = query_url.replace("rcs=0", f"rcs={offset}")
+                        await tracer.checkpoint(f"search {query_idx + 1} page {current_page_num}")
+                        if page_url == preloaded_url:
+                            print(f"Playwright: Page {current_page_num} already loaded: {page_url}")
+                            preloaded_url = None
+                        else:
+                            print(f"Playwright: Loading page {current_page_num}, offset={offset}: {page_url}")
+                            await self.rate.wait()
+                            ready = await self.readiness.goto(page, page_url)
+                        # Ensure elements are loaded (the readiness wait already covered a page without them)
                         try:
-                            # Get outerHTML of the listing item once
-                            item_html = await element_handle.evaluate("element => element.outerHTML")
-                            item_soup = BeautifulSoup(item_html, 'html.parser')
+                            await page.wait_for_selector("div.result-item", timeout=5000 if ready else 1000, state="visible")
+                        except pw_async.TimeoutError:
+                            # A narrow search can legitimately have no results; only a bot check is an error
+                            if await self._detect_captcha(page):
+                                self.rate.on_block(BLOCK_CAPTCHA)
+                                await self.artifacts.save_page(page, "autotrader", "captcha_page")
+                                raise ConnectionError("CAPTCHA detected")
+                            print(f"No results for search {query_idx + 1} (page {current_page_num}).")
+                            self.rate.on_success()
+                            break
+                        self.rate.on_success()
+
+                        # Read the page's embedded results state; the per-card CSS path below is the fallback
+                        state = extract_autotrader_state(await page.content(), self.base_url)
+                        if state and state["listings"]:
+                            added = self._add_state_listings(state["listings"], listings, seen_urls, query_limit)
+                            processed_this_attempt += added
+                            print(f"Read {len(state['listings'])} listings from the embedded state on page {current_page_num} ({added} kept).")
+                            if len(listings) >= query_limit:
+                                print(f"Reached this search's share of {query_limit} listings.")
+                                break
+                            if state["current_page"] and state["max_page"]:
+                                last_page = state["current_page"] >= state["max_page"]
+                            else:
+                                last_page = len(state["listings"]) < 100
+                            if last_page:
+                                print(f"Last page reached at page {current_page_num}.")
+                                break
+                            current_page_num += 1
+                            continue
+
+                        listing_elements = await page.query_selector_all("div.result-item")
+                        print(f"Found {len(listing_elements)} elements on page {current_page_num} with Playwright.")
 
-                            url_element = item_soup.find("a", class_="link-overlay")
-                            url = url_element['href'] if url_element and url_element.has_attr('href') else None
-                            if url and not url.startswith("http"):
-                                url = self.base_url + url
+                        for element_idx, element_handle in enumerate(listing_elements):
+                            if (element_idx + 1) % 20 == 0: 
+                                print(f"Processing item {element_idx + 1} of {len(listing_elements)} on page {current_page_num}...")
 
-                            title_element = item_soup.find("h2", class_="title")
-                            title = title_element.get_text(strip=True) if title_element else "N/A"
+                            if len(listings) >= query_limit:
+                                print(f"Reached this search's share of {query_limit} listings.")
+                                break 
+                        
+                            try:
+                                # Get outerHTML of the listing item once
+                                item_html = await element_handle.evaluate("element => element.outerHTML")
+                                item_soup = BeautifulSoup(item_html, 'html.parser')
+
+                                url_element = item_soup.find("a", class_="link-overlay")
+                                url = url_element['href'] if url_element and url_element.has_attr('href') else None
+                                if url and not url.startswith("http"):
+                                    url = self.base_url + url
+
+                                title_element = item_soup.find("h2", class_="title")
+                                title = title_element.get_text(strip=True) if title_element else "N/A"
+                                if self._is_non_vehicle(title):
+                                    continue
                             
-                            year = self._extract_year(title)
-                            make, model = self._extract_make_model(title)
+                                year = self._extract_year(title)
+                                make, model = self._extract_make_model(title)
 
-                            price_str_element = item_soup.find("span", class_="price-amount")
-                            price = self._extract_price(price_str_element.get_text(strip=True)) if price_str_element else None
+                                price_str_element = item_soup.find("span", class_="price-amount")
+                                price = self._extract_price(price_str_element.get_text(strip=True)) if price_str_element else None
                             
-                            mileage_str_element = item_soup.find("span", class_="kms") 
-                            mileage = self._extract_mileage(mileage_str_element.get_text(strip=True)) if mileage_str_element else None
+                                mileage_str_element = item_soup.find("span", class_="kms") 
+                                mileage = self._extract_mileage(mileage_str_element.get_text(strip=True)) if mileage_str_element else None
                             
-                            body_type = "unknown"
-                            try:
-                                specs_list_items = item_soup.select("div.ad-specs li") # BeautifulSoup select
-                                for spec_item in specs_list_items:
-                                    spec_text = spec_item.get_text(strip=True).lower()
-                                    if "sedan" in spec_text: body_type = "sedan"; break
-                                    if "coupe" in spec_text: body_type = "coupe"; break
-                                    if "hatchback" in spec_text: body_type = "hatchback"; break
-                                    if "suv" in spec_text: body_type = "suv"; break
-                                    if "truck" in spec_text: body_type = "truck"; break
-                                    if "van" in spec_text or "minivan" in spec_text: body_type = "van"; break
-                            except Exception: 
-                                pass
-
-                            is_approved = False
-                            if self.approved_vehicles:
-                                if year and make and model:
-                                    scraped_make_lc = str(make).lower().strip()
-                                    scraped_model_norm = str(model).lower().replace('-', ' ').strip()
-                                    scraped_year_int = int(year)
-
-                                    for approved_make, approved_model, approved_year_filter in self.approved_vehicles:
-                                        if (scraped_make_lc == approved_make and
-                                            scraped_year_int == approved_year_filter and
-                                            scraped_model_norm.startswith(approved_model)):
-                                            is_approved = True
-                                            break
-                                else:
-                                    is_approved = False
-                            else:
-                                is_approved = True
+                                body_type = "unknown"
+                                try:
+                                    specs_list_items = item_soup.select("div.ad-specs li") # BeautifulSoup select
+                                    for spec_item in specs_list_items:
+                                        spec_text = spec_item.get_text(strip=True).lower()
+                                        if "sedan" in spec_text: body_type = "sedan"; break
+                                        if "coupe" in spec_text: body_type = "coupe"; break
+                                        if "hatchback" in spec_text: body_type = "hatchback"; break
+                                        if "suv" in spec_text: body_type = "suv"; break
+                                        if "truck" in spec_text: body_type = "truck"; break
+                                        if "van" in spec_text or "minivan" in spec_text: body_type = "van"; break
+                                except Exception: 
+                                    pass
+
+                                if self.approval_index and not self.approval_index.matches(make, model, year):
+                                    continue
+
+                                if url in seen_urls:
+                                    continue # Already collected (overlapping searches or an earlier attempt)
+                                if not all([url, year, make, model, price is not None, mileage is not None]):
+                                    print(f"Skipping item due to missing core data after Playwright extraction: Title='{title}', URL='{url}'")
+                                    continue
+
+                                listing_data = {
+                                    'url': url, 'title': title, 'year': year, 'make': make, 'model': model,
+                                    'price': price, 'mileage': mileage, 'body_type': body_type, 'source': self.name
+                                }
+                                listings.append(listing_data)
+                                seen_urls.add(url)
+                                processed_this_attempt +=1
+                        
+                            except Exception as e_item:
+                                print(f"Error extracting details for one listing (BS4 parse) on search {query_idx + 1} page {current_page_num}, item {element_idx + 1}: {str(e_item)}")
+                                # Optionally log item_html if parsing fails often
+                                # print(f"Problematic item HTML: {item_html[:500]}")
+                                continue 
+
+                        if len(listings) >= query_limit:
+                            break
 
-                            if not is_approved:
-                                continue
+                        # After processing all items on this page, check if we should continue
+                        if len(listing_elements) < 100:
+                            print(f"Last page reached at page {current_page_num} (only {len(listing_elements)} items).")
+                            break
+                        current_page_num += 1
 
-                            if not all([url, year, make, model, price is not None, mileage is not None]):
-                                print(f"Skipping item due to missing core data after Playwright extraction: Title='{title}', URL='{url}'")
-                                continue
+                    next_query_idx += 1 # Search finished; a retry resumes from the next one
 
-                            listing_data = {
-                                'url': url, 'title': title, 'year': year, 'make': make, 'model': model,
-                                'price': price, 'mileage': mileage, 'body_type': body_type, 'source': self.name
-                            }
-                            listings.append(listing_data)
-                            processed_this_attempt +=1
-                        
-                        except Exception as e_item:
-                            print(f"Error extracting details for one listing (BS4 parse) on page {current_page_num}, item {element_idx + 1}: {str(e_item)}")
-                            # Optionally log item_html if parsing fails often
-                            # print(f"Problematic item HTML: {item_html[:500]}")
-                            continue 
-
-                    if len(listings) >= limit:
-                        break 
-
-                    # After processing all items on this page, check if we should continue
-                    if len(listing_elements) < 100:
-                        print(f"Last page reached at page {current_page_num} (only {len(listing_elements)} items).")
-                        break
-                    current_page_num += 1
-
-                if processed_this_attempt > 0 or not listings:
-                    print(f"Finished Playwright attempt {retries + 1}. Listings collected: {processed_this_attempt}. Total: {len(listings)}")
-                
+                print(f"Finished Playwright attempt {retries + 1}. Listings collected: {processed_this_attempt}. Total: {len(listings)}")
                 if len(listings) >= limit:
                     print(f"Scraping limit ({limit}) reached for {self.name} with Playwright.")
-                    break 
-
-                if current_page_num > 1 and processed_this_attempt == 0 and len(listing_elements) > 0:
-                    print("Processed multiple pages with Playwright but last page had elements yet no new listings (all filtered). Run complete.")
-                    break
 
-                if not listings and current_page_num == 1 and not listing_elements:
-                    print("No listings found matching criteria on first page (Playwright). Ending.")
-                    break
-                
                 break # Successful attempt, break retry loop
 
             except (pw_async.TimeoutError, ConnectionError) as e_retry_pw: # Playwright TimeoutError is a common one for retry
                 print(f"A Playwright retryable error occurred on attempt {retries + 1}/{self.MAX_RETRIES + 1} for {self.name}: {str(e_retry_pw)}")
-                if tracing_started_this_attempt and context:
-                    await context.tracing.stop(path = trace_path)
-                    tracing_started_this_attempt = False # Mark as stopped
-                    print(f"Playwright trace saved to {trace_path} due to retryable error.")
+                if isinstance(e_retry_pw, pw_async.TimeoutError):
+                    self.rate.on_block(BLOCK_TIMEOUT)
+                await tracer.finish(failed=True)
                 retries += 1
                 if page: # Save page source on retryable error
-                    filepath = f"autotrader_playwright_retry_error_page_{retries}_{time.strftime('%Y%m%d_%H%M%S')}.html"
-                    try:
-                        with open(filepath, "w", encoding="utf-8") as f:
-                            f.write(await page.content())
-                        print(f"Saved page source at Playwright retryable error to {filepath}")
-                    except Exception as e_save:
-                        print(f"Could not save page source during Playwright retry handling: {e_save}")
+                    await self.artifacts.save_page(page, "autotrader", f"playwright_retry_error_page_{retries}")
 
                 if retries <= self.MAX_RETRIES:
-                    delay = min(self.MAX_RETRY_DELAY_S, self.INITIAL_RETRY_DELAY_S * (2 ** (retries - 1)))
-                    jitter = delay * 0.2 * random.random()
-                    actual_delay = delay + jitter
-                    print(f"Retrying with Playwright in {actual_delay:.2f} seconds...")
-                    # Close browser and playwright instance before sleep
+                    # Close browser and playwright instance before backing off
                     if browser: await browser.close()
                     if playwright_instance: await playwright_instance.stop()
                     browser, context, page, playwright_instance = None, None, None, None
-                    time.sleep(actual_delay)
+                    await self.rate.backoff()
                 else:
                     print(f"Max retries reached for {self.name} with Playwright. Moving on.")
                     break 
             
             except Exception as e_major_pw:
                 print(f"Major unexpected error in {self.name} Playwright scraping process: {str(e_major_pw)}")
-                if tracing_started_this_attempt and context:
-                    await context.tracing.stop(path = trace_path)
-                    tracing_started_this_attempt = False # Mark as stopped
-                    print(f"Playwright trace saved to {trace_path} due to major error.")
+                await tracer.finish(failed=True)
                 if page:
-                    filepath = f"autotrader_playwright_major_error_page_{time.strftime('%Y%m%d_%H%M%S')}.html"
-                    try:
-                        with open(filepath, "w", encoding="utf-8") as f:
-                            f.write(await page.content())
-                        print(f"Saved page source at Playwright major error to {filepath}")
-                    except Exception as e_save:
-                        print(f"Could not save page source during Playwright major error handling: {e_save}")
+                    await self.artifacts.save_page(page, "autotrader", "playwright_major_error_page")
                 break 
             
             finally:
-                if tracing_started_this_attempt and context: # If tracing was started and not explicitly stopped
-                    print(f"Stopping trace for attempt {retries + (1 if retries < self.MAX_RETRIES and not listings else 0)} as part of finally block.")
-                    await context.tracing.stop(path = trace_path)
-                    print(f"Trace saved to {trace_path} at the end of the attempt (finally block).")
+                await tracer.finish(failed=False) # No-op if the trace was already stopped above
                 if browser:
                     await browser.close()
                 if playwright_instance:
                     await playwright_instance.stop()
                 # print(f"Playwright browser and instance stopped for AutoTrader attempt.")
 
+        await self.artifacts.flush()
+        self.selectors.save()
         print(f"Scraped a total of {len(listings)} listings from {self.name} using Playwright after all attempts.")
+        print(f"Rate control for {self.name}: {self.rate.summary()}")
         return listings
 
+    def _add_state_listings(self, state_listings, listings, seen_urls, limit):
+        """Append approved, complete, unseen listings read from a page's embedded state. Returns how many were added."""
+        added = 0
+        for listing in state_listings:
+            if len(listings) >= limit:
+                break
+            if self.approval_index and not self.approval_index.matches(listing['make'], listing['model'], listing['year']):
+                continue
+            if listing['url'] in seen_urls or self._is_non_vehicle(listing['title']):
+                continue
+            if not all([listing['year'], listing['make'], listing['model'],
+                        listing['price'] is not None, listing['mileage'] is not None]):
+                print(f"Skipping item due to missing core data in embedded state: Title='{listing['title']}', URL='{listing['url']}'")
+                continue
+            listings.append(dict(listing, source=self.name))
+            seen_urls.add(listing['url'])
+            added += 1
+        return added
+
     # Helper methods (previously defined, ensure they are present and correct)
     def _extract_year(self, title):
         """Extracts year from title string. Assumes year is a 4-digit number."""
@@ -632,21 +659,6 @@ class AutoTraderScraper(BaseScraper):
         match = re.search(r'\b(\d{4})\b', title)
         return int(match.group(1)) if match else None
 
-    def _extract_make_model(self, title):
-        """Extracts make and model from title string. This is a simplistic example."""
-        if not title: return None, None
-        year = self._extract_year(title)
-        if year:
-            title_no_year = title.replace(str(year), "").strip()
-            parts = title_no_year.split()
-            if len(parts) >= 2:
-                # This is very basic, real make/model extraction is complex
-                # Consider using a list of known makes to improve accuracy
-                make = parts[0] 
-                model = " ".join(parts[1:])
-                return make, model
-        return None, None # Fallback
-
     def _extract_price(self, price_text):
         """Extracts numeric price from price string (e.g., '$15,000')."""
         if not price_text: return None
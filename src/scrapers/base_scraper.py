@@ -1,3 +1,4 @@
+import asyncio
 import requests
 from bs4 import BeautifulSoup
 from abc import ABC, abstractmethod
@@ -6,6 +7,10 @@ import time
 import random
 from tqdm import tqdm
 
+from src.processors.approval_index import ApprovalSource, current_approval_index
+from src.processors.make_model_recognizer import get_recognizer
+from src.processors.title_classifier import is_non_vehicle_title
+
 class BaseScraper(ABC):
     """Base class for all car listing scrapers."""
     
@@ -26,9 +31,9 @@ class BaseScraper(ABC):
         }
     
     @abstractmethod
-    def scrape(self, limit=100):
+    async def scrape(self, limit=100):
         """
-        Scrape car listings.
+        Scrape car listings. Coroutine, so scrapers can run concurrently on one event loop.
         
         Args:
             limit (int): Maximum number of listings to scrape
@@ -37,6 +42,28 @@ class BaseScraper(ABC):
             list: List of car listing dictionaries
         """
         pass
+
+    async def iter_listings(self, limit=100):
+        """
+        Asynchronously iterate over scraped listings.
+
+        The default implementation yields the results of scrape(); scrapers that collect
+        listings incrementally can override it to yield them as they are found.
+        """
+        for listing in await self.scrape(limit):
+            yield listing
+
+    def scrape_sync(self, limit=100):
+        """Run scrape() to completion from synchronous code (must not be called inside a running event loop)."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.scrape(limit))
+        raise RuntimeError(f"{self.name}: scrape_sync() called inside a running event loop; use 'await scraper.scrape()'")
+
+    async def _run_blocking(self, func, *args):
+        """Run a blocking (requests/sync browser) scrape in a worker thread so the event loop stays free."""
+        return await asyncio.to_thread(func, *args)
     
     def _extract_price(self, price_text):
         """Extract numerical price from text."""
@@ -51,6 +78,35 @@ class BaseScraper(ABC):
         except (ValueError, TypeError):
             return None
     
+    def _set_approvals(self, approvals):
+        """
+        Use `approvals` for filtering: an ApprovalSource (followed as it reloads), an
+        ApprovalIndex, or a legacy approved vehicles list (converted once).
+        """
+        self._approvals = approvals
+        self.approval_index = current_approval_index(approvals)
+
+    def _refresh_approvals(self):
+        """
+        Pick up a reloaded approval list; call between scrapes so one scrape filters with one list.
+
+        Returns:
+            bool: True if the approval index changed (searches planned from it need rebuilding)
+        """
+        approvals = getattr(self, "_approvals", None)
+        if not isinstance(approvals, ApprovalSource):
+            return False # A fixed index or list never changes
+        index = approvals.refresh()
+        if index is self.approval_index:
+            return False
+        print(f"{self.name}: approved vehicles list reloaded ({len(index)} entries).")
+        self.approval_index = index
+        return True
+
+    def _is_non_vehicle(self, title_text):
+        """True if the title is a parts / service / wanted listing rather than a vehicle for sale."""
+        return is_non_vehicle_title(title_text)
+
     def _extract_year(self, title_text):
         """Extract year from title text."""
         if not title_text:
@@ -85,74 +141,12 @@ class BaseScraper(ABC):
     
     def _extract_make_model(self, title_text):
         """
-        Extract make and model from title text.
-        This is a simple heuristic and might need refinement.
+        Extract make and model from title text using the shared make/model recognizer.
+
+        Returns:
+            tuple: (make, model), normalized (e.g. ("mercedes-benz", "e class")), or (None, None)
         """
-        if not title_text:
-            return None, None
-            
-        # Common car makes
-        common_makes = [
-            'toyota', 'honda', 'ford', 'chevrolet', 'chevy', 'nissan', 'hyundai', 
-            'kia', 'mazda', 'subaru', 'volkswagen', 'vw', 'audi', 'bmw', 'mercedes', 
-            'benz', 'lexus', 'acura', 'infiniti', 'jeep', 'dodge', 'chrysler', 'ram',
-            'buick', 'cadillac', 'gmc', 'lincoln', 'volvo', 'porsche', 'jaguar',
-            'land rover', 'range rover', 'mini', 'fiat', 'alfa romeo', 'mitsubishi',
-            'suzuki', 'tesla'
-        ]
-        
-        # Clean up and lowercase the title
-        title_clean = re.sub(r'[^\w\s]', ' ', title_text.lower())
-        title_words = title_clean.split()
-        
-        # Try to find make
-        make = None
-        for word in title_words:
-            if word in common_makes:
-                make = word
-                break
-                
-        # Special cases for two-word makes
-        if not make:
-            for i in range(len(title_words)-1):
-                two_words = f"{title_words[i]} {title_words[i+1]}"
-                if two_words in common_makes:
-                    make = two_words
-                    break
-        
-        # If no make found, return None
-        if not make:
-            return None, None
-            
-        # Try to extract model
-        # This is more complex and depends on the make
-        # For now, we'll use a simple approach that takes the word after the make
-        make_index = None
-        
-        # Find the index of the make in the title words
-        for i, word in enumerate(title_words):
-            if word == make:
-                make_index = i
-                break
-        
-        # If make is two words, find the index of the second word
-        if not make_index and ' ' in make:
-            for i in range(len(title_words)-1):
-                two_words = f"{title_words[i]} {title_words[i+1]}"
-                if two_words == make:
-                    make_index = i + 1
-                    break
-        
-        model = None
-        if make_index is not None and make_index + 1 < len(title_words):
-            model = title_words[make_index + 1]
-            
-            # Check if the next few words are part of the model (like "Accord Sport")
-            if make_index + 2 < len(title_words):
-                next_word = title_words[make_index + 2]
-                if next_word not in ['for', 'with', 'in', 'at', 'near', 'from', 'sale']:
-                    model += ' ' + next_word
-        
+        _, make, model = get_recognizer().parse(title_text)
         return make, model
     
     def _random_delay(self, min_seconds=1, max_seconds=3):
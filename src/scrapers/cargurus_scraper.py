@@ -1,12 +1,36 @@
+import asyncio
 import playwright.async_api as pw_async
 from bs4 import BeautifulSoup
-import time
 from tqdm import tqdm
-import random
 import json
 from curl_cffi import requests as curl_requests
 
 from src.scrapers.base_scraper import BaseScraper
+from src.scrapers.tracing import AttemptTracer, TRACE_MODE_OFF
+from src.scrapers.artifact_store import DebugArtifactStore
+from src.scrapers.query_planner import plan_queries, cargurus_year_params
+from src.scrapers.selector_cache import get_selector_cache
+from src.scrapers.readiness import ReadinessStrategy
+from src.scrapers.embedded_state import extract_cargurus_state
+from src.scrapers.rate_control import get_rate_controller, BLOCK_CAPTCHA, BLOCK_TIMEOUT, BLOCK_NO_LISTINGS
+
+
+# Absolute listing links of the result cards currently shown
+_CARD_LINKS_JS = """
+(args) => {
+    const urls = [];
+    document.querySelectorAll(args.cardSelector).forEach(card => {
+        const link = card.querySelector(args.linkSelector);
+        if (link && link.href) urls.push(link.href);
+    });
+    return urls;
+}
+"""
+
+# True once the result cards show at least one listing link that was not on page 1
+_CARDS_CHANGED_JS = f"""
+(args) => ({_CARD_LINKS_JS.strip()})(args).some(url => !args.previous.includes(url))
+"""
 
 
 class CarGurusScraper(BaseScraper):
@@ -17,23 +41,127 @@ class CarGurusScraper(BaseScraper):
     SEARCH_RADIUS_KM = 250
     SEARCH_RADIUS_MILES = 155 # Approx 250km, CarGurus might use miles
 
-    # Constants for retry mechanism
+    # Elements that indicate a CAPTCHA / bot check instead of results
+    CAPTCHA_INDICATORS = [
+        "div[class*='captcha']",
+        "div[class*='challenge']",
+        "div[class*='security-check']",
+        "div[class*='bot-detection']",
+        "div[class*='incapsula']",
+        "div[class*='cloudflare']",
+        "iframe[src*='captcha']",
+        "iframe[src*='challenge']",
+        "iframe[src*='security']",
+        "iframe[src*='incapsula']",
+        "iframe[src*='cloudflare']",
+        "form[action*='captcha']",
+        "form[action*='challenge']",
+        "form[action*='security']",
+        "form[action*='incapsula']",
+        "form[action*='cloudflare']"
+    ]
+
+    # Listing containers, most specific first
+    LISTING_SELECTORS = [
+        # Primary selectors (most specific)
+        "div[data-test='listing-card']",
+        "div[data-test='inventory-listing']",
+        "div[data-test='vehicle-card']",
+        "div[data-test='car-listing']",
+        # Class-based selectors (more general)
+        "div[class*='listing-card']",
+        "div[class*='listing-item']",
+        "div[class*='result-item']",
+        "div[class*='car-listing']",
+        "div[class*='listing']",
+        "div[class*='car-card']",
+        "div[class*='vehicle-card']",
+        "div[class*='inventory-listing']",
+        "div[class*='inventory-item']",
+        # Additional selectors based on CarGurus structure
+        "div[class*='cg-listing']",
+        "div[class*='cg-card']",
+        "div[class*='cg-vehicle']",
+        "div[class*='cg-inventory']",
+        "div[class*='cg-result']",
+        "div[class*='cg-item']",
+        # Fallback selectors
+        "div[class*='listing-container'] > div",
+        "div[class*='results-container'] > div",
+        "div[class*='inventory-container'] > div",
+        "div[class*='vehicle-container'] > div"
+    ]
+
+    # Any of these marks one listing card on a results page
+    CARD_SELECTOR = (
+        "div[data-test='listing-card'], "
+        "div[data-test='inventory-listing'], "
+        "div[data-test='vehicle-card'], "
+        "div[data-test='car-listing'], "
+        "div[class*='listing-card'], "
+        "div[class*='listing-item'], "
+        "div[class*='result-item'], "
+        "div[class*='car-listing'], "
+        "div[class*='listing'], "
+        "div[class*='car-card'], "
+        "div[class*='vehicle-card'], "
+        "div[class*='inventory-listing'], "
+        "div[class*='inventory-item'], "
+        "div[class*='cg-listing'], "
+        "div[class*='cg-card'], "
+        "div[class*='cg-vehicle'], "
+        "div[class*='cg-inventory'], "
+        "div[class*='cg-result'], "
+        "div[class*='cg-item']"
+    )
+
+    # Results pages are addressed as #resultsPage=N; deeper pages are not fetched
+    MAX_RESULT_PAGES = 50
+
+    # Link to the listing inside a result card
+    CARD_LINK_SELECTOR = (
+        "a[href*='/Cars/inventorylisting/viewDetailsFilterViewInventoryListing.action'], "
+        "a[class*='listing-link'], "
+        "a[class*='vehicle-link']"
+    )
+
+    # Results are loaded by an XHR to these endpoints, which can beat the first card rendering
+    RESULTS_RESPONSE_PATTERNS = ["searchResults", "SearchResults"]
+
+    # Constants for retry mechanism (the wait between attempts comes from the rate controller)
     MAX_RETRIES = 3
-    INITIAL_RETRY_DELAY_S = 10
-    MAX_RETRY_DELAY_S = 60
 
-    def __init__(self, postal_code="L6M3S7", approved_vehicles_list=None):
+    def __init__(self, postal_code="L6M3S7", approved_vehicles_list=None, trace_mode=TRACE_MODE_OFF, trace_dir=None,
+                 artifact_store=None, replay=None):
         """Initialize the CarGurus scraper."""
         super().__init__("CarGurus.ca")
         self.base_url = "https://www.cargurus.ca"
+        self.trace_mode = trace_mode
+        self.trace_dir = trace_dir
+        self.artifacts = artifact_store if artifact_store is not None else DebugArtifactStore()
+        self.replay = replay # Optional ReplayArchive for offline record/replay runs
+        self.rate = get_rate_controller(self.base_url) # Adaptive pacing shared by all CarGurus requests
+        self.selectors = get_selector_cache() # Remembers which fallback selectors match
+        self.readiness = ReadinessStrategy(
+            self.name, content_selectors=self.LISTING_SELECTORS, block_selectors=self.CAPTCHA_INDICATORS,
+            response_patterns=self.RESULTS_RESPONSE_PATTERNS,
+        )
         self.postal_code = postal_code.replace(" ", "") # Ensure no spaces
-        self.approved_vehicles = approved_vehicles_list if approved_vehicles_list else []
+        self._set_approvals(approved_vehicles_list) # ApprovalSource, ApprovalIndex or a legacy list
+        self._plan_searches()
+
+    def _plan_searches(self):
+        """Build the search URL from the current approval index."""
+        approved_criteria = self.approval_index.criteria()
 
-        # Build the search URL
+        # Build the search URL. CarGurus make/model filters need its internal entity IDs, so only the
+        # overall approved year range is pushed into the search; make/model are filtered client-side.
+        year_query = plan_queries(approved_criteria, max_queries=1)[0]
         self.search_url = (
             f"{self.base_url}/Cars/inventorylisting/viewDetailsFilterViewInventoryListing.action?"
             f"sourceContext=carGurusHomePageModel&zip={self.postal_code.lower()}"
             f"&minPrice=500&maxPrice={self.MAX_PRICE}&distance={self.SEARCH_RADIUS_MILES}"
+            f"{cargurus_year_params(year_query)}"
         )
 
     async def _setup_playwright_page(self, playwright: pw_async.Playwright):
@@ -85,6 +213,8 @@ class CarGurusScraper(BaseScraper):
         )
 
         # Add stealth scripts to avoid detection
+        if self.replay:
+            await self.replay.attach(context)
         page = await context.new_page()
         await page.add_init_script("""
             Object.defineProperty(navigator, 'webdriver', {
@@ -103,12 +233,259 @@ class CarGurusScraper(BaseScraper):
 
         return browser, context, page
 
+    async def _detect_captcha(self, page):
+        """Return the first CAPTCHA indicator found on the page, or None."""
+        return await self.selectors.probe(page, "cargurus", "captcha", self.CAPTCHA_INDICATORS)
+
+    def _page_url(self, page_num):
+        """
+        Results page `page_num` of the search. The page is only in the URL fragment, which the server
+        never sees: every URL is served with page 1's cards, and the page's JavaScript then requests
+        page N and swaps its cards in.
+        """
+        return self.search_url if page_num == 1 else f"{self.search_url}#resultsPage={page_num}"
+
+    async def _goto_results_page(self, page, page_num, first_page_urls):
+        """
+        Load results page `page_num` > 1 and wait until its own cards replaced page 1's.
+
+        Page 1's server-rendered cards do not count as ready: the wait is for the results response
+        requested after navigation, then for a card set that differs from page 1.
+
+        Returns:
+            bool: True if page N's cards are shown (False past the last page or on a timeout)
+        """
+        ready = await self.readiness.goto(page, self._page_url(page_num), content_ready=False)
+        if ready is None:
+            print(f"Page {page_num}: no results response after navigation.")
+            return False
+        try:
+            await page.wait_for_function(
+                _CARDS_CHANGED_JS,
+                arg={"cardSelector": self.CARD_SELECTOR, "linkSelector": self.CARD_LINK_SELECTOR,
+                     "previous": list(first_page_urls)},
+                timeout=self.readiness.timeout_ms,
+            )
+        except pw_async.TimeoutError:
+            print(f"Page {page_num}: cards still those of page 1.")
+            return False
+        return True
+
+    async def _extract_listings(self, page, use_state=False):
+        """
+        Extract the listings on the current results page.
+
+        Args:
+            page: Playwright page
+            use_state (bool): Read the page's server-rendered state first (only valid for page 1: the
+                state is served for page 1 whatever the #resultsPage fragment says)
+
+        Returns:
+            tuple: (URLs of all cards on the page, approved and complete listing dicts)
+        """
+        if use_state:
+            state_listings = extract_cargurus_state(await page.content(), self.base_url)
+            if state_listings:
+                print(f"Read {len(state_listings)} listings from the embedded state.")
+                return self._filter_state_listings(state_listings)
+
+        card_urls = []
+        listings = []
+        listing_elements = await page.query_selector_all(self.CARD_SELECTOR)
+        for element in listing_elements:
+            try:
+                # Extract data using more robust selectors
+                title_element = await element.query_selector(
+                    "h3, h4, .title, [class*='title'], "
+                    "[data-test*='title'], "
+                    "[class*='vehicle-title'], "
+                    "[class*='car-title']"
+                )
+                title = await title_element.text_content() if title_element else None
+                if title:
+                    title = title.strip()
+                if self._is_non_vehicle(title):
+                    continue
+
+                price_text_element = await element.query_selector(
+                    "[class*='price'], "
+                    "[data-test*='price'], "
+                    "[class*='listing-price'], "
+                    "[class*='vehicle-price']"
+                )
+                price_text = await price_text_element.text_content() if price_text_element else None
+                if price_text:
+                    price_text = price_text.strip()
+                price = self._extract_price(price_text) if price_text else None
+
+                # Extract year, make, model from title
+                year = self._extract_year(title) if title else None
+                make, model = self._extract_make_model(title) if title else (None, None)
+
+                # Extract mileage with more robust selectors
+                mileage_text_element = await element.query_selector(
+                    "[class*='mileage'], "
+                    "[data-test*='mileage'], "
+                    "[class*='listing-mileage'], "
+                    "[class*='vehicle-mileage'], "
+                    "[class*='odometer']"
+                )
+                mileage_text = await mileage_text_element.text_content() if mileage_text_element else None
+                if mileage_text:
+                    mileage_text = mileage_text.strip()
+                mileage = self._extract_mileage(mileage_text) if mileage_text else None
+
+                # Extract URL with more robust selectors
+                url_element = await element.query_selector(self.CARD_LINK_SELECTOR)
+                url = await url_element.get_attribute("href") if url_element else None
+                if url and not url.startswith("http"):
+                    url = self.base_url + url
+                if url:
+                    card_urls.append(url)
+
+                # Extract body type with more robust selectors
+                body_type = "unknown"
+                body_type_text_element = await element.query_selector(
+                    "[class*='body-type'], "
+                    "[data-test*='body-type'], "
+                    "[class*='vehicle-type'], "
+                    "[class*='car-type']"
+                )
+                body_type_text = await body_type_text_element.text_content() if body_type_text_element else None
+                if body_type_text:
+                    body_type_text = body_type_text.strip().lower()
+                    if "sedan" in body_type_text: body_type = "sedan"
+                    elif "coupe" in body_type_text: body_type = "coupe"
+                    elif "hatchback" in body_type_text: body_type = "hatchback"
+                    elif "suv" in body_type_text: body_type = "suv"
+                    elif "truck" in body_type_text: body_type = "truck"
+                    elif "van" in body_type_text: body_type = "van"
+
+                # Apply approved vehicles filter
+                if self.approval_index and not self.approval_index.matches(make, model, year):
+                    continue
+
+                if not all([url, year, make, model, price is not None, mileage is not None]):
+                    print(f"Skipping item due to missing core data: Title='{title}', URL='{url}'")
+                    continue
+
+                listing_data = {
+                    'url': url,
+                    'title': title,
+                    'year': year,
+                    'make': make,
+                    'model': model,
+                    'price': price,
+                    'mileage': mileage,
+                    'body_type': body_type,
+                    'source': self.name
+                }
+                listings.append(listing_data)
+
+            except Exception as e:
+                print(f"Error processing listing: {str(e)}")
+                continue
+
+        return card_urls, listings
+
+    def _filter_state_listings(self, state_listings):
+        """(card URLs, approved and complete listings) for listings read from the embedded state."""
+        card_urls = [listing['url'] for listing in state_listings]
+        listings = []
+        for listing in state_listings:
+            if self._is_non_vehicle(listing['title']):
+                continue
+            if self.approval_index and not self.approval_index.matches(listing['make'], listing['model'], listing['year']):
+                continue
+            if not all([listing['year'], listing['make'], listing['model'],
+                        listing['price'] is not None, listing['mileage'] is not None]):
+                print(f"Skipping item due to missing core data in embedded state: Title='{listing['title']}', URL='{listing['url']}'")
+                continue
+            listings.append(dict(listing, source=self.name))
+        return card_urls, listings
+
+    async def _fetch_results_page(self, context, page_num, first_page_urls):
+        """Load one results page in its own tab (within the rate controller's concurrency) and extract it."""
+        async with self.rate.slot():
+            page = await context.new_page()
+            try:
+                print(f"Loading results page {page_num}: {self._page_url(page_num)}")
+                loaded = await self._goto_results_page(page, page_num, first_page_urls)
+                indicator = await self._detect_captcha(page)
+                if indicator:
+                    print(f"CAPTCHA detected with indicator: {indicator}")
+                    self.rate.on_block(BLOCK_CAPTCHA)
+                    await self.artifacts.save_page(page, "cargurus", "captcha_page")
+                    raise ConnectionError("CAPTCHA detected")
+                if not loaded:
+                    self.rate.on_success()
+                    return [], [] # Treated as the end of the results
+                card_urls, listings = await self._extract_listings(page)
+                self.rate.on_success()
+                print(f"Found {len(card_urls)} listings on page {page_num}")
+                return card_urls, listings
+            finally:
+                await page.close()
+
+    async def _fetch_remaining_pages(self, context, completed_pages, limit, tracer, first_page_urls):
+        """
+        Fetch results pages after page 1 in waves as wide as the currently allowed concurrency.
+        `first_page_urls` are the card links page 1 shows, which every page is first served with.
+
+        Finished pages are stored in `completed_pages`, so after a failure the next attempt resumes
+        from the first page that did not complete. Stops at the limit, at an empty page, or when a
+        page only repeats cards already seen (past the last page).
+        """
+        while len(self._collect_listings(completed_pages, limit)) < limit:
+            seen_urls = {url for card_urls, _ in completed_pages.values() for url in card_urls}
+            next_pages = [n for n in range(2, self.MAX_RESULT_PAGES + 1) if n not in completed_pages]
+            if not next_pages:
+                print(f"Reached the page cap ({self.MAX_RESULT_PAGES}).")
+                return
+            wave = next_pages[:max(1, self.rate.concurrency)]
+            await tracer.checkpoint(f"pages {wave[0]}-{wave[-1]}")
+            results = await asyncio.gather(*(self._fetch_results_page(context, n, first_page_urls) for n in wave),
+                                           return_exceptions=True)
+
+            error = None
+            for page_num, result in zip(wave, results):
+                if isinstance(result, BaseException):
+                    error = error or result
+                    continue
+                completed_pages[page_num] = result
+            if error:
+                raise error
+
+            for page_num in wave:
+                card_urls, _ = completed_pages[page_num]
+                if not card_urls or seen_urls.issuperset(card_urls):
+                    print(f"No more pages available (page {page_num} had no new listings)")
+                    return
+
+    @staticmethod
+    def _collect_listings(completed_pages, limit):
+        """Listings from the completed pages in page order, without duplicate URLs, up to `limit`."""
+        listings = []
+        seen_urls = set()
+        for page_num in sorted(completed_pages):
+            for listing in completed_pages[page_num][1]:
+                if listing['url'] in seen_urls:
+                    continue
+                seen_urls.add(listing['url'])
+                listings.append(listing)
+                if len(listings) >= limit:
+                    return listings
+        return listings
+
     async def scrape(self, limit=100):
         """
         Scrape car listings from CarGurus.ca using Playwright with enhanced anti-detection.
         """
         print(f"Scraping {self.name} with enhanced Playwright configuration...")
+        if self._refresh_approvals():
+            self._plan_searches()
         listings = []
+        completed_pages = {} # page number -> (card URLs, listings); kept across retries so they resume
         
         retries = 0
         while retries <= self.MAX_RETRIES:
@@ -116,337 +493,87 @@ class CarGurusScraper(BaseScraper):
             context = None 
             page = None
             playwright_instance = None
-            trace_path = f"cargurus_playwright_trace_attempt_{retries + 1}.zip"
-            tracing_started_this_attempt = False
+            tracer = AttemptTracer("cargurus", self.trace_mode, self.trace_dir)
             
             try:
                 playwright_instance = await pw_async.async_playwright().start()
                 browser, context, page = await self._setup_playwright_page(playwright_instance)
-                
-                print(f"Starting Playwright trace for attempt {retries + 1}")
-                await context.tracing.start(screenshots=True, snapshots=True, sources=True)
-                tracing_started_this_attempt = True
-
-                # Add random delays between actions to appear more human-like
-                def random_delay():
-                    time.sleep(random.uniform(2, 5))
+                await tracer.start(context, retries + 1)
 
                 print(f"Attempting to load URL: {self.search_url}")
-                await page.goto(self.search_url, timeout=60000, wait_until="networkidle")
-                random_delay()
-
-                # Add a longer delay after page load to ensure dynamic content is loaded
-                print("Waiting for dynamic content to load...")
-                await page.wait_for_timeout(5000)  # 5 second delay
+                await self.rate.wait()
+                ready = await self.readiness.goto(page, self.search_url)
 
                 # Enhanced CAPTCHA detection
-                captcha_indicators = [
-                    "div[class*='captcha']",
-                    "div[class*='challenge']",
-                    "div[class*='security-check']",
-                    "div[class*='bot-detection']",
-                    "div[class*='incapsula']",
-                    "div[class*='cloudflare']",
-                    "iframe[src*='captcha']",
-                    "iframe[src*='challenge']",
-                    "iframe[src*='security']",
-                    "iframe[src*='incapsula']",
-                    "iframe[src*='cloudflare']",
-                    "form[action*='captcha']",
-                    "form[action*='challenge']",
-                    "form[action*='security']",
-                    "form[action*='incapsula']",
-                    "form[action*='cloudflare']"
-                ]
-
-                for indicator in captcha_indicators:
-                    if await page.query_selector(indicator):
-                        print(f"CAPTCHA detected with indicator: {indicator}")
-                        filepath = f"cargurus_captcha_page_{time.strftime('%Y%m%d_%H%M%S')}.html"
-                        with open(filepath, "w", encoding="utf-8") as f:
-                            f.write(await page.content())
-                        raise ConnectionError("CAPTCHA detected")
-
-                # Enhanced listing selectors for CarGurus
-                listing_selectors = [
-                    # Primary selectors (most specific)
-                    "div[data-test='listing-card']",
-                    "div[data-test='inventory-listing']",
-                    "div[data-test='vehicle-card']",
-                    "div[data-test='car-listing']",
-                    # Class-based selectors (more general)
-                    "div[class*='listing-card']",
-                    "div[class*='listing-item']",
-                    "div[class*='result-item']",
-                    "div[class*='car-listing']",
-                    "div[class*='listing']",
-                    "div[class*='car-card']",
-                    "div[class*='vehicle-card']",
-                    "div[class*='inventory-listing']",
-                    "div[class*='inventory-item']",
-                    # Additional selectors based on CarGurus structure
-                    "div[class*='cg-listing']",
-                    "div[class*='cg-card']",
-                    "div[class*='cg-vehicle']",
-                    "div[class*='cg-inventory']",
-                    "div[class*='cg-result']",
-                    "div[class*='cg-item']",
-                    # Fallback selectors
-                    "div[class*='listing-container'] > div",
-                    "div[class*='results-container'] > div",
-                    "div[class*='inventory-container'] > div",
-                    "div[class*='vehicle-container'] > div"
-                ]
-
-                # Try to find the listing container with enhanced debugging
+                indicator = await self._detect_captcha(page)
+                if indicator:
+                    print(f"CAPTCHA detected with indicator: {indicator}")
+                    self.rate.on_block(BLOCK_CAPTCHA)
+                    await self.artifacts.save_page(page, "cargurus", "captcha_page")
+                    raise ConnectionError("CAPTCHA detected")
+
+                # Wait for any listing selector at once; the one that worked last time is preferred
                 listing_container = None
-                for selector in listing_selectors:
-                    try:
-                        print(f"Trying selector: {selector}")
-                        listing_container = await page.wait_for_selector(selector, timeout=10000)
-                        if listing_container:
-                            print(f"Found listing container with selector: {selector}")
-                            # Verify we can find actual listings within this container
-                            listings_found = await page.query_selector_all(f"{selector}")
-                            if listings_found:
-                                print(f"Verified {len(listings_found)} listings found with selector: {selector}")
-                                break
-                            else:
-                                print(f"Selector {selector} found container but no listings within it")
-                                listing_container = None
-                    except Exception as e:
-                        print(f"Selector {selector} failed: {str(e)}")
-                        continue
+                listing_selector = await self.selectors.find(page, "cargurus", "listing", self.LISTING_SELECTORS,
+                                                             timeout_ms=20000 if ready else 5000)
+                if listing_selector:
+                    listings_found = await page.query_selector_all(listing_selector)
+                    print(f"Verified {len(listings_found)} listings found with selector: {listing_selector}")
+                    listing_container = listings_found[0] if listings_found else None
 
                 if not listing_container:
                     # Save the page content for debugging
-                    filepath = f"cargurus_no_listings_page_{time.strftime('%Y%m%d_%H%M%S')}.html"
-                    with open(filepath, "w", encoding="utf-8") as f:
-                        f.write(await page.content())
-                    print(f"Saved page content to {filepath} for debugging")
+                    self.rate.on_block(BLOCK_NO_LISTINGS)
+                    await self.artifacts.save_page(page, "cargurus", "no_listings_page")
                     raise ConnectionError("No listing container found")
 
-                # Process listings with enhanced selectors
-                current_page = 1
-                while len(listings) < limit:
-                    # Extract listings from current page with enhanced selectors
-                    listing_elements = await page.query_selector_all(
-                        "div[data-test='listing-card'], "
-                        "div[data-test='inventory-listing'], "
-                        "div[data-test='vehicle-card'], "
-                        "div[data-test='car-listing'], "
-                        "div[class*='listing-card'], "
-                        "div[class*='listing-item'], "
-                        "div[class*='result-item'], "
-                        "div[class*='car-listing'], "
-                        "div[class*='listing'], "
-                        "div[class*='car-card'], "
-                        "div[class*='vehicle-card'], "
-                        "div[class*='inventory-listing'], "
-                        "div[class*='inventory-item'], "
-                        "div[class*='cg-listing'], "
-                        "div[class*='cg-card'], "
-                        "div[class*='cg-vehicle'], "
-                        "div[class*='cg-inventory'], "
-                        "div[class*='cg-result'], "
-                        "div[class*='cg-item']"
-                    )
-                    
-                    if not listing_elements:
-                        print("No more listings found")
-                        # Save the page content for debugging
-                        filepath = f"cargurus_no_listings_page_{time.strftime('%Y%m%d_%H%M%S')}.html"
-                        with open(filepath, "w", encoding="utf-8") as f:
-                            f.write(await page.content())
-                        print(f"Saved page content to {filepath} for debugging")
-                        break
-
-                    print(f"Found {len(listing_elements)} listings on page {current_page}")
-
-                    for element in listing_elements:
-                        try:
-                            # Extract data using more robust selectors
-                            title_element = await element.query_selector(
-                                "h3, h4, .title, [class*='title'], "
-                                "[data-test*='title'], "
-                                "[class*='vehicle-title'], "
-                                "[class*='car-title']"
-                            )
-                            title = await title_element.text_content() if title_element else None
-                            if title:
-                                title = title.strip()
-                            
-                            price_text_element = await element.query_selector(
-                                "[class*='price'], "
-                                "[data-test*='price'], "
-                                "[class*='listing-price'], "
-                                "[class*='vehicle-price']"
-                            )
-                            price_text = await price_text_element.text_content() if price_text_element else None
-                            if price_text:
-                                price_text = price_text.strip()
-                            price = self._extract_price(price_text) if price_text else None
-                            
-                            # Extract year, make, model from title
-                            year = self._extract_year(title) if title else None
-                            make, model = self._extract_make_model(title) if title else (None, None)
-                            
-                            # Extract mileage with more robust selectors
-                            mileage_text_element = await element.query_selector(
-                                "[class*='mileage'], "
-                                "[data-test*='mileage'], "
-                                "[class*='listing-mileage'], "
-                                "[class*='vehicle-mileage'], "
-                                "[class*='odometer']"
-                            )
-                            mileage_text = await mileage_text_element.text_content() if mileage_text_element else None
-                            if mileage_text:
-                                mileage_text = mileage_text.strip()
-                            mileage = self._extract_mileage(mileage_text) if mileage_text else None
-                            
-                            # Extract URL with more robust selectors
-                            url_element = await element.query_selector(
-                                "a[href*='/Cars/inventorylisting/viewDetailsFilterViewInventoryListing.action'], "
-                                "a[href*='/Cars/inventorylisting/viewDetailsFilterViewInventoryListing.action'], "
-                                "a[href*='/Cars/inventorylisting/viewDetailsFilterViewInventoryListing.action'], "
-                                "a[class*='listing-link'], "
-                                "a[class*='vehicle-link']"
-                            )
-                            url = await url_element.get_attribute("href") if url_element else None
-                            if url and not url.startswith("http"):
-                                url = self.base_url + url
-
-                            # Extract body type with more robust selectors
-                            body_type = "unknown"
-                            body_type_text_element = await element.query_selector(
-                                "[class*='body-type'], "
-                                "[data-test*='body-type'], "
-                                "[class*='vehicle-type'], "
-                                "[class*='car-type']"
-                            )
-                            body_type_text = await body_type_text_element.text_content() if body_type_text_element else None
-                            if body_type_text:
-                                body_type_text = body_type_text.strip().lower()
-                                if "sedan" in body_type_text: body_type = "sedan"
-                                elif "coupe" in body_type_text: body_type = "coupe"
-                                elif "hatchback" in body_type_text: body_type = "hatchback"
-                                elif "suv" in body_type_text: body_type = "suv"
-                                elif "truck" in body_type_text: body_type = "truck"
-                                elif "van" in body_type_text: body_type = "van"
-
-                            # Apply approved vehicles filter
-                            is_approved = False
-                            if self.approved_vehicles:
-                                if year and make and model:
-                                    scraped_make_lc = str(make).lower().strip()
-                                    scraped_model_norm = str(model).lower().replace('-', ' ').strip()
-                                    scraped_year_int = int(year)
-
-                                    for approved_make, approved_model, approved_year in self.approved_vehicles:
-                                        if (scraped_make_lc == approved_make and
-                                            scraped_year_int == approved_year and
-                                            scraped_model_norm.startswith(approved_model)):
-                                            is_approved = True
-                                            break
-                            else:
-                                is_approved = True
-
-                            if not is_approved:
-                                continue
-
-                            if not all([url, year, make, model, price is not None, mileage is not None]):
-                                print(f"Skipping item due to missing core data: Title='{title}', URL='{url}'")
-                                continue
-
-                            listing_data = {
-                                'url': url,
-                                'title': title,
-                                'year': year,
-                                'make': make,
-                                'model': model,
-                                'price': price,
-                                'mileage': mileage,
-                                'body_type': body_type,
-                                'source': self.name
-                            }
-                            listings.append(listing_data)
-                        
-                            if len(listings) >= limit:
-                                break
-
-                        except Exception as e:
-                            print(f"Error processing listing: {str(e)}")
-                            continue
-                    
-                    if len(listings) >= limit:
-                        break
-
-                    # Try to go to next page
-                    try:
-                        next_button = await page.query_selector("button[aria-label*='Next'], a[aria-label*='Next'], [class*='next']")
-                        if next_button and await next_button.is_visible():
-                            await next_button.click()
-                            random_delay()
-                            current_page += 1
-                        else:
-                            print("No more pages available")
-                            break
-                    except Exception as e:
-                        print(f"Error navigating to next page: {str(e)}")
-                        break
-
+                # Page 1 is already loaded; later pages are addressed by URL and fetched concurrently
+                if 1 not in completed_pages:
+                    card_urls, page_listings = await self._extract_listings(page, use_state=True)
+                    self.rate.on_success()
+                    print(f"Found {len(card_urls)} listings on page 1")
+                    completed_pages[1] = (card_urls, page_listings)
+                first_page_urls = await page.evaluate(
+                    _CARD_LINKS_JS, {"cardSelector": self.CARD_SELECTOR, "linkSelector": self.CARD_LINK_SELECTOR})
+                await self._fetch_remaining_pages(context, completed_pages, limit, tracer, first_page_urls)
+
+                listings = self._collect_listings(completed_pages, limit)
                 print(f"Finished scraping {len(listings)} listings")
                 break
 
             except (pw_async.TimeoutError, ConnectionError) as e:
                 print(f"Error during scrape attempt {retries + 1}/{self.MAX_RETRIES + 1}: {str(e)}")
-                if tracing_started_this_attempt and context:
-                    await context.tracing.stop(path=trace_path)
-                    print(f"Saved trace to {trace_path}")
+                if isinstance(e, pw_async.TimeoutError):
+                    self.rate.on_block(BLOCK_TIMEOUT)
+                await tracer.finish(failed=True)
                 
                 retries += 1
                 if retries <= self.MAX_RETRIES:
-                    delay = min(self.MAX_RETRY_DELAY_S, self.INITIAL_RETRY_DELAY_S * (2 ** (retries - 1)))
-                    jitter = delay * 0.2 * random.random()
-                    actual_delay = delay + jitter
-                    print(f"Retrying in {actual_delay:.2f} seconds...")
-                    time.sleep(actual_delay)
+                    await self.rate.backoff()
                 else:
                     print(f"Max retries reached for {self.name}")
                     break
             
             except Exception as e:
                 print(f"Unexpected error: {str(e)}")
-                if tracing_started_this_attempt and context:
-                    await context.tracing.stop(path=trace_path)
-                    print(f"Saved trace to {trace_path}")
+                await tracer.finish(failed=True)
                 break
         
             finally:
-                if tracing_started_this_attempt and context:
-                    await context.tracing.stop(path=trace_path)
+                await tracer.finish(failed=False) # No-op if the trace was already stopped above
                 if browser:
                     await browser.close()
                 if playwright_instance:
                     await playwright_instance.stop()
 
+        if not listings and completed_pages:
+            listings = self._collect_listings(completed_pages, limit) # Keep what finished before the last failure
+        await self.artifacts.flush()
+        self.selectors.save()
         print(f"Scraped a total of {len(listings)} listings from {self.name}")
+        print(f"Rate control for {self.name}: {self.rate.summary()}")
         return listings 
 
-    def _extract_make_model(self, title):
-        """Extract make and model from title string."""
-        if not title:
-            return None, None
-        year = self._extract_year(title)
-        if year:
-            title_no_year = title.replace(str(year), "").strip()
-            parts = title_no_year.split()
-            if len(parts) >= 2:
-                make = parts[0]
-                model = " ".join(parts[1:])
-                return make, model
-        return None, None
-
     def _extract_mileage(self, mileage_text):
         """Extract numeric mileage from mileage string."""
         if not mileage_text:
@@ -0,0 +1,284 @@
+"""
+Reads result listings from the state a results page embeds for its own scripts.
+
+AutoTrader renders its results server-side and also hands them to its scripts as
+JSON: the analytics data layer (`gtmManager.initializeDataLayer({...})`, one entry
+per card with ad ID, make, model, year and price) and `searchResultsDataJson`
+(the cards' detail URLs and the page count). Decoding those with
+json.JSONDecoder.raw_decode at their marker is much cheaper than walking every
+card's markup, and does not depend on class names. The odometer reading is the
+one field the state lacks; it is taken from the card's odometer span with a
+regex over the raw HTML.
+
+CarGurus pages are read from a server-rendered state blob when one is present
+(`window.__PREFLIGHT__`, `__NEXT_DATA__`). The scrapers keep their CSS
+extraction as the fallback whenever no state is found.
+
+Benchmark against the saved result pages:
+    python -m src.scrapers.embedded_state
+    python -m src.scrapers.embedded_state autotrader_captcha_page_20250517_145910.html
+"""
+
+import html as html_lib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from src.processors.make_model_recognizer import normalize_make, normalize_model
+
+AUTOTRADER_BASE_URL = "https://www.autotrader.ca"
+CARGURUS_BASE_URL = "https://www.cargurus.ca"
+
+_AUTOTRADER_DATA_LAYER_MARKER = "initializeDataLayer("
+_AUTOTRADER_RESULTS_MARKER = "searchResultsDataJson = JSON.stringify("
+_AUTOTRADER_LD_JSON_RE = re.compile(r'<script type="application/ld\+json">(.*?)</script>', re.DOTALL)
+# Each card starts with <div id="11_5-66440821" data-adid=...>; its odometer reading follows
+_AUTOTRADER_CARD_RE = re.compile(r'<div id="\d+_(\d+-\d+)" data-adid=')
+_AUTOTRADER_ODOMETER_RE = re.compile(r'class="odometer-proximity">\s*([\d,]+)\s*km', re.IGNORECASE)
+
+_CARGURUS_STATE_MARKERS = ("window.__PREFLIGHT__ =", "window.__PREFLIGHT__=", '<script id="__NEXT_DATA__" type="application/json">')
+_CARGURUS_LISTING_PATH = "/Cars/inventorylisting/viewDetailsFilterViewInventoryListing.action"
+
+_decoder = json.JSONDecoder()
+
+
+def decode_after(text, marker, start=0):
+    """
+    Decode the JSON value that follows `marker` in `text` (only that value is parsed).
+
+    Returns:
+        The decoded object, or None if the marker is missing or not followed by valid JSON
+    """
+    idx = text.find(marker, start)
+    if idx < 0:
+        return None
+    idx += len(marker)
+    length = len(text)
+    while idx < length and text[idx].isspace():
+        idx += 1
+    try:
+        value, _ = _decoder.raw_decode(text, idx)
+    except ValueError:
+        return None
+    return value
+
+
+def _to_number(value, cast=float):
+    if value is None or value == "":
+        return None
+    try:
+        return cast(str(value).replace(",", "").replace("$", "").strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _ad_id_from_composite(composite_id):
+    """AutoTrader composite id ("5_66440821_ts") -> data layer ad ID ("5-66440821")."""
+    parts = composite_id.split("_")
+    return f"{parts[0]}-{parts[1]}" if len(parts) >= 2 else None
+
+
+def _autotrader_titles(page_html):
+    """Card titles keyed by detail URL, from the BreadcrumbList ld+json blocks."""
+    titles = {}
+    for block in _AUTOTRADER_LD_JSON_RE.findall(page_html):
+        if "ItemPage" not in block:
+            continue
+        try:
+            document = json.loads(block)
+        except ValueError:
+            continue
+        graph = document.get("@graph", [document]) if isinstance(document, dict) else document
+        for crumbs in graph:
+            for element in (crumbs or {}).get("itemListElement", []):
+                item = element.get("item") or {}
+                if item.get("@type") == "ItemPage" and item.get("@id") and item.get("name"):
+                    titles[item["@id"].split("?")[0]] = html_lib.unescape(item["name"]).strip()
+    return titles
+
+
+def _autotrader_mileages(page_html):
+    """Odometer readings keyed by ad ID (the first reading between a card marker and the next)."""
+    mileages = {}
+    markers = list(_AUTOTRADER_CARD_RE.finditer(page_html))
+    for idx, marker in enumerate(markers):
+        end = markers[idx + 1].start() if idx + 1 < len(markers) else len(page_html)
+        match = _AUTOTRADER_ODOMETER_RE.search(page_html, marker.end(), end)
+        if match:
+            mileages.setdefault(marker.group(1), _to_number(match.group(1), int))
+    return mileages
+
+
+def extract_autotrader_state(page_html, base_url=AUTOTRADER_BASE_URL):
+    """
+    Listings and paging info from an AutoTrader results page's embedded state.
+
+    Returns:
+        dict or None: {"listings": [...], "current_page": int or None, "max_page": int or None},
+        listings in page order with the scrapers' listing fields (body_type is "unknown";
+        mileage is None when the card shows none); None if the page carries no results state
+    """
+    data_layer = decode_after(page_html, _AUTOTRADER_DATA_LAYER_MARKER)
+    results = decode_after(page_html, _AUTOTRADER_RESULTS_MARKER)
+    if not isinstance(data_layer, dict) or not isinstance(results, dict):
+        return None
+
+    vehicles = {}
+    for vehicle_list in data_layer.get("lists") or []:
+        for vehicle in (vehicle_list or {}).get("vehicles") or []:
+            if vehicle.get("adID"):
+                vehicles.setdefault(vehicle["adID"], vehicle)
+
+    titles = _autotrader_titles(page_html)
+    mileages = _autotrader_mileages(page_html)
+
+    listings = []
+    for composite_id, path in zip(results.get("compositeIds") or [], results.get("compositeIdUrls") or []):
+        ad_id = _ad_id_from_composite(composite_id)
+        vehicle = vehicles.get(ad_id)
+        if not vehicle or not path:
+            continue
+        url = path.split("?")[0]
+        if not url.startswith("http"):
+            url = base_url + url
+        year = _to_number(vehicle.get("year"), int)
+        make, model = vehicle.get("make"), vehicle.get("model")
+        listings.append({
+            'url': url,
+            'title': titles.get(url) or " ".join(str(part) for part in (year, make, model) if part),
+            'year': year,
+            'make': normalize_make(make) if make else None,
+            'model': normalize_model(model) if model else None,
+            'price': _to_number(vehicle.get("price")),
+            'mileage': mileages.get(ad_id),
+            'body_type': "unknown",
+        })
+
+    return {
+        "listings": listings,
+        "current_page": results.get("currentPage"),
+        "max_page": results.get("maxPage"),
+    }
+
+
+def _find_cargurus_listing_nodes(document):
+    """Yield listing-shaped dicts (an id plus make/model/year fields) in document order."""
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if node.get("id") is not None and "makeName" in node and "carYear" in node:
+                yield node
+                continue
+            stack.extend(reversed(list(node.values())))
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def extract_cargurus_state(page_html, base_url=CARGURUS_BASE_URL):
+    """
+    Listings from a CarGurus results page's server-rendered state.
+
+    Returns:
+        list or None: Listing dicts in page order (same fields as extract_autotrader_state),
+        or None if the page carries no recognizable state
+    """
+    for marker in _CARGURUS_STATE_MARKERS:
+        document = decode_after(page_html, marker)
+        if document is None:
+            continue
+        listings = []
+        seen_ids = set()
+        for node in _find_cargurus_listing_nodes(document):
+            if node["id"] in seen_ids:
+                continue
+            seen_ids.add(node["id"])
+            year = _to_number(node.get("carYear"), int)
+            make, model = node.get("makeName"), node.get("modelName")
+            price = node.get("price")
+            if isinstance(price, dict):
+                price = price.get("value", price.get("amount"))
+            mileage = node.get("mileage")
+            if isinstance(mileage, dict):
+                mileage = mileage.get("value")
+            listings.append({
+                'url': f"{base_url}{_CARGURUS_LISTING_PATH}#listing={node['id']}",
+                'title': node.get("listingTitle") or " ".join(str(part) for part in (year, make, model) if part),
+                'year': year,
+                'make': normalize_make(make) if make else None,
+                'model': normalize_model(model) if model else None,
+                'price': _to_number(price),
+                'mileage': _to_number(mileage, int),
+                'body_type': (node.get("bodyTypeName") or "unknown").lower(),
+            })
+        if listings:
+            return listings
+    return None
+
+
+def _css_extract_autotrader(page_html):
+    """The CSS path the scrapers fall back to, over a whole saved page (for the benchmark)."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page_html, "html.parser")
+    cards = []
+    for item in soup.select("div.result-item"):
+        link = item.find("a", class_="inner-link") or item.find("a", class_="link-overlay")
+        title = item.find(class_="title-with-trim") or item.find("h2")
+        price = item.find("span", class_="price-amount")
+        mileage = item.find("span", class_="odometer-proximity") or item.find("span", class_="kms")
+        cards.append((
+            link.get("href") if link else None,
+            title.get_text(strip=True) if title else None,
+            price.get_text(strip=True) if price else None,
+            mileage.get_text(strip=True) if mileage else None,
+        ))
+    return cards
+
+
+def benchmark(paths, repeat=3):
+    """Time embedded-state extraction against the CSS path on saved pages and print a summary."""
+    try:
+        import bs4  # noqa: F401
+        have_bs4 = True
+    except ImportError:
+        have_bs4 = False
+        print("BeautifulSoup is not installed; timing the embedded-state path only.")
+
+    for path in paths:
+        page_html = Path(path).read_text(encoding="utf-8", errors="replace")
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            state = extract_autotrader_state(page_html)
+        state_ms = (time.perf_counter() - start) * 1000 / repeat
+        if state is None:
+            print(f"{path}: no embedded results state")
+            continue
+        listings = state["listings"]
+        complete = sum(1 for l in listings if all(l[k] is not None for k in ("year", "make", "model", "price", "mileage")))
+        line = f"{path}: state {state_ms:.1f} ms, {len(listings)} listings ({complete} complete)"
+
+        if have_bs4:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                cards = _css_extract_autotrader(page_html)
+            css_ms = (time.perf_counter() - start) * 1000 / repeat
+            line += f" | CSS {css_ms:.1f} ms, {len(cards)} cards | {css_ms / max(state_ms, 1e-6):.1f}x faster"
+        print(line)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    root = Path(__file__).resolve().parent.parent.parent
+    paths = argv or sorted(str(p) for p in root.glob("autotrader_*.html"))
+    if not paths:
+        print("No saved AutoTrader pages found.")
+        return
+    benchmark(paths)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Reads Facebook Marketplace listings from the feed's own data instead of the rendered DOM.
+
+The marketplace feed is delivered as GraphQL responses (/api/graphql/) as the page scrolls,
+and the first batch is embedded in the HTML as <script type="application/json"> blocks.
+Both carry listing nodes of type GroupCommerceProductItem with stable field names
+(marketplace_listing_title, listing_price, custom_sub_titles_with_rendering_flags, ...),
+unlike the obfuscated class names of the rendered cards.
+"""
+
+import asyncio
+import json
+import re
+
+LISTING_TYPENAME = "GroupCommerceProductItem"
+GRAPHQL_PATH = "/api/graphql"
+
+_JSON_SCRIPT_RE = re.compile(r'<script type="application/json"[^>]*>(.*?)</script>', re.DOTALL)
+_JSON_PREFIX = "for (;;);"
+
+
+def iter_json_documents(text):
+    """Yield the JSON documents in a response body (GraphQL streams several, one after another)."""
+    if text.startswith(_JSON_PREFIX):
+        text = text[len(_JSON_PREFIX):]
+    decoder = json.JSONDecoder()
+    idx = 0
+    length = len(text)
+    while idx < length:
+        while idx < length and text[idx].isspace():
+            idx += 1
+        if idx >= length:
+            break
+        try:
+            document, idx = decoder.raw_decode(text, idx)
+        except ValueError:
+            return
+        yield document
+
+
+def find_listing_nodes(document):
+    """Yield every GroupCommerceProductItem node in a decoded document, in document order."""
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if node.get("__typename") == LISTING_TYPENAME and "marketplace_listing_title" in node:
+                yield node
+                continue
+            stack.extend(reversed(list(node.values())))  # Reversed so nodes come out in document order
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
+
+
+def feed_item_from_node(node):
+    """
+    Flatten a listing node into a feed item.
+
+    Returns:
+        dict or None: id, title, price (float or None), price_text, subtitles (list of str,
+        e.g. ["150K km"]), location and is_sold; None if the node has no id or title
+    """
+    item_id = node.get("id")
+    title = node.get("marketplace_listing_title") or node.get("custom_title")
+    if not item_id or not title:
+        return None
+
+    price_info = node.get("listing_price") or {}
+    try:
+        price = float(price_info.get("amount")) if price_info.get("amount") is not None else None
+    except (TypeError, ValueError):
+        price = None
+
+    subtitles = [entry.get("subtitle") for entry in node.get("custom_sub_titles_with_rendering_flags") or []
+                 if isinstance(entry, dict) and entry.get("subtitle")]
+
+    geocode = ((node.get("location") or {}).get("reverse_geocode") or {})
+    location = ", ".join(part for part in (geocode.get("city"), geocode.get("state")) if part) or None
+
+    return {
+        "id": str(item_id),
+        "title": title.strip(),
+        "price": price,
+        "price_text": price_info.get("formatted_amount"),
+        "subtitles": subtitles,
+        "location": location,
+        "is_sold": bool(node.get("is_sold")),
+    }
+
+
+def decode_feed_items(body, content_type=""):
+    """Decode the feed items in a GraphQL response body or a marketplace HTML page."""
+    if "html" in content_type and "<script" in body:
+        documents = []
+        for block in _JSON_SCRIPT_RE.findall(body):
+            if LISTING_TYPENAME in block:
+                documents.extend(iter_json_documents(block))
+    else:
+        documents = iter_json_documents(body)
+
+    items = []
+    for document in documents:
+        for node in find_listing_nodes(document):
+            item = feed_item_from_node(node)
+            if item:
+                items.append(item)
+    return items
+
+
+class FacebookFeedCapture:
+    """Collects feed items from a page's network responses as they arrive."""
+
+    def __init__(self):
+        self.items = asyncio.Queue()
+        self.responses_seen = 0
+        self.decode_errors = 0
+        self._seen_ids = set()
+        self._pending = set()
+
+    def attach(self, page):
+        """Start listening to `page`'s responses (call before navigating to the marketplace)."""
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        if not self._is_feed_response(response):
+            return
+        task = asyncio.ensure_future(self._read(response))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    @staticmethod
+    def _is_feed_response(response):
+        request = response.request
+        if response.status >= 400:
+            return False
+        if request.resource_type in ("xhr", "fetch"):
+            return GRAPHQL_PATH in response.url
+        return request.resource_type == "document" and "/marketplace" in response.url
+
+    async def _read(self, response):
+        try:
+            body = await response.text()
+        except Exception:  # Body no longer available (navigation, redirect)
+            return
+        self.responses_seen += 1
+        if LISTING_TYPENAME not in body:
+            return
+        try:
+            items = decode_feed_items(body, response.headers.get("content-type", ""))
+        except Exception as e:
+            self.decode_errors += 1
+            print(f"Could not decode Facebook feed response {response.url[:80]}: {e}")
+            return
+        for item in items:
+            if item["id"] not in self._seen_ids:
+                self._seen_ids.add(item["id"])
+                self.items.put_nowait(item)
+
+    def drain(self):
+        """Return all feed items captured since the last call."""
+        items = []
+        while not self.items.empty():
+            items.append(self.items.get_nowait())
+        return items
+
+    async def wait_for_items(self, timeout_s):
+        """Wait until at least one new item is captured. Returns False on timeout."""
+        if not self.items.empty():
+            return True
+        try:
+            item = await asyncio.wait_for(self.items.get(), timeout=timeout_s)
+        except asyncio.TimeoutError:
+            return False
+        self.items.put_nowait(item)  # Leave it for drain()
+        return True
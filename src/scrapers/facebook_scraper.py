@@ -24,7 +24,11 @@ class FacebookMarketplaceScraper(BaseScraper):
         self.base_url = "https://www.facebook.com"
         self.marketplace_url = f"{self.base_url}/marketplace/category/vehicles"
         
-    def scrape(self, limit=100):
+    async def scrape(self, limit=100):
+        """Scrape car listings from Facebook Marketplace (the blocking work runs in a worker thread)."""
+        return await self._run_blocking(self._scrape_blocking, limit)
+
+    def _scrape_blocking(self, limit=100):
         """
         Scrape car listings from Facebook Marketplace using ScrapingGraph AI.
         
@@ -25,7 +25,11 @@ class FacebookMarketplaceCrawl4AIScraper(BaseScraper):
         self.email = os.environ.get('FACEBOOK_EMAIL')
         self.password = os.environ.get('FACEBOOK_PASSWORD')
         
-    def scrape(self, limit=100):
+    async def scrape(self, limit=100):
+        """Scrape car listings from Facebook Marketplace (the blocking work runs in a worker thread)."""
+        return await self._run_blocking(self._scrape_blocking, limit)
+
+    def _scrape_blocking(self, limit=100):
         """
         Scrape car listings from Facebook Marketplace using Crawl4AI.
         
@@ -8,19 +8,96 @@ import re # Ensure re is imported for helper methods
 import random # ADDED IMPORT FOR random.randint
 
 from src.scrapers.base_scraper import BaseScraper
+from src.scrapers.session_store import EncryptedSessionStore, DEFAULT_SESSION_DIR
+from src.scrapers.facebook_feed_capture import FacebookFeedCapture
+
+# Where listings are read from: the feed's GraphQL responses, or the rendered cards
+EXTRACTION_NETWORK = "network"
+EXTRACTION_DOM = "dom"
 
 # Load environment variables
 load_dotenv()
 
 
+# Reads marketplace cards not yet seen, marks them, and (optionally) empties them so the
+# page does not keep every image and text node of a deep scroll alive.
+_EXTRACT_NEW_CARDS_JS = """
+(prune) => {
+    const cards = [];
+    const anchors = document.querySelectorAll("a[href*='/marketplace/item/']:not([data-cdf-seen])");
+    for (const a of anchors) {
+        a.setAttribute('data-cdf-seen', '1');
+        const href = a.getAttribute('href') || '';
+        const match = href.match(/\\/marketplace\\/item\\/(\\d+)/);
+        if (!match) continue;
+        const texts = [];
+        for (const span of a.querySelectorAll("span[dir='auto']")) {
+            const text = (span.textContent || '').trim();
+            if (text && !texts.includes(text)) texts.push(text);
+        }
+        cards.push({id: match[1], href: href, texts: texts});
+        if (prune) {
+            // Keep the anchor's box so the feed's scroll height does not jump
+            a.style.minHeight = a.offsetHeight + 'px';
+            a.replaceChildren();
+        }
+    }
+    return cards;
+}
+"""
+
+# Marks and empties rendered cards without reading them, for when listings come from the feed
+_PRUNE_CARDS_JS = """
+() => {
+    const anchors = document.querySelectorAll("a[href*='/marketplace/item/']:not([data-cdf-seen])");
+    for (const a of anchors) {
+        a.setAttribute('data-cdf-seen', '1');
+        a.style.minHeight = a.offsetHeight + 'px';
+        a.replaceChildren();
+    }
+    return anchors.length;
+}
+"""
+
+_HAS_NEW_CARDS_JS = """
+() => document.querySelector("a[href*='/marketplace/item/']:not([data-cdf-seen])") !== null
+"""
+
+_CARD_MILEAGE_RE = re.compile(r'(\d+(?:\.\d+)?)\s*(k)?\s*(km|kilometers|mi|miles)\b', re.IGNORECASE)
+
+
+
+def _is_price_text(text):
+    return '$' in text or text.lower() == 'free'
+
+
 class FacebookMarketplacePlaywrightScraper(BaseScraper):
     """Scraper for Facebook Marketplace using Playwright"""
+
+    # Incremental scroll settings
+    MAX_SCROLLS = 200           # Hard cap on scroll rounds for very large limits
+    MAX_STALE_SCROLLS = 3       # Stop after this many scrolls that render no new items
+    SCROLL_WAIT_MS = 4000       # Max wait for new cards after each scroll
+    PRUNE_PROCESSED_CARDS = True
     
-    def __init__(self):
-        """Initialize the Facebook Marketplace scraper."""
+    def __init__(self, session_path=None, replay=None, extraction=EXTRACTION_NETWORK):
+        """
+        Initialize the Facebook Marketplace scraper.
+
+        Args:
+            session_path (str or Path, optional): Encrypted file used to persist the logged-in
+                browser session between runs (default: .sessions/facebook_storage_state.enc)
+            replay (ReplayArchive, optional): Record or replay the browser traffic offline
+            extraction (str): "network" decodes listings from the feed's GraphQL responses
+                (falling back to the cards if none can be decoded); "dom" reads the rendered cards
+        """
         super().__init__("Facebook Marketplace (Playwright)")
         
         self.base_url = "https://www.facebook.com"
+        self.replay = replay
+        if extraction not in (EXTRACTION_NETWORK, EXTRACTION_DOM):
+            raise ValueError(f"Unknown extraction mode '{extraction}'. Use '{EXTRACTION_NETWORK}' or '{EXTRACTION_DOM}'.")
+        self.extraction = extraction
         # Refined URL parameters based on research
         # Adding location parameters for Oakville, ON
         self.marketplace_url = (
@@ -37,7 +114,41 @@ class FacebookMarketplacePlaywrightScraper(BaseScraper):
             print("WARNING: FACEBOOK_EMAIL or FACEBOOK_PASSWORD not found in environment variables.")
             print("Facebook Marketplace scraping requires login and will likely fail without credentials.")
             print("Please ensure they are set in your .env file.")
-        
+
+        # The session is encrypted with FACEBOOK_SESSION_KEY if set, otherwise with the account password
+        session_secret = os.environ.get('FACEBOOK_SESSION_KEY') or self.password
+        self.session_store = EncryptedSessionStore(
+            session_path or DEFAULT_SESSION_DIR / "facebook_storage_state.enc",
+            session_secret
+        )
+
+    async def _probe_session(self, page):
+        """
+        Cheap check that a restored session is still logged in. Navigates straight to the
+        marketplace URL, so on success the page is already where scraping starts.
+        """
+        try:
+            await page.goto(self.marketplace_url, wait_until='domcontentloaded', timeout=30000)
+            if "/login" in page.url or "/checkpoint" in page.url:
+                return False
+            if await page.locator("input#email").count() > 0:
+                return False
+            await page.wait_for_selector("div[role='banner']", timeout=10000)
+            return True
+        except Exception as e:
+            print(f"Saved Facebook session could not be verified: {e}")
+            return False
+
+    async def _save_session(self, context):
+        """Persist cookies/localStorage after a successful login."""
+        try:
+            state = await context.storage_state()
+        except Exception as e:
+            print(f"Could not read browser storage state: {e}")
+            return
+        if self.session_store.save(state):
+            print(f"Saved Facebook session to {self.session_store.path}")
+
     async def _login(self, page):
         """Log in to Facebook (mandatory for scraping)."""
         if not self.email or not self.password:
@@ -45,7 +156,7 @@ class FacebookMarketplacePlaywrightScraper(BaseScraper):
             return False
             
         try:
-            await page.goto(f"{self.base_url}/login", wait_until='networkidle')
+            await page.goto(f"{self.base_url}/login", wait_until='domcontentloaded')
             
             # Accept cookies if prompt appears
             # Playwright uses locators. This is an example, might need adjustment.
@@ -149,33 +260,57 @@ class FacebookMarketplacePlaywrightScraper(BaseScraper):
         except Exception as e:
             print(f"Error applying vehicle filters: {e}")
 
-    async def _scrape_async(self, limit=100):
-        """Asynchronous scraping method using Playwright."""
+    async def scrape(self, limit=100):
+        """Scrape listings with Playwright (collects what iter_listings() streams)."""
+        return [listing async for listing in self.iter_listings(limit)]
+
+    async def iter_listings(self, limit=100):
+        """Yield listings as the marketplace feed is scrolled."""
         listings = []
         
         if not self.email or not self.password:
             print("Facebook credentials not available. Cannot proceed with Facebook Marketplace scraping as login is mandatory.")
-            return listings
+            return
 
         async with async_playwright() as p:
             browser = await p.chromium.launch(headless=False) # Run non-headless for FB debugging
+            saved_state = self.session_store.load()
             context = await browser.new_context(
                 user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                viewport={'width': 1920, 'height': 1080}
+                viewport={'width': 1920, 'height': 1080},
+                storage_state=saved_state
             )
+            if self.replay:
+                await self.replay.attach(context)
             page = await context.new_page()
+            feed = None
+            if self.extraction == EXTRACTION_NETWORK:
+                feed = FacebookFeedCapture()
+                feed.attach(page) # Before the first marketplace navigation, so the initial batch is seen
             
             try:
-                # --- Perform Login ---
-                print("Attempting to log in to Facebook...")
-                logged_in = await self._login(page)
+                # --- Reuse saved session, fall back to a full login ---
+                logged_in = False
+                if saved_state:
+                    print("Found saved Facebook session, verifying it...")
+                    logged_in = await self._probe_session(page)
+                    if logged_in:
+                        print("Saved Facebook session is valid. Skipping login.")
+                    else:
+                        print("Saved Facebook session is no longer valid. Logging in again.")
+                        self.session_store.clear()
+                        await context.clear_cookies()
+
                 if not logged_in:
-                    print("Facebook login failed or was skipped due to missing credentials. Aborting scrape for Facebook Marketplace.")
-                    await browser.close()
-                    return listings
+                    print("Attempting to log in to Facebook...")
+                    logged_in = await self._login(page)
+                    if not logged_in:
+                        print("Facebook login failed or was skipped due to missing credentials. Aborting scrape for Facebook Marketplace.")
+                        await browser.close()
+                        return
+                    await self._save_session(context)
+                    await page.goto(self.marketplace_url, wait_until='domcontentloaded', timeout=60000)
                 # --- End Login ---
-
-                await page.goto(self.marketplace_url, wait_until='networkidle', timeout=60000)
                 
                 # --- Attempt to close login popup (should not be needed if login is successful, but kept as a failsafe) ---
                 try:
@@ -214,111 +349,70 @@ class FacebookMarketplacePlaywrightScraper(BaseScraper):
                 # await self._apply_vehicle_filters(page) # Temporarily disable to test URL params first
                 print("Skipping direct UI filter application to test URL parameters first for FB Marketplace.")
                 
-                await page.wait_for_selector("div[aria-label*='Marketplace']", timeout=30000)
-
-                # Scroll to load more listings
-                # This is a common pattern, might need adjustment based on FB's actual scroll container
-                for i in tqdm(range(min(10, limit // 20 + 1)), desc="Scrolling for listings"): # limit // 20 as items per scroll
-                    await page.mouse.wheel(0, 15000) # Scroll down
-                    await page.wait_for_timeout(2000 + random.randint(500, 1500)) # Wait for content to load
-
-                # Extract all listing items - Selector needs to be verified for current Facebook Marketplace
-                # This is a placeholder selector. It's CRITICAL to get this right.
-                # Common strategy: find a stable parent element for each listing.
-                listing_elements_selector = "a[href*='/marketplace/item/']" # Example
-                
-                item_elements = await page.locator(listing_elements_selector).all()
-                
-                print(f"Found {len(item_elements)} potential listing elements with Playwright.")
-
-                for element_handle in item_elements[:limit]:
-                    url = "N/A"
-                    title_text = "N/A_INIT"
-                    price_text = "N/A_INIT"
-                    try:
-                        url = await element_handle.get_attribute('href')
-                        if url and not url.startswith('http'):
-                            url = self.base_url + url
-                        
-                        # Try to find title within the card
-                        title_locator_candidates = [
-                            "div[role='heading'] span", # If title is in a heading
-                            "span[dir='auto']:not(:has(span))", # Spans with text directly, not containing other spans (simplistic)
-                            "div > span[data-lexical-text='true']" # A more direct child span
-                        ]
-                        for tl_candidate_selector in title_locator_candidates:
-                            title_elements = await element_handle.locator(tl_candidate_selector).all_text_contents()
-                            if title_elements:
-                                title_text = " ".join([t.strip() for t in title_elements if t.strip()]).split('\n')[0]
-                                if title_text: break
-                        
-                        if not title_text: # Fallback to broader lexical text search if specific ones fail
-                            title_candidates = await element_handle.locator("span[data-lexical-text='true']").all_text_contents()
-                            if title_candidates:
-                                title_text = " ".join([t.strip() for t in title_candidates if t.strip()]).split('\n')[0]
-
-                        # Try to find price within the card
-                        price_locator_candidates = [
-                            "div:has-text('$') > span[dir='auto']", # Price often in a div then span
-                            "span:has-text('$')" # Simpler span with price
-                        ]
-                        for pl_candidate_selector in price_locator_candidates:
-                            price_elements = await element_handle.locator(pl_candidate_selector).all_text_contents()
-                            if price_elements:
-                                price_text = " ".join([p.strip() for p in price_elements if p.strip() and '$' in p]).split('\n')[0]
-                                if price_text: break
-
-                        if not price_text: # Fallback to the original generic price locator
-                            price_element_fallback = element_handle.locator("*:has-text('$')").first
-                            if await price_element_fallback.count() > 0:
-                                price_text = (await price_element_fallback.text_content() or "").strip()
-                        
-                        # --- Permanent Debug print for extracted card details ---
-                        print(f"FB_CARD_EXTRACT: URL: {url}, Raw Title: '{title_text}', Raw Price: '{price_text}'")
-                        # --- End Debug Print ---
-
-                        if not title_text or not price_text or title_text == "N/A_INIT" or price_text == "N/A_INIT":
-                            print(f"FB_DEBUG: Card details incomplete or not found. URL: {url}, Title: '{title_text}', Price: '{price_text}'")
-                            # Fallthrough, will likely be skipped by `all()` check later if essential data missing
-                            pass 
-
-                        year = self._extract_year(title_text)
-                        make, model = self._extract_make_model(title_text)
-                        price = self._extract_price(price_text)
-                        mileage = self._extract_mileage(title_text) # Mileage rarely on card title
-                        if not mileage: mileage = 80000 # Default
-
-                        body_type = "sedan" # Placeholder, determine from title or details
-                        for bt_candidate in ["sedan", "coupe", "hatchback", "suv", "truck", "van"]:
-                            if bt_candidate in title_text.lower():
-                                body_type = bt_candidate
-                                break
-                        
-                        if all([url, year, make, model, price]):
-                            listings.append({
-                                'url': url,
-                                'title': title_text,
-                                'year': year,
-                                'make': make,
-                                'model': model,
-                                'price': price,
-                                'mileage': mileage,
-                                'body_type': body_type,
-                                'source': self.name
-                            })
+                # Ready once the first listing card has rendered (not when the network goes quiet)
+                await page.wait_for_selector("a[href*='/marketplace/item/']", timeout=30000)
+
+                # Listings are decoded from the feed's responses; the rendered cards are only read in
+                # "dom" mode or if no listing could be decoded from the feed (e.g. its schema changed)
+                use_feed = feed is not None
+                if use_feed and not await feed.wait_for_items(self.SCROLL_WAIT_MS / 1000):
+                    print(f"No listings decoded from {feed.responses_seen} Facebook feed responses; reading the page cards instead.")
+                    use_feed = False
+
+                # Scroll and extract incrementally: after each scroll only new items are read,
+                # keyed by item ID. Stop once the limit is met or the feed stops producing new items.
+                seen_item_ids = set()
+                stale_scrolls = 0
+                scroll_round = 0
+                with tqdm(total=limit, desc="Collecting Facebook listings") as pbar:
+                    while len(listings) < limit and scroll_round <= self.MAX_SCROLLS:
+                        if use_feed:
+                            new_cards = feed.drain()
+                            if self.PRUNE_PROCESSED_CARDS:
+                                # The rendered cards are not read, but still hold images and text nodes
+                                await page.evaluate(_PRUNE_CARDS_JS)
+                        else:
+                            new_cards = await page.evaluate(_EXTRACT_NEW_CARDS_JS, self.PRUNE_PROCESSED_CARDS)
+                        new_item_count = 0
+                        for card in new_cards:
+                            if card['id'] in seen_item_ids:
+                                continue
+                            seen_item_ids.add(card['id'])
+                            new_item_count += 1
+                            try:
+                                listing = self._listing_from_feed_item(card) if use_feed else self._listing_from_card(card)
+                            except Exception as e:
+                                print(f"FB_ITEM_ERROR: Error processing listing {card.get('id')}: {e}")
+                                continue
+                            if listing:
+                                listings.append(listing)
+                                pbar.update(1)
+                                yield listing
+                                if len(listings) >= limit:
+                                    break
+
                         if len(listings) >= limit:
                             break
-                            
-                    except Exception as e:
-                        url_for_error = "N/A"
-                        try: # Try to get URL for context even in error
-                            if 'element_handle' in locals() and hasattr(element_handle, 'get_attribute'):
-                                url_for_error = await element_handle.get_attribute('href') or "N/A"
-                                if url_for_error and not url_for_error.startswith('http') and self.base_url:
-                                    url_for_error = self.base_url + url_for_error
-                        except: pass
-                        print(f"FB_ITEM_ERROR: Error processing one listing element: {e}. URL hint: {url_for_error[:100]}")
-                        continue
+
+                        stale_scrolls = 0 if new_item_count else stale_scrolls + 1
+                        if stale_scrolls >= self.MAX_STALE_SCROLLS:
+                            print(f"No new Facebook items after {stale_scrolls} scrolls. Stopping.")
+                            break
+
+                        await page.mouse.wheel(0, 15000)
+                        if use_feed:
+                            # The next feed page arrives as a GraphQL response
+                            await feed.wait_for_items(self.SCROLL_WAIT_MS / 1000)
+                        else:
+                            try:
+                                # Wait for unseen cards to render instead of sleeping a fixed time
+                                await page.wait_for_function(_HAS_NEW_CARDS_JS, timeout=self.SCROLL_WAIT_MS)
+                            except Exception:
+                                pass
+                        await page.wait_for_timeout(random.randint(300, 800)) # Small human-like pause
+                        scroll_round += 1
+
+                print(f"Processed {len(seen_item_ids)} unique Facebook items in {scroll_round} scrolls.")
                         
             except Exception as e:
                 print(f"Error scraping {self.name} with Playwright: {str(e)}")
@@ -326,25 +420,86 @@ class FacebookMarketplacePlaywrightScraper(BaseScraper):
                 await browser.close()
         
         print(f"Scraped {len(listings)} listings from {self.name} using Playwright")
-        return listings
 
-    def scrape(self, limit=100):
-        """Synchronous wrapper for the async scraping method."""
-        # To run from synchronous code, we need an event loop manager
-        # If running in Jupyter or an environment with an existing loop, use nest_asyncio
-        # For simple scripts, asyncio.run should work.
-        try:
-            # Check if an event loop is already running
-            loop = asyncio.get_event_loop()
-            if loop.is_running():
-                # If running in an environment like Jupyter that has its own loop
-                import nest_asyncio
-                nest_asyncio.apply()
-                return loop.run_until_complete(self._scrape_async(limit))
-            else:
-                return asyncio.run(self._scrape_async(limit))
-        except RuntimeError: # No event loop
-             return asyncio.run(self._scrape_async(limit))
+    def _listing_from_card(self, card):
+        """
+        Build a listing dict from the texts of one marketplace card.
+        Cards render as: price, title, location, mileage (mileage is often missing).
+        """
+        texts = card.get('texts') or []
+        price_idx = next((i for i, t in enumerate(texts) if _is_price_text(t)), None)
+        price_text = texts[price_idx] if price_idx is not None else None
+        # The title is the first text after the price(s), so a title such as "2015 Honda Civic 160k km"
+        # is not mistaken for the mileage; only a text after the title can be the mileage
+        start = price_idx + 1 if price_idx is not None else 0
+        title_idx = next((i for i in range(start, len(texts)) if not _is_price_text(texts[i])), None)
+        title_text = texts[title_idx] if title_idx is not None else None
+        mileage_text = None
+        if title_idx is not None:
+            mileage_text = next((t for t in texts[title_idx + 1:] if _CARD_MILEAGE_RE.search(t)), None)
+
+        url = f"{self.base_url}/marketplace/item/{card['id']}/"
+        if not title_text or not price_text:
+            print(f"FB_DEBUG: Card details incomplete. URL: {url}, Title: '{title_text}', Price: '{price_text}'")
+            return None
+        return self._build_listing(url, title_text, self._extract_price(price_text), mileage_text)
+
+    def _listing_from_feed_item(self, item):
+        """Build a listing dict from a feed item decoded by FacebookFeedCapture."""
+        if item.get('is_sold'):
+            return None
+        url = f"{self.base_url}/marketplace/item/{item['id']}/"
+        price = item.get('price')
+        if price is None:
+            price = self._extract_price(item.get('price_text'))
+        mileage_text = next((t for t in item.get('subtitles') or [] if _CARD_MILEAGE_RE.search(t)), None)
+        if not item.get('title') or price is None:
+            print(f"FB_DEBUG: Feed item incomplete. URL: {url}, Title: '{item.get('title')}', Price: '{price}'")
+            return None
+        return self._build_listing(url, item['title'], price, mileage_text)
+
+    def _build_listing(self, url, title_text, price, mileage_text):
+        """Common listing fields for cards and feed items; None if year/make/model/price are missing or it is not a vehicle."""
+        if self._is_non_vehicle(title_text):
+            return None
+        year = self._extract_year(title_text)
+        make, model = self._extract_make_model(title_text)
+        mileage = self._parse_card_mileage(mileage_text)
+        if not mileage: mileage = 80000 # Default
+
+        body_type = "sedan" # Placeholder, determine from title or details
+        for bt_candidate in ["sedan", "coupe", "hatchback", "suv", "truck", "van"]:
+            if bt_candidate in title_text.lower():
+                body_type = bt_candidate
+                break
+
+        if not all([year, make, model, price]):
+            return None
+        return {
+            'url': url,
+            'title': title_text,
+            'year': year,
+            'make': make,
+            'model': model,
+            'price': price,
+            'mileage': mileage,
+            'body_type': body_type,
+            'source': self.name
+        }
+
+    def _parse_card_mileage(self, mileage_text):
+        """Parse card mileage such as '200K km' or '85,000 miles' into km."""
+        if not mileage_text:
+            return None
+        match = _CARD_MILEAGE_RE.search(mileage_text.replace(',', ''))
+        if not match:
+            return None
+        value = float(match.group(1))
+        if match.group(2):
+            value *= 1000
+        if match.group(3).lower().startswith('mi'):
+            value *= 1.60934
+        return int(value)
 
 # For testing the scraper directly (optional)
 async def _test_scraper():
@@ -353,7 +508,7 @@ async def _test_scraper():
     # Provide credentials if you want to test login
     # scraper.email = "your_fb_email"
     # scraper.password = "your_fb_password"
-    results = await scraper._scrape_async(limit=10) 
+    results = await scraper.scrape(limit=10) 
     for item in results:
         print(item)
 
@@ -1,4 +1,3 @@
-import asyncio
 import pyppeteer
 import os
 import time
@@ -221,7 +220,7 @@ class FacebookMarketplacePyppeteerScraper(BaseScraper):
                 
         return listings
     
-    def scrape(self, limit=100):
+    async def scrape(self, limit=100):
         """
         Scrape car listings from Facebook Marketplace.
         
@@ -232,10 +231,6 @@ class FacebookMarketplacePyppeteerScraper(BaseScraper):
             list: List of car listing dictionaries
         """
         print(f"Scraping {self.name}...")
-        
-        # Run the async scraping function in an event loop
-        loop = asyncio.get_event_loop()
-        listings = loop.run_until_complete(self._scrape_async(limit))
-        
+        listings = await self._scrape_async(limit)
         print(f"Scraped {len(listings)} listings from {self.name}")
-        return listings 
\ No newline at end of file
+        return listings 
@@ -0,0 +1,112 @@
+"""Turns the approved vehicles index into a small set of source-specific search queries."""
+
+import re
+from collections import namedtuple
+
+# One search to run against a source; make/model/years are None when not restricted
+SearchQuery = namedtuple("SearchQuery", ["make", "model", "min_year", "max_year"])
+
+BROAD_QUERY = SearchQuery(None, None, None, None)
+
+# Most searches to plan; makes with many approved models are searched as a whole to stay under it.
+# Every search costs at least one paced page load, even when it finds nothing.
+DEFAULT_MAX_QUERIES = 30
+
+
+def slugify(value):
+    """URL path slug as used by AutoTrader ("Mercedes-Benz" -> "mercedes-benz", "3_Series" -> "3-series")."""
+    return re.sub(r"[^a-z0-9]+", "-", str(value).lower()).strip("-")
+
+
+def plan_queries(criteria, max_queries=DEFAULT_MAX_QUERIES):
+    """
+    Build the smallest useful set of searches for the approved criteria.
+
+    One search per approved make/model, restricted to that model's approved year range.
+    While that needs more than `max_queries` searches, the make with the most model
+    searches is merged into one search for the whole make (over its approved year range);
+    if even one search per make is too many, a single search over the overall approved
+    year range is used.
+
+    The searches are interleaved across makes (first search of every make, then the
+    second, ...), so a scrape that stops at its listing limit has covered every make
+    rather than the first few alphabetically.
+
+    Args:
+        criteria (list): ApprovedCriterion entries (see ApprovalIndex.criteria)
+        max_queries (int): Maximum number of searches to return
+
+    Returns:
+        list: SearchQuery entries (a single broad query if there are no criteria)
+    """
+    if not criteria:
+        return [BROAD_QUERY]
+
+    by_model = _year_ranges(criteria, lambda c: (c.make, c.model))
+    by_make = _year_ranges(criteria, lambda c: c.make)
+    if len(by_make) > max_queries:
+        lo, hi = _year_ranges(criteria, lambda c: None)[None]
+        return [SearchQuery(None, None, lo, hi)]
+
+    searches = {} # make -> its searches, in model order
+    for (make, model), (lo, hi) in sorted(by_model.items()):
+        searches.setdefault(make, []).append(SearchQuery(make, model, lo, hi))
+    total = len(by_model)
+    while total > max_queries:
+        make = max(sorted(searches), key=lambda m: len(searches[m])) # Most models first, then alphabetical
+        total -= len(searches[make]) - 1
+        lo, hi = by_make[make]
+        searches[make] = [SearchQuery(make, None, lo, hi)]
+
+    return _interleave(searches[make] for make in sorted(searches))
+
+
+def _interleave(groups):
+    """Round-robin over lists: the first item of each, then the second of each, ..."""
+    groups = [list(group) for group in groups]
+    return [group[i] for i in range(max(map(len, groups), default=0)) for group in groups if i < len(group)]
+
+
+def _year_ranges(criteria, key):
+    """Group criteria by `key` into (min_year, max_year); a year of None widens the range to any year."""
+    ranges = {}
+    any_year = set()
+    for criterion in criteria:
+        group = key(criterion)
+        if criterion.year is None:
+            any_year.add(group)
+            ranges.setdefault(group, (None, None))
+            continue
+        lo, hi = ranges.get(group, (criterion.year, criterion.year))
+        if lo is not None:
+            ranges[group] = (min(lo, criterion.year), max(hi, criterion.year))
+    for group in any_year:
+        ranges[group] = (None, None)
+    return ranges
+
+
+def autotrader_path(query):
+    """AutoTrader results path for a query, e.g. /cars/honda/civic/."""
+    parts = ["cars"]
+    if query.make:
+        parts.append(slugify(query.make))
+        if query.model:
+            parts.append(slugify(query.model))
+    return "/" + "/".join(parts) + "/"
+
+
+def autotrader_year_range(query):
+    """Value for AutoTrader's yRng parameter ("2012%2C2019"; either side may be empty)."""
+    lo = "" if query.min_year is None else str(query.min_year)
+    hi = "" if query.max_year is None else str(query.max_year)
+    return f"{lo}%2C{hi}"
+
+
+def cargurus_year_params(query):
+    """CarGurus startYear/endYear parameters for a query ('' when unrestricted)."""
+    params = ""
+    if query.min_year is not None:
+        params += f"&startYear={query.min_year}"
+    if query.max_year is not None:
+        params += f"&endYear={query.max_year}"
+    return params
@@ -0,0 +1,153 @@
+"""Per-host adaptive request pacing and concurrency (AIMD) for the browser scrapers."""
+
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+# Block signals reported by the scrapers' detection points
+BLOCK_CAPTCHA = "captcha"
+BLOCK_INCAPSULA = "incapsula"
+BLOCK_TIMEOUT = "timeout"
+BLOCK_NO_LISTINGS = "no_listings"
+
+
+class AdaptiveRateController:
+    """
+    Additive-increase / multiplicative-decrease pacing for one host.
+
+    Every `successes_per_step` successful pages the delay between requests shrinks by
+    `delay_step_s` and one more concurrent page is allowed. A block signal (captcha,
+    Incapsula, timeout) multiplies the delay by `backoff_factor`, halves the allowed
+    concurrency and pauses new requests for `cooldown_factor` times the new delay.
+    """
+
+    def __init__(self, host, initial_delay_s=3.0, min_delay_s=0.5, max_delay_s=120.0, delay_step_s=0.25,
+                 backoff_factor=2.0, cooldown_factor=4.0, initial_concurrency=1, max_concurrency=4,
+                 successes_per_step=3, jitter=0.3):
+        """
+        Args:
+            host (str): Host name the controller paces (for log messages)
+            initial_delay_s (float): Starting delay between requests
+            min_delay_s (float), max_delay_s (float): Bounds for the delay
+            delay_step_s (float): Additive delay decrease after a run of successes
+            backoff_factor (float): Multiplicative delay increase on a block
+            cooldown_factor (float): Pause after a block, as a multiple of the new delay
+            initial_concurrency (int), max_concurrency (int): Concurrent pages allowed
+            successes_per_step (int): Successes needed before speeding up
+            jitter (float): Random extra fraction added to each delay
+        """
+        self.host = host
+        self.delay_s = initial_delay_s
+        self.min_delay_s = min_delay_s
+        self.max_delay_s = max_delay_s
+        self.delay_step_s = delay_step_s
+        self.backoff_factor = backoff_factor
+        self.cooldown_factor = cooldown_factor
+        self.concurrency = initial_concurrency
+        self.max_concurrency = max_concurrency
+        self.successes_per_step = successes_per_step
+        self.jitter = jitter
+
+        self.blocks = {}
+        self.successes = 0
+        self._streak = 0
+        self._next_request_at = 0.0
+        self._in_flight = 0
+        self._condition = None
+        self._condition_loop = None
+
+    def on_success(self):
+        """Report a page that loaded normally."""
+        self.successes += 1
+        self._streak += 1
+        if self._streak < self.successes_per_step:
+            return
+        self._streak = 0
+        old_delay, old_concurrency = self.delay_s, self.concurrency
+        self.delay_s = max(self.min_delay_s, self.delay_s - self.delay_step_s)
+        self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+        if (old_delay, old_concurrency) != (self.delay_s, self.concurrency):
+            print(f"[{self.host}] Pages succeeding: delay {old_delay:.2f}s -> {self.delay_s:.2f}s, "
+                  f"concurrency {old_concurrency} -> {self.concurrency}")
+            self._notify()
+
+    def on_block(self, kind):
+        """Report a block signal (one of the BLOCK_* kinds)."""
+        self.blocks[kind] = self.blocks.get(kind, 0) + 1
+        self._streak = 0
+        self.delay_s = min(self.max_delay_s, self.delay_s * self.backoff_factor)
+        self.concurrency = max(1, self.concurrency // 2)
+        cooldown = min(self.max_delay_s, self.delay_s * self.cooldown_factor)
+        self._next_request_at = max(self._next_request_at, time.monotonic() + cooldown)
+        print(f"[{self.host}] {kind} detected: delay now {self.delay_s:.2f}s, concurrency {self.concurrency}, "
+              f"pausing {cooldown:.1f}s")
+
+    async def wait(self):
+        """Politeness delay: wait for this request's turn under the current pacing."""
+        now = time.monotonic()
+        start_at = max(now, self._next_request_at)
+        self._next_request_at = start_at + self.delay_s * (1 + self.jitter * random.random())
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def backoff(self):
+        """Wait before retrying after a block (the cooldown set by on_block, if any)."""
+        remaining = self._next_request_at - time.monotonic()
+        if remaining > 0:
+            print(f"[{self.host}] Backing off for {remaining:.1f}s before retrying...")
+        await self.wait()
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the currently allowed concurrent request slots (paced by wait())."""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < self.concurrency)
+            self._in_flight += 1
+        try:
+            await self.wait()
+            yield
+        finally:
+            async with condition:
+                self._in_flight -= 1
+                condition.notify_all()
+
+    def summary(self):
+        return {"host": self.host, "delay_s": round(self.delay_s, 2), "concurrency": self.concurrency,
+                "successes": self.successes, "blocks": dict(self.blocks)}
+
+    def _get_condition(self):
+        loop = asyncio.get_running_loop()
+        if self._condition is None or self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    def _notify(self):
+        """Wake slot() waiters after the allowed concurrency grew."""
+        condition = self._condition
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if condition is None or loop is not self._condition_loop:
+            return
+
+        async def notify():
+            async with condition:
+                condition.notify_all()
+        loop.create_task(notify())
+
+
+_controllers = {}
+
+
+def get_rate_controller(url_or_host, **kwargs):
+    """Shared controller for a host (created with `kwargs` on first use)."""
+    host = urlsplit(url_or_host).netloc or url_or_host
+    controller = _controllers.get(host)
+    if controller is None:
+        controller = _controllers[host] = AdaptiveRateController(host, **kwargs)
+    return controller
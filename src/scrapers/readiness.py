@@ -0,0 +1,100 @@
+"""
+Event-driven page readiness for the browser scrapers.
+
+A page counts as ready as soon as its content shows up, not after the network goes
+quiet: navigation waits for domcontentloaded, then races the source's first listing
+card selector (and its block markers, so a captcha page does not use up the whole
+timeout) against the XHR response that delivers the results.
+"""
+
+import asyncio
+
+# Which signal made the page ready
+READY_CONTENT = "content"
+READY_RESPONSE = "response"
+
+
+class ReadinessStrategy:
+    """How to tell that a source's results page is ready."""
+
+    def __init__(self, name, content_selectors=(), empty_selectors=(), block_selectors=(), response_patterns=(),
+                 timeout_ms=20000):
+        """
+        Args:
+            name (str): Source name (for log messages)
+            content_selectors (iterable): CSS selectors of the first listing card; any one is enough
+            empty_selectors (iterable): "No results" markers, which also end the wait
+            block_selectors (iterable): Captcha / bot-check markers, which also end the wait
+            response_patterns (iterable): URL substrings of the XHR/fetch responses carrying results
+            timeout_ms (int): Maximum time to wait for readiness after the DOM is parsed
+        """
+        self.name = name
+        self.content_selectors = list(content_selectors)
+        self.empty_selectors = list(empty_selectors)
+        self.block_selectors = list(block_selectors)
+        self.response_patterns = list(response_patterns)
+        self.timeout_ms = timeout_ms
+
+    async def goto(self, page, url, timeout_ms=60000, content_ready=True):
+        """
+        Navigate to `url` and wait until the page is ready.
+
+        With content_ready=False, cards already in the served HTML do not count: only the results
+        response (or a block marker) does. For pages whose results are swapped in client-side.
+
+        Returns:
+            str or None: READY_CONTENT or READY_RESPONSE, or None if neither happened in time
+        """
+        response_waiter = self._response_waiter(page)
+        try:
+            await page.goto(url, timeout=timeout_ms, wait_until="domcontentloaded")
+        except BaseException:
+            await self._cancel(response_waiter)
+            raise
+        return await self.wait(page, response_waiter, content_ready=content_ready)
+
+    async def wait(self, page, response_waiter=None, content_ready=True):
+        """Wait for the first readiness signal (content/empty/block selector or results response)."""
+        waiters = {}
+        selectors = self.content_selectors + self.empty_selectors if content_ready else []
+        selectors = selectors + self.block_selectors
+        if selectors:
+            combined = f":is({', '.join(selectors)})"
+            waiters[asyncio.ensure_future(page.wait_for_selector(combined, timeout=self.timeout_ms))] = READY_CONTENT
+        if response_waiter is not None:
+            waiters[response_waiter] = READY_RESPONSE
+        if not waiters:
+            return None
+
+        pending = set(waiters)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        return waiters[task]
+            print(f"{self.name}: page not ready after {self.timeout_ms / 1000:.0f}s, continuing with what has loaded.")
+            return None
+        finally:
+            for task in pending:
+                await self._cancel(task)
+
+    def _response_waiter(self, page):
+        if not self.response_patterns:
+            return None
+
+        def is_results_response(response):
+            request = response.request
+            return (request.resource_type in ("xhr", "fetch") and response.status < 400
+                    and any(pattern in response.url for pattern in self.response_patterns))
+
+        return asyncio.ensure_future(
+            page.wait_for_event("response", predicate=is_results_response, timeout=self.timeout_ms)
+        )
+
+    @staticmethod
+    async def _cancel(task):
+        if task is None:
+            return
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
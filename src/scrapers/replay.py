@@ -0,0 +1,390 @@
+"""
+Offline record/replay of the pages and XHR responses seen by the browser scrapers.
+
+Record mode captures responses from a Playwright browser context into a local archive
+(manifest.json + content-addressed bodies). Replay mode serves them back through
+context.route() with a configurable latency and bandwidth, so full scrape runs can be
+benchmarked offline and reproducibly. The archive can also be seeded from saved HTML
+pages (the captured result pages in the project root and data/cars.html) and served
+over plain HTTP for non-browser clients.
+
+Usage:
+    python -m src.scrapers.replay seed --archive fixtures/replay
+    python -m src.scrapers.replay list --archive fixtures/replay
+    python -m src.scrapers.replay serve --archive fixtures/replay --port 8765 --latency-ms 150
+"""
+
+import argparse
+import asyncio
+import hashlib
+import html
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+REPLAY_MODE_OFF = "off"
+REPLAY_MODE_RECORD = "record"
+REPLAY_MODE_REPLAY = "replay"
+REPLAY_MODES = (REPLAY_MODE_OFF, REPLAY_MODE_RECORD, REPLAY_MODE_REPLAY)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+DEFAULT_ARCHIVE_DIR = PROJECT_ROOT / "fixtures" / "replay"
+
+# Resource types worth recording; images, fonts and media are blocked during replay
+RECORD_RESOURCE_TYPES = {"document", "xhr", "fetch", "script", "stylesheet"}
+# Response headers kept in the archive (bodies are stored decoded, so no content-encoding)
+KEPT_HEADERS = ("content-type", "location")
+
+_CANONICAL_RE = re.compile(r'<link[^>]+rel="canonical"[^>]+href="([^"]+)"', re.IGNORECASE)
+
+
+def _url_key(url):
+    """URL without its fragment."""
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, parts.query, ""))
+
+
+def _body_hash(data):
+    return hashlib.sha256(data or b"").hexdigest()[:16]
+
+
+def _canonical_url(html_bytes):
+    match = _CANONICAL_RE.search(html_bytes[:200_000].decode("utf-8", errors="replace"))
+    return html.unescape(match.group(1)) if match else None
+
+
+class ReplayArchive:
+    """
+    A directory of recorded responses that a Playwright context can record into or replay from.
+
+    Lookups during replay try, in order: the exact method + URL (+ POST body), the next
+    recorded response for the same method + URL (request bodies such as GraphQL tokens
+    vary between runs), the same host + path with any query, and finally a seeded
+    fallback page for the host.
+    """
+
+    def __init__(self, archive_dir=None, mode=REPLAY_MODE_REPLAY, latency_ms=0, bandwidth_kbps=None,
+                 resource_types=None):
+        """
+        Args:
+            archive_dir (str or Path, optional): Archive directory (default: fixtures/replay)
+            mode (str): One of REPLAY_MODES
+            latency_ms (float): Added delay per replayed response
+            bandwidth_kbps (float, optional): Simulated bandwidth in kilobits/s (None = unlimited)
+            resource_types (set, optional): Resource types to record
+        """
+        if mode not in REPLAY_MODES:
+            raise ValueError(f"Unknown replay mode '{mode}'. Expected one of: {', '.join(REPLAY_MODES)}")
+        self.archive_dir = Path(archive_dir) if archive_dir else DEFAULT_ARCHIVE_DIR
+        self.bodies_dir = self.archive_dir / "bodies"
+        self.manifest_path = self.archive_dir / "manifest.json"
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.bandwidth_kbps = bandwidth_kbps
+        self.resource_types = set(resource_types) if resource_types else RECORD_RESOURCE_TYPES
+
+        self.entries = []
+        self.stats = {"recorded": 0, "hits": 0, "misses": 0, "blocked": 0}
+        self._lock = threading.Lock()
+        self._writer = None
+        self._index = None
+        self._cursors = {}
+        self._body_cache = {}
+        self._load_manifest()
+
+    @property
+    def enabled(self):
+        return self.mode != REPLAY_MODE_OFF
+
+    # --- Archive storage ---
+
+    def _load_manifest(self):
+        if self.manifest_path.exists():
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("entries", [])
+            except (OSError, ValueError) as e:
+                print(f"Could not read replay manifest {self.manifest_path}: {e}")
+                self.entries = []
+        elif self.mode == REPLAY_MODE_REPLAY:
+            print(f"Warning: Replay archive {self.archive_dir} has no manifest; every request will miss.")
+
+    def save_manifest(self):
+        """Write the manifest atomically."""
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        with self._lock:
+            payload = {"version": 1, "entries": list(self.entries)}
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=1)
+        tmp_path.replace(self.manifest_path)
+
+    def add_entry(self, url, body, status=200, headers=None, method="GET", post_data=None,
+                  resource_type="document", fallback=False):
+        """
+        Add a response to the archive. The body is written off the caller's thread.
+
+        Args:
+            fallback (bool): Serve this page for unmatched documents on the same host
+        """
+        body = body or b""
+        digest = _body_hash(body)
+        entry = {
+            "method": method.upper(),
+            "url": _url_key(url),
+            "post_hash": _body_hash(post_data.encode("utf-8") if isinstance(post_data, str) else post_data)
+                         if post_data else None,
+            "status": status,
+            "headers": {k: v for k, v in (headers or {}).items() if k.lower() in KEPT_HEADERS},
+            "resource_type": resource_type,
+            "body": digest,
+            "size": len(body),
+            "fallback": fallback,
+        }
+        with self._lock:
+            if self._writer is None:
+                self._writer = ThreadPoolExecutor(max_workers=1)
+            self._writer.submit(self._write_body, digest, body)
+            self.entries.append(entry)
+            self._index = None
+            self.stats["recorded"] += 1
+        return entry
+
+    def _write_body(self, digest, body):
+        path = self.bodies_dir / digest
+        if path.exists():
+            return
+        self.bodies_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(digest + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(body)
+        tmp_path.replace(path)
+
+    def read_body(self, entry):
+        digest = entry["body"]
+        body = self._body_cache.get(digest)
+        if body is None:
+            try:
+                body = (self.bodies_dir / digest).read_bytes()
+            except OSError:
+                body = b""
+            self._body_cache[digest] = body
+        return body
+
+    def close(self):
+        """Finish pending body writes, save the manifest (record mode) and print a summary."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+        if self.mode == REPLAY_MODE_RECORD or self.stats["recorded"]:
+            self.save_manifest()
+        if self.enabled:
+            print(f"Replay archive {self.archive_dir} ({self.mode}): " +
+                  ", ".join(f"{k}={v}" for k, v in self.stats.items()))
+
+    # --- Seeding ---
+
+    def seed_html(self, path, url=None, fallback=True):
+        """Add a saved HTML page, using its canonical link as the URL when none is given."""
+        data = Path(path).read_bytes()
+        url = url or _canonical_url(data)
+        if url is None:
+            return None
+        return self.add_entry(url, data, headers={"content-type": "text/html; charset=utf-8"}, fallback=fallback)
+
+    def seed_saved_pages(self, root=None):
+        """
+        Seed from the saved result pages in the project root and data/, one page per URL
+        (pages without a canonical URL, such as captcha pages, are skipped). Returns the number added.
+        """
+        root = Path(root) if root else PROJECT_ROOT
+        known = {e["url"] for e in self.entries}
+        added = 0
+        for path in sorted(list(root.glob("*.html")) + list((root / "data").glob("*.html"))):
+            data = path.read_bytes()
+            url = _canonical_url(data)
+            if url is None or _url_key(url) in known:
+                continue
+            entry = self.seed_html(path, url=url)
+            known.add(entry["url"])
+            added += 1
+            print(f"Seeded {entry['url']} from {path.name}")
+        return added
+
+    # --- Lookup ---
+
+    def _build_index(self):
+        by_url, by_path, fallbacks = {}, {}, {}
+        for entry in self.entries:
+            parts = urlsplit(entry["url"])
+            by_url.setdefault((entry["method"], entry["url"]), []).append(entry)
+            by_path.setdefault((entry["method"], parts.netloc, parts.path), []).append(entry)
+            if entry.get("fallback") and entry["resource_type"] == "document":
+                fallbacks.setdefault(parts.netloc, entry)
+        self._index = (by_url, by_path, fallbacks)
+        self._cursors = {}
+
+    def lookup(self, url, method="GET", post_data=None, resource_type="document"):
+        """Return the archived entry for a request, or None."""
+        with self._lock:
+            if self._index is None:
+                self._build_index()
+            by_url, by_path, fallbacks = self._index
+            method = method.upper()
+            key = (method, _url_key(url))
+            candidates = by_url.get(key)
+            if candidates:
+                if post_data:
+                    post_hash = _body_hash(post_data.encode("utf-8") if isinstance(post_data, str) else post_data)
+                    for entry in candidates:
+                        if entry["post_hash"] == post_hash:
+                            return entry
+                # Serve same-URL responses in recorded order, repeating the last one
+                cursor = self._cursors.get(key, 0)
+                self._cursors[key] = cursor + 1
+                return candidates[min(cursor, len(candidates) - 1)]
+
+            parts = urlsplit(url)
+            same_path = by_path.get((method, parts.netloc, parts.path))
+            if same_path:
+                return same_path[0]
+            if resource_type == "document" and method == "GET":
+                return fallbacks.get(parts.netloc)
+            return None
+
+    def transfer_delay_s(self, size):
+        """Simulated time to deliver a response of `size` bytes."""
+        delay = self.latency_ms / 1000.0
+        if self.bandwidth_kbps:
+            delay += size * 8 / (self.bandwidth_kbps * 1000.0)
+        return delay
+
+    # --- Playwright integration ---
+
+    async def attach(self, context):
+        """Record from or replay into a Playwright browser context."""
+        if self.mode == REPLAY_MODE_RECORD:
+            context.on("response", self._record_response)
+        elif self.mode == REPLAY_MODE_REPLAY:
+            await context.route("**/*", self._replay_route)
+
+    async def _record_response(self, response):
+        request = response.request
+        if request.resource_type not in self.resource_types:
+            return
+        try:
+            body = b"" if 300 <= response.status < 400 else await response.body()
+            headers = await response.all_headers()
+        except Exception:
+            return  # Body not available (e.g. the page navigated away)
+        self.add_entry(
+            request.url, body, status=response.status, headers=headers, method=request.method,
+            post_data=request.post_data_buffer, resource_type=request.resource_type,
+        )
+
+    async def _replay_route(self, route):
+        request = route.request
+        entry = self.lookup(request.url, request.method, request.post_data_buffer, request.resource_type)
+        if entry is None:
+            if request.resource_type in self.resource_types:
+                self.stats["misses"] += 1
+                print(f"Replay miss: {request.method} {request.url}")
+                await route.fulfill(status=404, body="Not in replay archive")
+            else:
+                self.stats["blocked"] += 1
+                await route.abort()
+            return
+
+        self.stats["hits"] += 1
+        body = self.read_body(entry)
+        delay = self.transfer_delay_s(len(body))
+        if delay:
+            await asyncio.sleep(delay)
+        await route.fulfill(status=entry["status"], headers=entry["headers"], body=body)
+
+
+class _ReplayRequestHandler(BaseHTTPRequestHandler):
+    archive = None
+    origin = None
+
+    def do_GET(self):
+        self._serve()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._serve(self.rfile.read(length) if length else None)
+
+    def _serve(self, post_data=None):
+        entry = self.archive.lookup(self.origin + self.path, self.command, post_data)
+        if entry is None:
+            self.archive.stats["misses"] += 1
+            self.send_error(404, "Not in replay archive")
+            return
+        self.archive.stats["hits"] += 1
+        body = self.archive.read_body(entry)
+        time.sleep(self.archive.transfer_delay_s(len(body)))
+        self.send_response(entry["status"])
+        for name, value in entry["headers"].items():
+            if name.lower() == "location":
+                value = value.replace(self.origin, "")  # Keep redirects on this server
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(archive, origin, host="127.0.0.1", port=8765):
+    """
+    Serve the archived responses of one origin (e.g. https://www.autotrader.ca) over HTTP,
+    so http://host:port/cars/?... replays https://www.autotrader.ca/cars/?...
+    """
+    handler = type("ReplayRequestHandler", (_ReplayRequestHandler,), {"archive": archive, "origin": origin.rstrip("/")})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Replaying {origin} from {archive.archive_dir} on http://{host}:{port}/ "
+          f"(latency {archive.latency_ms} ms, bandwidth {archive.bandwidth_kbps or 'unlimited'} kbps)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        archive.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the offline scraper replay archive")
+    parser.add_argument("command", choices=["seed", "list", "serve"])
+    parser.add_argument("--archive", type=str, default=None, help="Archive directory (default: fixtures/replay)")
+    parser.add_argument("--origin", type=str, default="https://www.autotrader.ca", help="Origin to serve (serve)")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--bandwidth-kbps", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.command == "seed":
+        archive = ReplayArchive(args.archive, mode=REPLAY_MODE_RECORD)
+        print(f"Added {archive.seed_saved_pages()} saved page(s) to {archive.archive_dir}")
+        archive.close()
+    elif args.command == "list":
+        archive = ReplayArchive(args.archive, mode=REPLAY_MODE_OFF)
+        for entry in archive.entries:
+            flag = " (fallback)" if entry.get("fallback") else ""
+            print(f"{entry['status']} {entry['method']} {entry['resource_type']:<10} {entry['size']:>9} {entry['url']}{flag}")
+        print(f"{len(archive.entries)} entries")
+    else:
+        archive = ReplayArchive(args.archive, mode=REPLAY_MODE_REPLAY, latency_ms=args.latency_ms,
+                                bandwidth_kbps=args.bandwidth_kbps)
+        serve(archive, args.origin, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Persisted per-source record of which fallback selectors actually match.
+
+The scrapers keep ordered lists of candidate selectors for things whose markup
+drifts (listing cards, cookie buttons, captcha markers). Instead of waiting on
+each candidate in turn, all CSS candidates are combined into one `:is(...)`
+query (XPath candidates into one union) and waited on together; the candidate
+that matched is then identified with cheap non-waiting probes, preferring the
+one that worked last time. Results are saved so the next run starts with it.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+except ImportError:  # Only needed while a page is being probed
+    PlaywrightTimeoutError = asyncio.TimeoutError
+
+DEFAULT_SELECTOR_CACHE_PATH = Path(__file__).resolve().parent.parent.parent / "logs" / "selector_cache.json"
+
+_CACHE_VERSION = 1
+
+
+def is_xpath(selector):
+    return selector.startswith(("//", "(/", "xpath="))
+
+
+def _strip_xpath(selector):
+    return selector[len("xpath="):] if selector.startswith("xpath=") else selector
+
+
+class SelectorCache:
+    """Selector health per (source, group): hit/miss counts and the last selector that worked."""
+
+    def __init__(self, path=None):
+        """
+        Args:
+            path (str or Path, optional): JSON file for the cache (default: logs/selector_cache.json)
+        """
+        self.path = Path(path) if path else DEFAULT_SELECTOR_CACHE_PATH
+        self._lock = threading.Lock()
+        self._data = None
+        self._dirty = False
+
+    def ordered(self, source, group, candidates):
+        """Candidates with the last good selector first, then by past hits (ties keep list order)."""
+        entry = self._entry(source, group)
+        stats = entry["stats"]
+        last_good = entry.get("last_good")
+        return sorted(candidates, key=lambda s: (s != last_good, -stats.get(s, {}).get("hits", 0)))
+
+    def record(self, source, group, selector, ok=True):
+        """Record that `selector` matched (ok=True) or that the cached last good selector did not."""
+        with self._lock:
+            entry = self._entry(source, group)
+            stats = entry["stats"].setdefault(selector, {"hits": 0, "misses": 0})
+            if ok:
+                stats["hits"] += 1
+                stats["last_hit"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+                entry["last_good"] = selector
+            else:
+                stats["misses"] += 1
+                if entry.get("last_good") == selector:
+                    entry["last_good"] = None
+            self._dirty = True
+
+    async def find(self, page, source, group, candidates, timeout_ms=10000, state="attached"):
+        """
+        Wait until any candidate matches and return the best one that does.
+
+        Args:
+            page: Playwright page
+            source (str): Source name, e.g. "cargurus"
+            group (str): Selector group, e.g. "listing" or "cookie"
+            candidates (list): Candidate CSS/XPath selectors, most specific first
+            timeout_ms (int): Total time to wait for any candidate
+            state (str): wait_for_selector state ("attached" or "visible")
+
+        Returns:
+            str or None: The matching selector, or None if none matched in time
+        """
+        ordered = self.ordered(source, group, candidates)
+        waits = [asyncio.ensure_future(page.wait_for_selector(query, timeout=timeout_ms, state=state))
+                 for query in self._combined_queries(ordered)]
+        try:
+            while waits:
+                done, pending = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+                waits = list(pending)
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        selector = await self.probe(page, source, group, ordered)
+                        if selector:
+                            return selector
+                    elif not isinstance(error, PlaywrightTimeoutError):
+                        # A candidate the combined query cannot parse; fall back to probing each one
+                        print(f"Combined {source} {group} selector failed ({error}); probing candidates individually.")
+                        return await self._find_individually(page, source, group, ordered, timeout_ms, state)
+        finally:
+            for task in waits:
+                task.cancel()
+            if waits:
+                await asyncio.gather(*waits, return_exceptions=True)
+
+        last_good = self._entry(source, group).get("last_good")
+        if last_good:
+            self.record(source, group, last_good, ok=False)
+        return None
+
+    async def probe(self, page, source, group, candidates):
+        """
+        Return the highest-priority candidate currently on the page, without waiting.
+
+        All candidates are queried concurrently; None is returned (and nothing is
+        recorded) when none of them match.
+        """
+        ordered = self.ordered(source, group, candidates)
+        found = await asyncio.gather(*(page.query_selector(s) for s in ordered), return_exceptions=True)
+        for selector, handle in zip(ordered, found):
+            if handle and not isinstance(handle, BaseException):
+                self.record(source, group, selector)
+                return selector
+        return None
+
+    async def _find_individually(self, page, source, group, ordered, timeout_ms, state):
+        async def wait_one(selector):
+            try:
+                await page.wait_for_selector(selector, timeout=timeout_ms, state=state)
+                return selector
+            except Exception:
+                return None
+
+        # Concurrent waits, so a failing candidate costs no extra time
+        matched = [s for s in await asyncio.gather(*(wait_one(s) for s in ordered)) if s]
+        if matched:
+            self.record(source, group, matched[0])
+            return matched[0]
+        return None
+
+    @staticmethod
+    def _combined_queries(ordered):
+        css = [s for s in ordered if not is_xpath(s)]
+        xpath = [_strip_xpath(s) for s in ordered if is_xpath(s)]
+        queries = []
+        if css:
+            queries.append(f":is({', '.join(css)})")
+        if xpath:
+            queries.append("xpath=" + " | ".join(xpath))
+        return queries
+
+    def save(self):
+        """Write the cache if anything changed (atomic replace)."""
+        with self._lock:
+            if not self._dirty or self._data is None:
+                return
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = self.path.with_name(self.path.name + ".tmp")
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._data, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError as e:
+                print(f"Could not save selector cache to {self.path}: {e}")
+
+    def _entry(self, source, group):
+        if self._data is None:
+            self._data = self._load()
+        groups = self._data["sources"].setdefault(source, {})
+        return groups.setdefault(group, {"last_good": None, "stats": {}})
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == _CACHE_VERSION and isinstance(data.get("sources"), dict):
+                return data
+            print(f"Ignoring selector cache {self.path} with an unknown format.")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Could not read selector cache {self.path}: {e}. Starting fresh.")
+        return {"version": _CACHE_VERSION, "sources": {}}
+
+
+_default_cache = None
+
+
+def get_selector_cache():
+    """Selector cache shared by all scrapers in this process."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SelectorCache()
+    return _default_cache
@@ -0,0 +1,96 @@
+"""Encrypted on-disk storage for Playwright browser sessions (cookies + localStorage)."""
+
+import base64
+import json
+import os
+from pathlib import Path
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+except ImportError:  # Sessions are simply not persisted without cryptography
+    Fernet = None
+    InvalidToken = Exception
+
+DEFAULT_SESSION_DIR = Path(__file__).resolve().parent.parent.parent / ".sessions"
+
+_FILE_MAGIC = b"CDFS1"
+_SALT_BYTES = 16
+_KDF_ITERATIONS = 200_000
+
+
+class EncryptedSessionStore:
+    """
+    Saves and restores a Playwright `storage_state` dict, encrypted with a key
+    derived from a local secret (PBKDF2-SHA256 + Fernet). The state is never
+    written in plaintext; if `cryptography` is missing nothing is persisted.
+    """
+
+    def __init__(self, path, secret):
+        """
+        Args:
+            path (str or Path): File holding the encrypted session
+            secret (str): Secret used to derive the encryption key
+        """
+        self.path = Path(path)
+        self.secret = secret
+
+    @property
+    def available(self):
+        return Fernet is not None and bool(self.secret)
+
+    def load(self):
+        """Return the saved storage_state dict, or None if missing/unreadable."""
+        if not self.available or not self.path.exists():
+            return None
+        try:
+            raw = self.path.read_bytes()
+            if not raw.startswith(_FILE_MAGIC):
+                raise ValueError("unrecognised session file format")
+            salt = raw[len(_FILE_MAGIC):len(_FILE_MAGIC) + _SALT_BYTES]
+            token = raw[len(_FILE_MAGIC) + _SALT_BYTES:]
+            state = json.loads(self._fernet(salt).decrypt(token).decode("utf-8"))
+            if not isinstance(state, dict) or "cookies" not in state:
+                raise ValueError("session file does not contain a storage state")
+            return state
+        except (InvalidToken, ValueError, OSError) as e:
+            print(f"Could not load saved session from {self.path}: {e or type(e).__name__}. A fresh login will be used.")
+            return None
+
+    def save(self, state):
+        """Encrypt and write a storage_state dict. Returns True on success."""
+        if Fernet is None:
+            print("Warning: 'cryptography' is not installed, so the browser session will not be saved.")
+            return False
+        if not self.secret:
+            print("Warning: No session secret available, so the browser session will not be saved.")
+            return False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            salt = os.urandom(_SALT_BYTES)
+            token = self._fernet(salt).encrypt(json.dumps(state).encode("utf-8"))
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(_FILE_MAGIC + salt + token)
+            os.replace(tmp_path, self.path)
+            try:
+                os.chmod(self.path, 0o600)
+            except OSError:
+                pass
+            return True
+        except OSError as e:
+            print(f"Could not save session to {self.path}: {e}")
+            return False
+
+    def clear(self):
+        """Delete the saved session (e.g. after it stops working)."""
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _fernet(self, salt):
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=_KDF_ITERATIONS)
+        key = base64.urlsafe_b64encode(kdf.derive(self.secret.encode("utf-8")))
+        return Fernet(key)
@@ -0,0 +1,108 @@
+"""Playwright tracing helpers shared by the browser-based scrapers."""
+
+import time
+from pathlib import Path
+
+TRACE_MODE_OFF = "off"
+TRACE_MODE_ON_FAILURE = "on-failure"
+TRACE_MODE_ALWAYS = "always"
+TRACE_MODES = (TRACE_MODE_OFF, TRACE_MODE_ON_FAILURE, TRACE_MODE_ALWAYS)
+
+# Traces are written under logs/ instead of the project root
+DEFAULT_TRACE_DIR = Path(__file__).resolve().parent.parent.parent / "logs" / "traces"
+
+
+class AttemptTracer:
+    """
+    Controls Playwright tracing for a single scrape attempt.
+
+    Modes:
+        off: tracing is never started, so healthy runs pay no snapshot/screenshot cost.
+        on-failure: tracing runs in chunks and only the current chunk is kept. Call
+            checkpoint() at page boundaries to drop the previous chunk; the last one
+            is written to disk only if the attempt fails.
+        always: the whole attempt is traced and written to disk.
+    """
+
+    def __init__(self, source, mode=TRACE_MODE_OFF, trace_dir=None):
+        """
+        Args:
+            source (str): Short source name used in trace file names (e.g. "autotrader")
+            mode (str): One of TRACE_MODES
+            trace_dir (str or Path, optional): Directory for saved traces
+        """
+        if mode not in TRACE_MODES:
+            raise ValueError(f"Unknown trace mode '{mode}'. Expected one of: {', '.join(TRACE_MODES)}")
+        self.source = source
+        self.mode = mode
+        self.trace_dir = Path(trace_dir) if trace_dir else DEFAULT_TRACE_DIR
+        self._context = None
+        self._attempt = None
+        self._active = False
+
+    @property
+    def enabled(self):
+        return self.mode != TRACE_MODE_OFF
+
+    async def start(self, context, attempt):
+        """Start tracing on a browser context for the given attempt number."""
+        self._context = context
+        self._attempt = attempt
+        if not self.enabled:
+            return
+
+        print(f"Starting Playwright trace ({self.mode}) for {self.source} attempt {attempt}")
+        await context.tracing.start(
+            screenshots=True,
+            snapshots=True,
+            sources=self.mode == TRACE_MODE_ALWAYS,
+        )
+        if self.mode == TRACE_MODE_ON_FAILURE:
+            await context.tracing.start_chunk(title=f"{self.source} attempt {attempt}")
+        self._active = True
+
+    async def checkpoint(self, title=None):
+        """Discard the current chunk and start a new one (on-failure mode only)."""
+        if not self._active or self.mode != TRACE_MODE_ON_FAILURE:
+            return
+        try:
+            await self._context.tracing.stop_chunk()
+            await self._context.tracing.start_chunk(title=title)
+        except Exception as e:
+            print(f"Could not roll over Playwright trace chunk for {self.source}: {e}")
+
+    async def finish(self, failed):
+        """
+        Stop tracing and persist the trace if the mode requires it.
+
+        Args:
+            failed (bool): Whether the attempt ended in an error
+
+        Returns:
+            Path or None: Path of the saved trace, if one was written
+        """
+        if not self._active:
+            return None
+        self._active = False
+
+        path = None
+        if self.mode == TRACE_MODE_ALWAYS or failed:
+            self.trace_dir.mkdir(parents=True, exist_ok=True)
+            outcome = "failed" if failed else "ok"
+            path = self.trace_dir / (
+                f"{self.source}_trace_attempt_{self._attempt}_{outcome}_{time.strftime('%Y%m%d_%H%M%S')}.zip"
+            )
+
+        try:
+            if self.mode == TRACE_MODE_ON_FAILURE:
+                await self._context.tracing.stop_chunk(path=str(path) if path else None)
+                await self._context.tracing.stop()
+            else:
+                await self._context.tracing.stop(path=str(path))
+        except Exception as e:
+            print(f"Could not stop Playwright trace for {self.source}: {e}")
+            return None
+
+        if path:
+            print(f"Saved {self.source} trace to {path}")
+        return path